@@ -0,0 +1,58 @@
+"""add event queue tables
+
+Revision ID: 3d9c2b7e5f41
+Revises: f006eaa3d35b
+Create Date: 2023-06-24 11:30:12.402117
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3d9c2b7e5f41'
+down_revision = 'f006eaa3d35b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # shared by all the tenants, created once by whichever tenant upgrades first
+    create_event_queue = """
+        CREATE TABLE IF NOT EXISTS public.event_queue (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY NOT NULL,
+        tenant_id UUID NOT NULL,
+        payload JSONB NOT NULL,
+        attempts INTEGER DEFAULT 0 NOT NULL,
+        available_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        last_error TEXT,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        CONSTRAINT event_queue_pkey PRIMARY KEY (id),
+        CONSTRAINT event_queue_tenant_id_fkey FOREIGN KEY (tenant_id) REFERENCES public.tenants (id) ON DELETE CASCADE
+        )
+    """
+    op.execute(create_event_queue)
+
+    available_at_index = """ CREATE INDEX IF NOT EXISTS public_event_queue_available_at_idx ON public.event_queue (available_at) """
+    op.execute(available_at_index)
+
+    create_dead_letters = """
+        CREATE TABLE IF NOT EXISTS public.event_dead_letters (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY NOT NULL,
+        tenant_id UUID NOT NULL,
+        payload JSONB NOT NULL,
+        attempts INTEGER DEFAULT 0 NOT NULL,
+        error TEXT,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        failed_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        CONSTRAINT event_dead_letters_pkey PRIMARY KEY (id)
+        )
+    """
+    op.execute(create_dead_letters)
+
+    tenant_index = """ CREATE INDEX IF NOT EXISTS public_event_dead_letters_tenant_id_idx ON public.event_dead_letters (tenant_id) """
+    op.execute(tenant_index)
+
+
+def downgrade() -> None:
+    # shared tables are kept, other tenants may still be using them
+    pass
@@ -0,0 +1,53 @@
+"""partition events by created_at
+
+Revision ID: 7b1e4f0c2a93
+Revises: 3d9c2b7e5f41
+Create Date: 2023-06-27 09:15:44.918305
+
+The existing events table is kept as the `events_legacy` partition holding
+everything up to the end of the current month, so no rows are copied. The
+layout does not depend on the settings, the partitions of the configured
+interval are created by opalizer.api.events.partitions.
+
+"""
+from datetime import datetime, timedelta, timezone
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '7b1e4f0c2a93'
+down_revision = '3d9c2b7e5f41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # the first day of the next month, rows created from then on go to the
+    # partitions of the job or to events_default until the job ran
+    today = datetime.now(timezone.utc).date()
+    start = (today.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+    op.execute("ALTER TABLE events RENAME TO events_legacy")
+    op.execute("ALTER TABLE events_legacy RENAME CONSTRAINT events_pkey TO events_legacy_pkey")
+    op.execute("ALTER TABLE events_legacy DROP CONSTRAINT events_tenant_id_fkey")
+
+    op.execute("CREATE TABLE events (LIKE events_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+    # the partition key has to be part of the primary key
+    op.execute("ALTER TABLE events ADD CONSTRAINT events_pkey PRIMARY KEY (id, created_at)")
+    op.execute(
+        "ALTER TABLE events ADD CONSTRAINT events_tenant_id_fkey FOREIGN KEY (tenant_id) REFERENCES public.tenants (id)"
+    )
+
+    op.execute(f"ALTER TABLE events ATTACH PARTITION events_legacy FOR VALUES FROM (MINVALUE) TO ('{start} 00:00:00+00')")
+    op.execute("CREATE TABLE events_default PARTITION OF events DEFAULT")
+
+
+def downgrade() -> None:
+    op.execute("CREATE TABLE events_unpartitioned (LIKE events INCLUDING DEFAULTS)")
+    op.execute("INSERT INTO events_unpartitioned SELECT * FROM events")
+    op.execute("DROP TABLE events CASCADE")
+    op.execute("ALTER TABLE events_unpartitioned RENAME TO events")
+    op.execute("ALTER TABLE events ADD CONSTRAINT events_pkey PRIMARY KEY (id)")
+    op.execute(
+        "ALTER TABLE events ADD CONSTRAINT events_tenant_id_fkey FOREIGN KEY (tenant_id) REFERENCES public.tenants (id)"
+    )
@@ -0,0 +1,27 @@
+"""add geomaps geohash prefix index
+
+Revision ID: 5a2f8c1d9e37
+Revises: 7b1e4f0c2a93
+Create Date: 2023-06-29 10:40:51.118204
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5a2f8c1d9e37'
+down_revision = '7b1e4f0c2a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # addresses are looked up by geohash prefix (the cache bucket), which needs
+    # the pattern ops to use an index whatever the database collation
+    prefix_index = """ CREATE INDEX IF NOT EXISTS public_geomaps_geohash_prefix_idx ON public.geomaps (geohash varchar_pattern_ops) """
+    op.execute(prefix_index)
+
+
+def downgrade() -> None:
+    # shared tables are kept, other tenants may still be using them
+    pass
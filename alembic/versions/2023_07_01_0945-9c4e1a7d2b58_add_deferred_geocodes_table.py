@@ -0,0 +1,44 @@
+"""add deferred geocodes table
+
+Revision ID: 9c4e1a7d2b58
+Revises: 5a2f8c1d9e37
+Create Date: 2023-07-01 09:45:03.571920
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '9c4e1a7d2b58'
+down_revision = '5a2f8c1d9e37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # shared by all the tenants, created once by whichever tenant upgrades first
+    create_deferred_geocodes = """
+        CREATE TABLE IF NOT EXISTS public.deferred_geocodes (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY NOT NULL,
+        tenant_id UUID NOT NULL,
+        bucket VARCHAR(16) NOT NULL,
+        latitude FLOAT NOT NULL,
+        longitude FLOAT NOT NULL,
+        attempts INTEGER DEFAULT 0 NOT NULL,
+        available_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        last_error TEXT,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        CONSTRAINT deferred_geocodes_pkey PRIMARY KEY (id),
+        CONSTRAINT deferred_geocodes_tenant_id_fkey FOREIGN KEY (tenant_id) REFERENCES public.tenants (id) ON DELETE CASCADE,
+        CONSTRAINT deferred_geocodes_tenant_id_key UNIQUE (tenant_id, bucket)
+        )
+    """
+    op.execute(create_deferred_geocodes)
+
+    available_at_index = """ CREATE INDEX IF NOT EXISTS public_deferred_geocodes_available_at_idx ON public.deferred_geocodes (available_at) """
+    op.execute(available_at_index)
+
+
+def downgrade() -> None:
+    # shared tables are kept, other tenants may still be using them
+    pass
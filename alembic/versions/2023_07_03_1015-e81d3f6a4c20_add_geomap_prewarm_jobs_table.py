@@ -0,0 +1,49 @@
+"""add geomap prewarm jobs table
+
+Revision ID: e81d3f6a4c20
+Revises: 9c4e1a7d2b58
+Create Date: 2023-07-03 10:15:41.208346
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'e81d3f6a4c20'
+down_revision = '9c4e1a7d2b58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # shared by all the tenants, created once by whichever tenant upgrades first
+    create_geomap_prewarm_jobs = """
+        CREATE TABLE IF NOT EXISTS public.geomap_prewarm_jobs (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY NOT NULL,
+        tenant_id UUID NOT NULL,
+        store_id UUID NOT NULL,
+        latitude FLOAT NOT NULL,
+        longitude FLOAT NOT NULL,
+        radius_km FLOAT NOT NULL,
+        cell_precision SMALLINT NOT NULL,
+        cells_done INTEGER DEFAULT 0 NOT NULL,
+        cells_total INTEGER,
+        attempts INTEGER DEFAULT 0 NOT NULL,
+        available_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        last_error TEXT,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE,
+        CONSTRAINT geomap_prewarm_jobs_pkey PRIMARY KEY (id),
+        CONSTRAINT geomap_prewarm_jobs_tenant_id_fkey FOREIGN KEY (tenant_id) REFERENCES public.tenants (id) ON DELETE CASCADE,
+        CONSTRAINT geomap_prewarm_jobs_tenant_id_key UNIQUE (tenant_id, store_id)
+        )
+    """
+    op.execute(create_geomap_prewarm_jobs)
+
+    available_at_index = """ CREATE INDEX IF NOT EXISTS public_geomap_prewarm_jobs_available_at_idx ON public.geomap_prewarm_jobs (available_at) """
+    op.execute(available_at_index)
+
+
+def downgrade() -> None:
+    # shared tables are kept, other tenants may still be using them
+    pass
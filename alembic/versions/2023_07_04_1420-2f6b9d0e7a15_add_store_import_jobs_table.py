@@ -0,0 +1,42 @@
+"""add store import jobs table
+
+Revision ID: 2f6b9d0e7a15
+Revises: e81d3f6a4c20
+Create Date: 2023-07-04 14:20:12.604917
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '2f6b9d0e7a15'
+down_revision = 'e81d3f6a4c20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # shared by all the tenants, created once by whichever tenant upgrades first
+    create_store_import_jobs = """
+        CREATE TABLE IF NOT EXISTS public.store_import_jobs (
+        id UUID NOT NULL,
+        tenant_id UUID NOT NULL,
+        status VARCHAR(16) NOT NULL,
+        total INTEGER NOT NULL,
+        geocoded INTEGER DEFAULT 0 NOT NULL,
+        created INTEGER DEFAULT 0 NOT NULL,
+        failed INTEGER DEFAULT 0 NOT NULL,
+        errors JSONB DEFAULT '[]'::jsonb NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE,
+        finished_at TIMESTAMP WITH TIME ZONE,
+        CONSTRAINT store_import_jobs_pkey PRIMARY KEY (id),
+        CONSTRAINT store_import_jobs_tenant_id_fkey FOREIGN KEY (tenant_id) REFERENCES public.tenants (id) ON DELETE CASCADE
+        )
+    """
+    op.execute(create_store_import_jobs)
+
+
+def downgrade() -> None:
+    # shared tables are kept, other tenants may still be using them
+    pass
@@ -0,0 +1,37 @@
+"""add geocodes table
+
+Revision ID: b47c0e9d1f62
+Revises: 2f6b9d0e7a15
+Create Date: 2023-07-05 09:10:27.315842
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'b47c0e9d1f62'
+down_revision = '2f6b9d0e7a15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # shared by all the tenants, created once by whichever tenant upgrades first
+    create_geocodes = """
+        CREATE TABLE IF NOT EXISTS public.geocodes (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY NOT NULL,
+        address_key TEXT NOT NULL,
+        address TEXT NOT NULL,
+        latitude FLOAT NOT NULL,
+        longitude FLOAT NOT NULL,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL,
+        CONSTRAINT geocodes_pkey PRIMARY KEY (id),
+        CONSTRAINT geocodes_address_key_key UNIQUE (address_key)
+        )
+    """
+    op.execute(create_geocodes)
+
+
+def downgrade() -> None:
+    # shared tables are kept, other tenants may still be using them
+    pass
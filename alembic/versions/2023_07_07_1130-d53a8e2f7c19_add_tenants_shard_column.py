@@ -0,0 +1,29 @@
+"""add tenants shard column
+
+Revision ID: d53a8e2f7c19
+Revises: b47c0e9d1f62
+Create Date: 2023-07-07 11:30:42.908215
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'd53a8e2f7c19'
+down_revision = 'b47c0e9d1f62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # shared by all the tenants, added once by whichever tenant upgrades first
+    add_shard = """
+        ALTER TABLE public.tenants
+        ADD COLUMN IF NOT EXISTS shard VARCHAR(64) DEFAULT 'default' NOT NULL
+    """
+    op.execute(add_shard)
+
+
+def downgrade() -> None:
+    # shared tables are kept, other tenants may still be using them
+    pass
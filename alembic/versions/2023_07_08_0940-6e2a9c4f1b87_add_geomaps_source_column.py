@@ -0,0 +1,35 @@
+"""add geomaps source column
+
+Revision ID: 6e2a9c4f1b87
+Revises: d53a8e2f7c19
+Create Date: 2023-07-08 09:40:17.364125
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '6e2a9c4f1b87'
+down_revision = 'd53a8e2f7c19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # shared by all the tenants, added once by whichever tenant upgrades first,
+    # addresses geocoded so far came from gmaps
+    add_source = """
+        ALTER TABLE public.geomaps
+        ADD COLUMN IF NOT EXISTS source VARCHAR(16) DEFAULT 'gmaps' NOT NULL
+    """
+    op.execute(add_source)
+
+    # a location may have an address of every geocoding backend
+    source_index = """ CREATE UNIQUE INDEX IF NOT EXISTS public_geomaps_source_geohash_idx ON public.geomaps (source, geohash) """
+    op.execute(source_index)
+    op.execute("DROP INDEX IF EXISTS public.public_geomaps_geohash_idx")
+
+
+def downgrade() -> None:
+    # shared tables are kept, other tenants may still be using them
+    pass
@@ -0,0 +1,66 @@
+"""Compares the pydantic and fast path validation of an event request body.
+
+    OPALIZER_GMAPS_KEY=x python -m benchmarks.event_validation --number 20000
+"""
+import argparse
+import json
+import timeit
+
+import orjson
+
+from opalizer.api.events.fastpath import parse_event
+from opalizer.api.events.schemas import EventSchemaIn
+from opalizer.api.events.utils import event_values
+
+event = {
+    "latitude": 18.5204,
+    "longitude": 73.8567,
+    "accuracy": 12.5,
+    "ga_user_id": "GA1.1.1234567890.1687000000",
+    "window_location_json": {
+        "href": "https://shop.example.com/products?utm_source=news&utm_medium=mail",
+        "origin": "https://shop.example.com",
+        "protocol": "https:",
+        "host": "shop.example.com",
+        "hostname": "shop.example.com",
+        "port": "",
+        "pathname": "/products",
+        "search": "?utm_source=news&utm_medium=mail",
+        "hash": "",
+    },
+    "browser_json": {
+        "app_code_name": "Mozilla",
+        "user_agent": "Mozilla/5.0 (X11; Linux x86_64) Gecko/20100101 Firefox/114.0",
+    },
+    "extra_json": {"screen": "1920x1080", "lang": "en-US"},
+}
+
+
+def pydantic_path(body: bytes):
+    """What the `POST /v1/events/` route does, `Request.json()` then the model"""
+    return event_values(EventSchemaIn.parse_obj(json.loads(body)))
+
+
+def fast_path(body: bytes):
+    return event_values(parse_event(body, "application/json"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    body = orjson.dumps(event)
+    assert pydantic_path(body) == fast_path(body)
+    results = {}
+    for name, func in (("pydantic", pydantic_path), ("fast path", fast_path)):
+        timer = timeit.Timer(lambda func=func: func(body))
+        best = min(timer.repeat(repeat=args.repeat, number=args.number))
+        results[name] = best / args.number * 1e6
+        print(f"{name:>10}: {results[name]:8.2f} us/event")
+    print(f"   speedup: {results['pydantic'] / results['fast path']:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Compares building an engine proxy and session per `with_async_db` call with
+the cached per schema session factories, for the four sessions of an event
+(public, tenant, address, impression).
+
+    OPALIZER_GMAPS_KEY=x python -m benchmarks.schema_sessions --number 5000
+
+With `--execute` every session also runs a query against the configured
+database and the compiled statement cache hits are reported, `--schema` must
+then be an existing tenant schema.
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import asynccontextmanager
+
+from sqlalchemy import event, func, select
+from sqlalchemy.engine.default import CACHE_HIT
+
+from opalizer.api.events.models import Address
+from opalizer.api.tenants.models import Tenant
+from opalizer.database import (
+    async_engine,
+    async_session,
+    schema_sessions,
+    with_async_db,
+)
+
+
+@asynccontextmanager
+async def uncached_async_db(tenant_schema_name):
+    """`with_async_db` before the session factories were cached"""
+    schema_translate_map = None
+    if tenant_schema_name:
+        schema_translate_map = {"tenant": tenant_schema_name}
+    schema_engine = async_engine.execution_options(
+        schema_translate_map=schema_translate_map
+    )
+    async with async_session(
+        autocommit=False, autoflush=False, bind=schema_engine
+    ) as session:
+        yield session
+
+
+async def request(open_db, schema: str, execute: bool) -> None:
+    for name in ("public", schema, schema, schema):
+        async with open_db(name) as session:
+            if execute:
+                model = Tenant if name == "public" else Address
+                await session.execute(select(func.count()).select_from(model))
+
+
+async def measure(open_db, schema: str, number: int, execute: bool):
+    await request(open_db, schema, execute)  # warm up
+    start = time.perf_counter()
+    for _ in range(number):
+        await request(open_db, schema, execute)
+    elapsed = time.perf_counter() - start
+
+    # memory allocated on top of what is live while a request runs
+    tracemalloc.start()
+    samples, peak = min(number, 500), 0
+    for _ in range(samples):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        await request(open_db, schema, execute)
+        peak += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+    return elapsed / number * 1e6, peak / samples / 1024
+
+
+async def run(args) -> None:
+    hits: Counter = Counter()
+
+    @event.listens_for(async_engine.sync_engine, "after_cursor_execute")
+    def count_cache_hits(conn, cursor, statement, parameters, context, many):
+        hits[context.cache_hit] += 1
+
+    for name, open_db in (("uncached", uncached_async_db), ("cached", with_async_db)):
+        hits.clear()
+        micros, kib = await measure(open_db, args.schema, args.number, args.execute)
+        line = f"{name:>9}: {micros:8.1f} us/request, {kib:6.1f} KiB peak/request"
+        if args.execute:
+            total = sum(hits.values())
+            line += f", compiled cache hits {hits[CACHE_HIT] / total:.2%}"
+        print(line)
+    print(f"schema sessions: {schema_sessions.stats()}")
+    await async_engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=5000)
+    parser.add_argument("--schema", default="tenant_benchmark")
+    parser.add_argument("--execute", action="store_true")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import logging
+import time
+import uuid
+from typing import Any, Dict, List, Union
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from opalizer.api.events.buffer import EventBuffer
+from opalizer.api.events.models import Address
+from opalizer.api.geomap.models import GeoMap
+from opalizer.config import settings
+from opalizer.core.cache import TTLCache
+from opalizer.core.invalidation import invalidation_bus
+from opalizer.database import mirror_shared_rows, schema_engine
+
+log = logging.getLogger(__name__)
+
+
+class AddressBuffer(EventBuffer):
+    """Write-behind buffer of the `Address` rows of one tenant schema.
+
+    The geohashes known to be stored, or queued, are kept in a bounded set so
+    that repeated locations cost nothing. New ones are inserted in batches
+    with `ON CONFLICT DO NOTHING`, rows stored by another worker are skipped
+    by the database instead of failing the batch.
+    """
+
+    def __init__(
+        self,
+        schema: str,
+        max_rows: int = 500,
+        flush_interval: float = 1.0,
+        max_pending: int = 10000,
+        known_size: int = 100000,
+    ) -> None:
+        super().__init__(schema, max_rows, flush_interval, max_pending, "insert")
+        self.known = TTLCache(max_size=known_size, ttl=None)
+        self.skipped = 0
+
+    async def add(self, geomap: GeoMap) -> bool:
+        """Queues the address of the geomap unless its geohash is known.
+        :returns whether the address was queued
+        """
+        if self.known.get(geomap.geohash) is not None:
+            self.skipped += 1
+            return False
+        self.known.set(geomap.geohash, True)
+        await self.put(
+            {"id": uuid.uuid4(), "geohash": geomap.geohash, "geomap_id": geomap.id}
+        )
+        return True
+
+    async def store(self, geomap: GeoMap) -> None:
+        """Inserts the address of the geomap right away, bypassing the buffer,
+        for callers that must know it is stored.
+        """
+        if self.known.get(geomap.geohash) is not None:
+            self.skipped += 1
+            return
+        await self._insert(
+            [{"id": uuid.uuid4(), "geohash": geomap.geohash, "geomap_id": geomap.id}]
+        )
+        self.known.set(geomap.geohash, True)
+
+    async def flush(self, rows: List[Dict[str, Any]]) -> None:
+        tic = time.perf_counter()
+        try:
+            await self._insert(rows)
+            self.metrics.record(len(rows), time.perf_counter() - tic)
+        except Exception:
+            self.metrics.record(len(rows), time.perf_counter() - tic, failed=True)
+            # unknown again, the next event at the location retries them
+            for row in rows:
+                self.known.pop(row["geohash"])
+            log.exception(f"Dropped {len(rows)} addresses of tenant '{self.schema}'")
+
+    async def _insert(self, rows: List[Dict[str, Any]]) -> None:
+        engine = await schema_engine(self.schema)
+        await mirror_shared_rows(engine, Address.__table__, rows)
+        async with engine.connect() as connection:
+            connection = await connection.execution_options(
+                schema_translate_map={"tenant": self.schema}
+            )
+            await connection.execute(
+                pg_insert(Address)
+                .values(rows)
+                .on_conflict_do_nothing(index_elements=["geohash"])
+            )
+            await connection.commit()
+
+
+class AddressBufferRegistry:
+    """Lazily created address buffers, one per tenant schema"""
+
+    def __init__(self) -> None:
+        self._buffers: Dict[str, AddressBuffer] = {}
+
+    def get(self, schema: str) -> AddressBuffer:
+        buffer = self._buffers.get(schema)
+        if buffer is None:
+            config = settings.events.addresses
+            buffer = AddressBuffer(
+                schema=schema,
+                max_rows=int(config.max_rows),
+                flush_interval=int(config.flush_interval_ms) / 1000,
+                max_pending=int(config.max_pending),
+                known_size=int(config.known_size),
+            )
+            self._buffers[schema] = buffer
+        return buffer
+
+    async def add(self, schema: str, geomap: GeoMap) -> bool:
+        return await self.get(schema).add(geomap)
+
+    async def store(self, schema: str, geomap: GeoMap) -> None:
+        await self.get(schema).store(geomap)
+
+    def forget(self, tenant: Union[str, None], key: Union[str, None] = None) -> None:
+        """Drops the known geohashes of the tenant schema, of all for `None`"""
+        buffers = (
+            self._buffers.values() if tenant is None else [self._buffers.get(tenant)]
+        )
+        for buffer in buffers:
+            if buffer is not None:
+                buffer.known.clear()
+
+    async def close(self) -> None:
+        for buffer in list(self._buffers.values()):
+            try:
+                await buffer.close()
+            except Exception:
+                log.exception(f"Could not flush addresses of tenant '{buffer.schema}'")
+
+    def stats(self) -> Dict[str, Dict]:
+        return {
+            schema: {
+                "pending": buffer.pending,
+                "known": len(buffer.known),
+                "skipped": buffer.skipped,
+                **buffer.metrics.stats(),
+            }
+            for schema, buffer in self._buffers.items()
+        }
+
+
+address_buffers = AddressBufferRegistry()
+
+# a reprovisioned tenant starts without addresses
+invalidation_bus.subscribe("tenant", address_buffers.forget)
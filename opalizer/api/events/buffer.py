@@ -0,0 +1,274 @@
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Union
+
+import orjson
+from sqlalchemy import insert
+
+from opalizer.api.events.models import DeadLetterEvent, Event
+from opalizer.config import settings
+from opalizer.database import schema_engine, with_async_db
+
+log = logging.getLogger(__name__)
+
+EVENT_COLUMNS = (
+    "id",
+    "latitude",
+    "longitude",
+    "accuracy",
+    "ip_addr",
+    "ga_user_id",
+    "utm_source",
+    "utm_medium",
+    "utm_campaign",
+    "utm_term",
+    "utm_content",
+    "window_location_json",
+    "browser_json",
+    "extra_json",
+    "tenant_id",
+    "created_at",
+)
+JSON_COLUMNS = {"window_location_json", "browser_json", "extra_json"}
+
+_STOP = object()
+
+
+def event_record(row: Dict[str, Any]) -> tuple:
+    """Orders an event row as `EVENT_COLUMNS` for COPY, json columns as text"""
+    return tuple(
+        orjson.dumps(row[c]).decode()
+        if c in JSON_COLUMNS and row.get(c) is not None
+        else row.get(c)
+        for c in EVENT_COLUMNS
+    )
+
+
+class FlushMetrics:
+    """Flush counters of a write-behind buffer"""
+
+    def __init__(self) -> None:
+        self.flushes = 0
+        self.rows = 0
+        self.failed_rows = 0
+        self.last_flush_size = 0
+        self.max_flush_size = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def record(self, size: int, latency: float, failed: bool = False) -> None:
+        self.flushes += 1
+        if failed:
+            self.failed_rows += size
+        else:
+            self.rows += size
+        self.last_flush_size = size
+        self.max_flush_size = max(self.max_flush_size, size)
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        return {
+            "flushes": self.flushes,
+            "rows": self.rows,
+            "failed_rows": self.failed_rows,
+            "last_flush_size": self.last_flush_size,
+            "max_flush_size": self.max_flush_size,
+            "avg_flush_size": (self.rows + self.failed_rows) / self.flushes
+            if self.flushes
+            else 0,
+            "avg_latency_ms": self.total_latency * 1000 / self.flushes
+            if self.flushes
+            else 0,
+            "max_latency_ms": self.max_latency * 1000,
+        }
+
+
+class EventBuffer:
+    """Write-behind buffer of `Event` rows for one tenant schema.
+
+    Rows are flushed every `max_rows` rows or `flush_interval` seconds,
+    whichever comes first, with a single COPY on one connection. `put` waits
+    once `max_pending` rows are queued, pushing back on the producers. A
+    failed flush is retried, then its rows go to `public.event_dead_letters`.
+    """
+
+    def __init__(
+        self,
+        schema: str,
+        max_rows: int = 500,
+        flush_interval: float = 0.2,
+        max_pending: int = 10000,
+        method: str = "copy",
+        max_attempts: int = 3,
+        retry_delay: float = 0.5,
+    ) -> None:
+        self.schema = schema
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self.method = method
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.metrics = FlushMetrics()
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._task: Union[asyncio.Task, None] = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def put(self, row: Dict[str, Any]) -> None:
+        row.setdefault("id", uuid.uuid4())
+        row.setdefault("created_at", datetime.now(timezone.utc))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        await self._queue.put(row)
+
+    async def close(self) -> None:
+        """Flushes everything queued so far and stops the flusher."""
+        if self._task is None or self._task.done():
+            return
+        await self._queue.put(_STOP)
+        await self._task
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stop = False
+        while not stop:
+            row = await self._queue.get()
+            if row is _STOP:
+                return
+            batch = [row]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is _STOP:
+                    stop = True
+                    break
+                batch.append(row)
+            await self.flush(batch)
+
+    async def flush(self, rows: List[Dict[str, Any]]) -> None:
+        """Writes the rows, retried `max_attempts` times with backoff. Rows
+        that could not be written are moved to the dead letters.
+        """
+        tic = time.perf_counter()
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await self._write(rows)
+                self.metrics.record(len(rows), time.perf_counter() - tic)
+                return
+            except Exception as e:
+                error = repr(e)
+                log.warning(
+                    f"Could not flush {len(rows)} events of tenant '{self.schema}', "
+                    f"attempt {attempt}/{self.max_attempts} - {error}"
+                )
+            if attempt < self.max_attempts:
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+        self.metrics.record(len(rows), time.perf_counter() - tic, failed=True)
+        try:
+            await self._dead_letter(rows, error)
+        except Exception:
+            log.exception(f"Dropped {len(rows)} events of tenant '{self.schema}'")
+
+    async def _write(self, rows: List[Dict[str, Any]]) -> None:
+        if self.method == "copy":
+            try:
+                await self._copy(rows)
+                return
+            except Exception as e:
+                log.warning(
+                    f"COPY into '{self.schema}.events' failed, falling back to insert - {str(e)}"
+                )
+        await self._insert(rows)
+
+    async def _dead_letter(self, rows: List[Dict[str, Any]], error: str) -> None:
+        async with with_async_db("public") as session:
+            await session.execute(
+                insert(DeadLetterEvent).values(
+                    [
+                        {
+                            "tenant_id": row["tenant_id"],
+                            # the event row, ids and dates as strings
+                            "payload": orjson.loads(orjson.dumps(row)),
+                            "attempts": self.max_attempts,
+                            "error": error,
+                        }
+                        for row in rows
+                    ]
+                )
+            )
+            await session.commit()
+        log.error(f"Dead lettered {len(rows)} events of tenant '{self.schema}'")
+
+    async def _copy(self, rows: List[Dict[str, Any]]) -> None:
+        engine = await schema_engine(self.schema)
+        async with engine.connect() as connection:
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(
+                "events",
+                records=[event_record(row) for row in rows],
+                columns=EVENT_COLUMNS,
+                schema_name=self.schema,
+            )
+
+    async def _insert(self, rows: List[Dict[str, Any]]) -> None:
+        engine = await schema_engine(self.schema)
+        async with engine.connect() as connection:
+            connection = await connection.execution_options(
+                schema_translate_map={"tenant": self.schema}
+            )
+            await connection.execute(insert(Event).values(rows))
+            await connection.commit()
+
+
+class EventBufferRegistry:
+    """Lazily created write-behind buffers, one per tenant schema"""
+
+    def __init__(self) -> None:
+        self._buffers: Dict[str, EventBuffer] = {}
+
+    def get(self, schema: str) -> EventBuffer:
+        buffer = self._buffers.get(schema)
+        if buffer is None:
+            config = settings.events.write_behind
+            buffer = EventBuffer(
+                schema=schema,
+                max_rows=int(config.max_rows),
+                flush_interval=int(config.flush_interval_ms) / 1000,
+                max_pending=int(config.max_pending),
+                method=config.method,
+                max_attempts=int(config.max_attempts),
+                retry_delay=int(config.retry_delay_ms) / 1000,
+            )
+            self._buffers[schema] = buffer
+        return buffer
+
+    async def put(self, schema: str, row: Dict[str, Any]) -> None:
+        await self.get(schema).put(row)
+
+    async def close(self) -> None:
+        for buffer in list(self._buffers.values()):
+            try:
+                await buffer.close()
+            except Exception:
+                log.exception(f"Could not flush events of tenant '{buffer.schema}'")
+
+    def stats(self) -> Dict[str, Dict]:
+        return {
+            schema: {"pending": buffer.pending, **buffer.metrics.stats()}
+            for schema, buffer in self._buffers.items()
+        }
+
+
+event_buffers = EventBufferRegistry()
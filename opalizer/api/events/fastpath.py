@@ -0,0 +1,237 @@
+"""Fast path validation of event payloads.
+
+The request body is decoded once with orjson and validated against
+`EventSchemaIn` without instantiating the pydantic models. The validators are
+compiled once from the model fields and follow the pydantic v1 coercion rules,
+so the same inputs are accepted and rejected, with the same errors.
+"""
+import email.message
+import json
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple, Union
+
+import orjson
+from pydantic import BaseModel, Extra
+from pydantic.fields import SHAPE_DICT, SHAPE_SINGLETON, ModelField
+
+from opalizer.api.events.schemas import EventSchemaIn
+from opalizer.schemas import ORJSONModel
+
+_MISSING = object()
+
+_ERRORS = {
+    "missing": ("field required", "value_error.missing"),
+    "none": ("none is not an allowed value", "type_error.none.not_allowed"),
+    "float": ("value is not a valid float", "type_error.float"),
+    "str": ("str type expected", "type_error.str"),
+    "dict": ("value is not a valid dict", "type_error.dict"),
+    "extra": ("extra fields not permitted", "value_error.extra"),
+}
+
+Loc = Tuple[Union[str, int], ...]
+Validator = Callable[[Any, Loc, List[Dict]], Any]
+
+
+class EventRow(NamedTuple):
+    """Validated event payload, `_asdict()` holds the `Event` column values"""
+
+    latitude: float
+    longitude: float
+    accuracy: Union[float, None]
+    ga_user_id: Union[str, None]
+    window_location_json: Dict[str, Any]
+    browser_json: Dict[str, Any]
+    extra_json: Union[Dict, None]
+
+    def dict(self) -> Dict[str, Any]:
+        """Same as `EventSchemaIn.dict()` of the payload"""
+        return self._asdict()
+
+
+# what the event processing accepts, pydantic or fast path validated
+EventPayload = Union[EventSchemaIn, EventRow]
+
+
+class EventValidationError(ValueError):
+    """Raised for rejected payloads, `errors()` matches `ValidationError.errors()`"""
+
+    def __init__(self, errors: List[Dict]) -> None:
+        super().__init__(f"{len(errors)} validation error(s) for EventSchemaIn")
+        self._errors = errors
+
+    def errors(self) -> List[Dict]:
+        return self._errors
+
+
+def _error(loc: Loc, kind: str) -> Dict:
+    msg, type_ = _ERRORS[kind]
+    return {"loc": loc, "msg": msg, "type": type_}
+
+
+def _float(value: Any, loc: Loc, errors: List[Dict]) -> Any:
+    if isinstance(value, float):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError, OverflowError):
+        # pydantic lets the OverflowError of huge integers through as a 500
+        errors.append(_error(loc, "float"))
+
+
+def _str(value: Any, loc: Loc, errors: List[Dict]) -> Any:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        return str(value)
+    errors.append(_error(loc, "str"))
+
+
+def _dict(value: Any, loc: Loc, errors: List[Dict]) -> Any:
+    try:
+        return dict(value)
+    except (TypeError, ValueError):
+        errors.append(_error(loc, "dict"))
+
+
+def _field_validator(field: ModelField) -> Validator:
+    if field.class_validators:
+        raise TypeError(f"Field '{field.name}' has custom validators")
+    if field.shape == SHAPE_SINGLETON:
+        if field.type_ is float:
+            return _float
+        if field.type_ is str:
+            return _str
+        if isinstance(field.type_, type) and issubclass(field.type_, BaseModel):
+            return compile_model(field.type_)
+    if (
+        field.shape == SHAPE_DICT
+        and field.key_field.type_ is Any
+        and field.sub_fields[0].type_ is Any
+    ):
+        return _dict
+    raise TypeError(f"No fast path validator for field '{field.name}'")
+
+
+def compile_model(model: type) -> Validator:
+    """Builds the validator of a model from its fields, raises `TypeError` for
+    the fields and model options the fast path does not handle.
+    """
+    if not model.__config__.orm_mode:
+        raise TypeError(f"{model.__name__} must be in orm mode")
+    # the ORJSONModel root validator only touches datetime keys, a no-op here
+    known = ORJSONModel.__post_root_validators__
+    if model.__pre_root_validators__ or model.__post_root_validators__ != known:
+        raise TypeError(f"{model.__name__} has custom root validators")
+
+    fields = [
+        (f.alias, f.name, f.required, f.allow_none, f, _field_validator(f))
+        for f in model.__fields__.values()
+    ]
+    aliases = frozenset(f.alias for f in model.__fields__.values())
+    forbid = model.__config__.extra == Extra.forbid
+
+    def validate(value: Any, loc: Loc, errors: List[Dict]) -> Dict[str, Any]:
+        if not isinstance(value, dict):
+            # pydantic falls back to `from_orm` for non dict values, none of the
+            # fields are attributes of the JSON types so they all come up missing
+            value = {}
+        result = {}
+        for alias, name, required, allow_none, field, validator in fields:
+            v = value.get(alias, _MISSING)
+            if v is _MISSING:
+                if required:
+                    errors.append(_error(loc + (alias,), "missing"))
+                else:
+                    result[name] = field.get_default()
+            elif v is None:
+                if allow_none:
+                    result[name] = None
+                else:
+                    errors.append(_error(loc + (alias,), "none"))
+            else:
+                result[name] = validator(v, loc + (alias,), errors)
+        if forbid:
+            for key in sorted(value.keys() - aliases):
+                errors.append(_error(loc + (key,), "extra"))
+        return result
+
+    return validate
+
+
+if EventRow._fields != tuple(EventSchemaIn.__fields__):
+    raise TypeError("EventRow fields are out of sync with EventSchemaIn")
+
+_validate_event = compile_model(EventSchemaIn)
+
+
+def validate_event(value: Any) -> EventRow:
+    """Validates a decoded event the way `EventSchemaIn.parse_obj` does.
+    :raises EventValidationError: rejected payload
+    """
+    if not isinstance(value, dict):
+        try:
+            value = dict(value)
+        except (TypeError, ValueError):
+            msg = f"EventSchemaIn expected dict not {value.__class__.__name__}"
+            raise EventValidationError(
+                [{"loc": ("__root__",), "msg": msg, "type": "type_error"}]
+            )
+    errors: List[Dict] = []
+    values = _validate_event(value, (), errors)
+    if errors:
+        raise EventValidationError(errors)
+    return EventRow._make(values.values())
+
+
+def loads(body: bytes) -> Any:
+    """Decodes with orjson, falling back to the standard `json` module for the
+    documents orjson refuses but `Request.json()` accepts (NaN, lone surrogates,
+    utf-16 bodies). Integers beyond 64 bits are decoded as floats by orjson.
+    """
+    try:
+        return orjson.loads(body)
+    except orjson.JSONDecodeError:
+        return json.loads(body)
+
+
+def is_json_content_type(content_type: Union[str, None]) -> bool:
+    """Whether FastAPI would decode a body of the content type as JSON"""
+    if not content_type:
+        return True
+    message = email.message.Message()
+    message["content-type"] = content_type
+    if message.get_content_maintype() != "application":
+        return False
+    subtype = message.get_content_subtype()
+    return subtype == "json" or subtype.endswith("+json")
+
+
+def parse_event(body: bytes, content_type: Union[str, None] = None) -> EventRow:
+    """Decodes and validates a single event request body.
+    :param body: raw request body
+    :param content_type: request content type header, bodies that are not JSON
+        are rejected like FastAPI does
+    :raises EventValidationError: malformed body or rejected payload
+    """
+    if not body:
+        raise EventValidationError([_error(("body",), "missing")])
+    if not is_json_content_type(content_type):
+        value = body
+    else:
+        value = _decode(body)
+    if not isinstance(value, dict):
+        # FastAPI validates the non dict bodies through `from_orm`
+        value = {}
+    return validate_event(value)
+
+
+def _decode(body: bytes) -> Any:
+    try:
+        return loads(body)
+    except json.JSONDecodeError as e:
+        raise EventValidationError(
+            [{"loc": ("body", e.pos), "msg": e.msg, "type": "value_error.jsondecode"}]
+        )
+    except ValueError as e:
+        raise EventValidationError(
+            [{"loc": ("body",), "msg": str(e), "type": "value_error.jsondecode"}]
+        )
@@ -0,0 +1,109 @@
+import asyncio
+import logging
+from collections import Counter, defaultdict
+from typing import Dict, Union
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from opalizer.api.events.models import Impression
+from opalizer.config import settings
+from opalizer.database import with_async_db
+
+log = logging.getLogger(__name__)
+
+
+def _upsert_impressions_statement():
+    """`INSERT ... SELECT FROM unnest(:user_ids, :counts) ON CONFLICT` adding the
+    accumulated counts to existing rows. One statement shape for every flush so
+    that it is compiled once and prepared by the driver.
+    """
+    source = (
+        sa.func.unnest(
+            sa.bindparam("user_ids", type_=ARRAY(sa.String)),
+            sa.bindparam("counts", type_=ARRAY(sa.Integer)),
+        )
+        .table_valued("user_id", "count")
+        .render_derived()
+    )
+    stmt = pg_insert(Impression).from_select(
+        ["id", "user_id", "count"],
+        sa.select(sa.func.gen_random_uuid(), source.c.user_id, source.c.count),
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=[Impression.user_id],
+        set_={
+            "count": sa.func.coalesce(Impression.count, 0) + stmt.excluded["count"],
+            "updated_at": sa.func.now(),
+        },
+    )
+
+
+upsert_impressions = _upsert_impressions_statement()
+
+
+class ImpressionCounter:
+    """Coalesces impression increments per tenant schema in memory and adds them
+    to the `impressions` table with one bulk upsert per tenant every
+    `flush_interval` seconds.
+    """
+
+    def __init__(self, flush_interval: float = 1.0) -> None:
+        self.flush_interval = flush_interval
+        self._counts: Dict[str, Counter] = defaultdict(Counter)
+        self._task: Union[asyncio.Task, None] = None
+        self._lock = asyncio.Lock()
+        self._stopped = asyncio.Event()
+
+    @property
+    def pending(self) -> int:
+        return sum(len(c) for c in self._counts.values())
+
+    def add(self, schema: str, user_id: str, count: int = 1) -> None:
+        self._counts[schema][user_id] += count
+        if self._task is None or self._task.done():
+            self._stopped.clear()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                await asyncio.wait_for(self._stopped.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            counts, self._counts = self._counts, defaultdict(Counter)
+            for schema, counter in counts.items():
+                if not counter:
+                    continue
+                try:
+                    await self._upsert(schema, counter)
+                except Exception:
+                    log.exception(f"Could not flush impressions of tenant '{schema}'")
+                    # keep the deltas for the next flush
+                    self._counts[schema].update(counter)
+
+    async def _upsert(self, schema: str, counter: Counter) -> None:
+        async with with_async_db(tenant_schema_name=schema) as session:
+            await session.execute(
+                upsert_impressions,
+                {"user_ids": list(counter.keys()), "counts": list(counter.values())},
+            )
+            await session.commit()
+
+    async def close(self) -> None:
+        """Stops the periodic flush and flushes what is left."""
+        if self._task is not None:
+            self._stopped.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+
+impression_counter = ImpressionCounter(
+    flush_interval=int(settings.events.impressions.flush_interval_ms) / 1000
+)
@@ -1,11 +1,13 @@
 from uuid import uuid4
 
 import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 
 from opalizer.api.geomap.models import GeoMap
 from opalizer.api.tenants.models import Tenant
 from opalizer.database import Base
+from opalizer.shared_models import Base as SharedBase
 
 
 class Event(Base):
@@ -43,11 +45,9 @@ class Event(Base):
     updated_at = sa.Column(
         sa.TIMESTAMP(timezone=True), default=None, onupdate=sa.func.now()
     )
-    # created_date = sa.Column(sa.Date(), sa.Computed("date(created_at)"))
 
-    # __table_args__ = {
-    #     'postgresql_partition_by': 'RANGE(created_date)',
-    # }
+    # partitions are managed by opalizer.api.events.partitions
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
 
 
 class Address(Base):
@@ -90,3 +90,43 @@ class Impression(Base):
     updated_at = sa.Column(
         sa.TIMESTAMP(timezone=True), default=None, onupdate=sa.func.now()
     )
+
+
+class QueuedEvent(SharedBase):
+    __tablename__ = "event_queue"
+
+    id = sa.Column("id", sa.BigInteger(), sa.Identity(), primary_key=True)
+    tenant_id = sa.Column(
+        "tenant_id", sa.UUID(as_uuid=True), sa.ForeignKey(Tenant.id), nullable=False
+    )
+    payload = sa.Column("payload", JSONB(), nullable=False)
+    attempts = sa.Column("attempts", sa.Integer(), nullable=False, default=0)
+    available_at = sa.Column(
+        sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.func.now()
+    )
+    last_error = sa.Column("last_error", sa.Text(), nullable=True)
+
+    created_at = sa.Column(
+        sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.func.now()
+    )
+
+    __table_args__ = {"schema": "public"}
+
+
+class DeadLetterEvent(SharedBase):
+    __tablename__ = "event_dead_letters"
+
+    id = sa.Column("id", sa.BigInteger(), sa.Identity(), primary_key=True)
+    tenant_id = sa.Column("tenant_id", sa.UUID(as_uuid=True), nullable=False)
+    payload = sa.Column("payload", JSONB(), nullable=False)
+    attempts = sa.Column("attempts", sa.Integer(), nullable=False, default=0)
+    error = sa.Column("error", sa.Text(), nullable=True)
+
+    created_at = sa.Column(
+        sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.func.now()
+    )
+    failed_at = sa.Column(
+        sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.func.now()
+    )
+
+    __table_args__ = {"schema": "public"}
@@ -0,0 +1,263 @@
+import asyncio
+import logging
+import re
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Union
+
+import schedule
+from sqlalchemy import pool, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+
+from opalizer.config import settings
+from opalizer.core.scheduler import scheduler
+from opalizer.core.shards import DEFAULT_SHARD
+from opalizer.database import shards
+
+log = logging.getLogger(__name__)
+
+INTERVALS = ("day", "month")
+DEFAULT_PARTITION = "events_default"
+
+_BOUND_RE = re.compile(r"FROM \((?:'([^']+)'|MINVALUE)\) TO \((?:'([^']+)'|MAXVALUE)\)")
+
+
+class Partition(NamedTuple):
+    name: str
+    lower: Union[datetime, None]  # None for MINVALUE
+    upper: Union[datetime, None]  # None for MAXVALUE
+
+
+def period_start(day: date, interval: str) -> date:
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_period(start: date, interval: str) -> date:
+    if interval == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=1)
+
+
+def partition_name(start: date, interval: str) -> str:
+    if interval == "month":
+        return f"events_p{start:%Y%m}"
+    return f"events_p{start:%Y%m%d}"
+
+
+def _to_utc(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+def _parse_bound(value: Union[str, None]) -> Union[datetime, None]:
+    if value is None:
+        return None
+    if re.search(r"[+-]\d\d$", value):
+        value += ":00"
+    return datetime.fromisoformat(value)
+
+
+def parse_partition_bound(name: str, bound: str) -> Union[Partition, None]:
+    """Parses `pg_get_expr(relpartbound)` output, `None` for the default partition"""
+    match = _BOUND_RE.search(bound)
+    if not match:
+        return None
+    return Partition(name, _parse_bound(match.group(1)), _parse_bound(match.group(2)))
+
+
+def retention_days(schema: str) -> Union[int, None]:
+    """Days of events kept for the tenant, per tenant overrides are set under
+    `events.partitions.tenant_retention_days.<schema>`, 0 keeps everything.
+    """
+    config = settings.events.partitions
+    overrides = config.get("tenant_retention_days") or {}
+    days = overrides.get(schema, config.retention_days)
+    return int(days) if days else None
+
+
+async def list_partitions(connection: AsyncConnection, schema: str) -> List[Partition]:
+    result = await connection.execute(
+        text(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            JOIN pg_namespace n ON n.oid = p.relnamespace
+            WHERE n.nspname = :schema AND p.relname = 'events'
+            """
+        ),
+        {"schema": schema},
+    )
+    partitions = [parse_partition_bound(name, bound) for name, bound in result.all()]
+    return [p for p in partitions if p is not None]
+
+
+async def is_partitioned(connection: AsyncConnection, schema: str) -> bool:
+    result = await connection.execute(
+        text(
+            """
+            SELECT c.relkind = 'p'
+            FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = :schema AND c.relname = 'events'
+            """
+        ),
+        {"schema": schema},
+    )
+    return bool(result.scalar())
+
+
+def _overlaps(partition: Partition, lower: datetime, upper: datetime) -> bool:
+    return (partition.lower is None or partition.lower < upper) and (
+        partition.upper is None or lower < partition.upper
+    )
+
+
+async def create_partition(
+    connection: AsyncConnection,
+    schema: str,
+    name: str,
+    lower: datetime,
+    upper: datetime,
+) -> None:
+    """Creates the partition for [lower, upper), moving the rows that already
+    landed in the default partition for that range.
+    """
+    bounds = {"lower": lower, "upper": upper}
+    await connection.execute(
+        text(
+            f'CREATE TABLE "{schema}"."{name}" '
+            f'(LIKE "{schema}".events INCLUDING DEFAULTS)'
+        )
+    )
+    moved = await connection.execute(
+        text(
+            f'WITH moved AS (DELETE FROM "{schema}".{DEFAULT_PARTITION} '
+            "WHERE created_at >= :lower AND created_at < :upper RETURNING *) "
+            f'INSERT INTO "{schema}"."{name}" SELECT * FROM moved'
+        ),
+        bounds,
+    )
+    await connection.execute(
+        text(
+            f'ALTER TABLE "{schema}".events ATTACH PARTITION "{schema}"."{name}" '
+            f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+    )
+    log.info(
+        f"Created partition '{schema}.{name}', moved {moved.rowcount} default rows"
+    )
+
+
+async def lock_partitions(connection: AsyncConnection, schema: str) -> None:
+    """Serializes the partition changes of a tenant across workers and nodes,
+    held until the transaction of `connection` ends.
+    """
+    await connection.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+        {"key": f"{schema}.events partitions"},
+    )
+
+
+async def ensure_partitions(
+    engine: AsyncEngine, schema: str, today: date, interval: str, premake: int
+) -> List[str]:
+    """Creates the partitions of the current period and `premake` periods ahead."""
+    created = []
+    async with engine.connect() as connection:
+        existing = await list_partitions(connection, schema)
+
+    start = period_start(today, interval)
+    for _ in range(premake + 1):
+        end = next_period(start, interval)
+        lower, upper = _to_utc(start), _to_utc(end)
+        if not any(_overlaps(p, lower, upper) for p in existing):
+            name = partition_name(start, interval)
+            async with engine.begin() as connection:
+                await lock_partitions(connection, schema)
+                # another worker may have created it while we waited
+                existing = await list_partitions(connection, schema)
+                if not any(_overlaps(p, lower, upper) for p in existing):
+                    await create_partition(connection, schema, name, lower, upper)
+                    existing.append(Partition(name, lower, upper))
+                    created.append(name)
+        start = end
+    return created
+
+
+async def apply_retention(
+    engine: AsyncEngine, schema: str, today: date, days: int, action: str
+) -> List[str]:
+    """Detaches or drops the partitions entirely older than `days` days."""
+    cutoff = _to_utc(today - timedelta(days=days))
+    removed = []
+    async with engine.connect() as connection:
+        existing = await list_partitions(connection, schema)
+    for partition in existing:
+        if partition.upper is None or partition.upper > cutoff:
+            continue
+        async with engine.begin() as connection:
+            await lock_partitions(connection, schema)
+            # another worker may have detached it while we waited
+            if partition not in await list_partitions(connection, schema):
+                continue
+            await connection.execute(
+                text(
+                    f'ALTER TABLE "{schema}".events '
+                    f'DETACH PARTITION "{schema}"."{partition.name}"'
+                )
+            )
+            if action == "drop":
+                await connection.execute(
+                    text(f'DROP TABLE "{schema}"."{partition.name}"')
+                )
+        log.info(f"Retention {action} of partition '{schema}.{partition.name}'")
+        removed.append(partition.name)
+    return removed
+
+
+async def manage_event_partitions(today: Union[date, None] = None) -> None:
+    """Creates upcoming partitions and applies retention for every tenant whose
+    events table is partitioned.
+    """
+    config = settings.events.partitions
+    if config.interval not in INTERVALS:
+        raise ValueError(f"events.partitions.interval must be one of {INTERVALS}")
+    today = today or datetime.now(timezone.utc).date()
+    # own engines, the job runs in a scheduler thread with its own event loop
+    primary = create_async_engine(settings.db.url, poolclass=pool.NullPool)
+    engines: Dict[str, AsyncEngine] = {DEFAULT_SHARD: primary}
+    try:
+        async with primary.connect() as connection:
+            result = await connection.execute(
+                text("SELECT schema, shard FROM public.tenants")
+            )
+            tenants = result.all()
+        for schema, shard in tenants:
+            try:
+                if shard not in engines:
+                    engines[shard] = create_async_engine(
+                        shards.url(shard), poolclass=pool.NullPool
+                    )
+                engine = engines[shard]
+                async with engine.connect() as connection:
+                    if not await is_partitioned(connection, schema):
+                        continue
+                await ensure_partitions(
+                    engine, schema, today, config.interval, int(config.premake)
+                )
+                days = retention_days(schema)
+                if days:
+                    await apply_retention(
+                        engine, schema, today, days, config.retention_action
+                    )
+            except Exception:
+                log.exception(f"Could not manage event partitions of '{schema}'")
+    finally:
+        for engine in engines.values():
+            await engine.dispose()
+
+
+@scheduler.add(schedule.every(1).hours, name="event-partitions")
+def manage_event_partitions_job():
+    asyncio.run(manage_event_partitions())
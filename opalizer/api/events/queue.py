@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Union
+from uuid import UUID
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from opalizer.api.events.fastpath import EventPayload, validate_event
+from opalizer.api.events.models import DeadLetterEvent, QueuedEvent
+from opalizer.api.events.schemas import EventSchemaIn
+from opalizer.api.tenants.models import Tenant
+from opalizer.config import settings
+from opalizer.database import resolve_tenant, with_async_db
+
+log = logging.getLogger(__name__)
+
+
+class ClaimedEvent(NamedTuple):
+    id: int
+    tenant_id: UUID
+    payload: Dict[str, Any]
+    attempts: int
+
+
+async def enqueue(
+    session: AsyncSession, tenant: Tenant, payloads: List[EventPayload]
+) -> int:
+    """Writes the raw event payloads to the durable queue.
+    :param session: public schema session
+    """
+    if not payloads:
+        return 0
+    await session.execute(
+        insert(QueuedEvent),
+        [
+            {"tenant_id": tenant.id, "payload": p.dict(), "attempts": 0}
+            for p in payloads
+        ],
+    )
+    await session.commit()
+    return len(payloads)
+
+
+async def claim(
+    session: AsyncSession, limit: int, lease_seconds: int
+) -> List[ClaimedEvent]:
+    """Claims up to `limit` available events with `FOR UPDATE SKIP LOCKED`.
+    Claimed events are leased for `lease_seconds`, an event whose consumer dies
+    becomes available again once the lease expires.
+    """
+    claimable = (
+        select(QueuedEvent.id)
+        .where(QueuedEvent.available_at <= func.now())
+        .order_by(QueuedEvent.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        update(QueuedEvent)
+        .where(QueuedEvent.id.in_(claimable))
+        .values(
+            available_at=func.now() + timedelta(seconds=lease_seconds),
+            attempts=QueuedEvent.attempts + 1,
+        )
+        .returning(
+            QueuedEvent.id,
+            QueuedEvent.tenant_id,
+            QueuedEvent.payload,
+            QueuedEvent.attempts,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    claimed = [ClaimedEvent(*row) for row in result.all()]
+    await session.commit()
+    return claimed
+
+
+async def extend_lease(
+    session: AsyncSession, events: List[ClaimedEvent], lease_seconds: int
+) -> None:
+    """Leases the claimed events for another `lease_seconds`"""
+    await session.execute(
+        update(QueuedEvent)
+        .where(QueuedEvent.id.in_([event.id for event in events]))
+        .values(available_at=func.now() + timedelta(seconds=lease_seconds))
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+
+
+async def complete(session: AsyncSession, event: ClaimedEvent) -> None:
+    await session.execute(
+        delete(QueuedEvent)
+        .where(QueuedEvent.id == event.id)
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+
+
+def backoff(attempts: int) -> int:
+    """Seconds to wait before the next attempt, doubling on every attempt"""
+    config = settings.events.queue
+    delay = int(config.backoff_seconds) * 2 ** max(attempts - 1, 0)
+    return min(delay, int(config.max_backoff_seconds))
+
+
+async def fail(session: AsyncSession, event: ClaimedEvent, error: str) -> None:
+    """Schedules a retry with backoff, or moves the event to the dead letters
+    once it ran out of attempts.
+    """
+    if event.attempts >= int(settings.events.queue.max_attempts):
+        await session.execute(
+            insert(DeadLetterEvent).values(
+                tenant_id=event.tenant_id,
+                payload=event.payload,
+                attempts=event.attempts,
+                error=error,
+            )
+        )
+        await session.execute(
+            delete(QueuedEvent)
+            .where(QueuedEvent.id == event.id)
+            .execution_options(synchronize_session=False)
+        )
+    else:
+        await session.execute(
+            update(QueuedEvent)
+            .where(QueuedEvent.id == event.id)
+            .values(
+                available_at=func.now() + timedelta(seconds=backoff(event.attempts)),
+                last_error=error,
+            )
+            .execution_options(synchronize_session=False)
+        )
+    await session.commit()
+
+
+async def dead_letter(
+    tenant: Tenant, payload: EventPayload, error: str, attempts: int = 1
+) -> None:
+    """Records an event that failed outside of the queue"""
+    async with with_async_db("public") as session:
+        await session.execute(
+            insert(DeadLetterEvent).values(
+                tenant_id=tenant.id,
+                payload=payload.dict(),
+                attempts=attempts,
+                error=error,
+            )
+        )
+        await session.commit()
+
+
+class EventQueueConsumer:
+    """Consumes the durable event queue with `concurrency` coroutines, each
+    claiming `batch_size` events at a time and passing them to `handler`.
+
+    Events are handled one after the other, the lease of the rest of a batch
+    is extended once half of it has passed and a handler taking longer than
+    `handler_timeout` fails, so that no lease expires while its batch is still
+    being worked on.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[EventPayload, Tenant], Awaitable[None]],
+        concurrency: int = 1,
+        batch_size: int = 10,
+        poll_interval: float = 0.5,
+        lease_seconds: int = 60,
+        handler_timeout: Union[float, None] = None,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.handler = handler
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.handler_timeout = handler_timeout or lease_seconds / 2
+        if self.handler_timeout > lease_seconds / 2:
+            raise ValueError("handler_timeout must be at most half of lease_seconds")
+        self._timer = timer
+        self.processed = 0
+        self.failed = 0
+        self._stopped = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    @classmethod
+    def from_settings(cls, handler, **overrides) -> "EventQueueConsumer":
+        config = settings.events.queue
+        options = {
+            "concurrency": int(config.concurrency),
+            "batch_size": int(config.batch_size),
+            "poll_interval": int(config.poll_interval_ms) / 1000,
+            "lease_seconds": int(config.lease_seconds),
+            "handler_timeout": float(config.handler_timeout_seconds),
+        }
+        options.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(handler, **options)
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._tasks = [
+            asyncio.create_task(self._consume(i)) for i in range(self.concurrency)
+        ]
+
+    async def stop(self) -> None:
+        """Lets the in-flight batches finish and stops consuming."""
+        self._stopped.set()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def run(self) -> None:
+        self.start()
+        await asyncio.gather(*self._tasks)
+
+    async def _consume(self, worker: int) -> None:
+        while not self._stopped.is_set():
+            try:
+                async with with_async_db("public") as session:
+                    events = await claim(session, self.batch_size, self.lease_seconds)
+            except Exception:
+                log.exception("Could not claim queued events")
+                events = []
+
+            await self.handle_batch(events)
+
+            if len(events) < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def handle_batch(self, events: List[ClaimedEvent]) -> None:
+        leased_at = self._timer()
+        for i, event in enumerate(events):
+            if self._timer() - leased_at >= self.lease_seconds / 2:
+                try:
+                    async with with_async_db("public") as session:
+                        await extend_lease(session, events[i:], self.lease_seconds)
+                    leased_at = self._timer()
+                except Exception:
+                    log.exception("Could not extend the lease of queued events")
+            await self.handle(event)
+
+    async def handle(self, event: ClaimedEvent) -> None:
+        try:
+            tenant = await resolve_tenant(str(event.tenant_id))
+            if tenant is None:
+                raise ValueError(f"Tenant {event.tenant_id} not found")
+            if settings.events.fast_path:
+                payload = validate_event(event.payload)
+            else:
+                payload = EventSchemaIn.parse_obj(event.payload)
+            await asyncio.wait_for(self.handler(payload, tenant), self.handler_timeout)
+            async with with_async_db("public") as session:
+                await complete(session, event)
+            self.processed += 1
+        except Exception as e:
+            self.failed += 1
+            log.warning(f"Queued event {event.id} failed - {str(e)}")
+            try:
+                async with with_async_db("public") as session:
+                    await fail(session, event, repr(e))
+            except Exception:
+                log.exception(f"Could not reschedule queued event {event.id}")
+
+    def stats(self) -> Dict[str, Union[int, bool]]:
+        return {
+            "processed": self.processed,
+            "failed": self.failed,
+            "running": bool(self._tasks) and not self._stopped.is_set(),
+        }
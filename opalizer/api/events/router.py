@@ -3,12 +3,20 @@ import logging
 from fastapi import APIRouter, BackgroundTasks, Depends, Request, Response, Security
 from fastapi import status as HttpStatus
 
+import opalizer.api.events.queue as eq
 import opalizer.api.events.service as es
-from opalizer.api.events.schemas import EventSchemaIn
+from opalizer.api.events.fastpath import EventValidationError, parse_event
+from opalizer.api.events.schemas import EventBatchResult, EventSchemaIn
+from opalizer.api.events.utils import parse_events_body, validate_events
 from opalizer.api.tenants.models import Tenant
 from opalizer.auth.key import validate_api_key
+from opalizer.config import settings
 from opalizer.core.rate_limiter import limiter
-from opalizer.database import get_async_db, get_public_async_db, get_tanant
+from opalizer.database import (
+    get_lazy_async_db,
+    get_lazy_public_async_db,
+    get_tanant,
+)
 from opalizer.schemas import RequestStatus, SingleResponse
 
 logger = logging.getLogger("opalizer.main")
@@ -28,16 +36,103 @@ async def create_event(
     payload: EventSchemaIn,
     background_tasks: BackgroundTasks,
     tenant: Tenant = Depends(get_tanant),
-    public_session=Depends(get_public_async_db),
-    private_session=Depends(get_async_db),
+    public_session=Depends(get_lazy_public_async_db),
 ) -> SingleResponse:
     try:
-        background_tasks.add_task(
-            es.process_event, payload, tenant, public_session, private_session
+        if settings.events.ingest_mode == "queue":
+            await eq.enqueue(public_session, tenant, [payload])
+            return SingleResponse(status=RequestStatus.success, value=None)
+
+        background_tasks.add_task(es.handle_event, payload, tenant)
+        background_tasks.add_task(es.process_impression, payload, tenant)
+        return SingleResponse(status=RequestStatus.success, value=None)
+    except Exception:
+        return SingleResponse(
+            status=RequestStatus.error, value=None, error="Internal error"
         )
+
+
+@events_router.post("/raw", status_code=HttpStatus.HTTP_200_OK)
+@limiter.limit("50/second")
+async def create_event_raw(
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    tenant: Tenant = Depends(get_tanant),
+    public_session=Depends(get_lazy_public_async_db),
+) -> SingleResponse:
+    """Same as `POST /v1/events/` with an `EventSchemaIn` body, validated by the
+    fast path straight from the request bytes.
+    """
+    try:
+        payload = parse_event(await request.body(), request.headers.get("content-type"))
+    except EventValidationError as e:
+        response.status_code = HttpStatus.HTTP_422_UNPROCESSABLE_ENTITY
+        return SingleResponse(status=RequestStatus.error, value=None, error=e.errors())
+
+    try:
+        if settings.events.ingest_mode == "queue":
+            await eq.enqueue(public_session, tenant, [payload])
+            return SingleResponse(status=RequestStatus.success, value=None)
+
+        background_tasks.add_task(es.handle_event, payload, tenant)
         background_tasks.add_task(es.process_impression, payload, tenant)
         return SingleResponse(status=RequestStatus.success, value=None)
     except Exception:
+        logger.exception("Error while processing raw event")
+        return SingleResponse(
+            status=RequestStatus.error, value=None, error="Internal error"
+        )
+
+
+@events_router.post("/batch", status_code=HttpStatus.HTTP_200_OK)
+@limiter.limit("10/second")
+async def create_events_batch(
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    tenant: Tenant = Depends(get_tanant),
+    public_session=Depends(get_lazy_public_async_db),
+    private_session=Depends(get_lazy_async_db),
+) -> SingleResponse:
+    """Accepts a JSON array or NDJSON (`application/x-ndjson`) body of events."""
+    try:
+        items = parse_events_body(
+            await request.body(), request.headers.get("content-type")
+        )
+    except ValueError as e:
+        response.status_code = HttpStatus.HTTP_400_BAD_REQUEST
+        return SingleResponse(status=RequestStatus.error, value=None, error=str(e))
+
+    max_size = int(settings.events.batch_max_size)
+    if len(items) > max_size:
+        response.status_code = HttpStatus.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        return SingleResponse(
+            status=RequestStatus.error,
+            value=None,
+            error=f"Batch size {len(items)} exceeds the maximum of {max_size} events.",
+        )
+
+    try:
+        payloads, errors = validate_events(items)
+        result = EventBatchResult(
+            received=len(items),
+            accepted=len(payloads),
+            rejected=len(errors),
+            errors=errors,
+        )
+        if settings.events.ingest_mode == "queue":
+            result.queued = await eq.enqueue(public_session, tenant, payloads)
+            return SingleResponse(status=RequestStatus.success, value=result)
+
+        stored = await es.create_events(private_session, payloads, tenant)
+        background_tasks.add_task(es.enrich_events, stored, tenant)
+        for payload in payloads:
+            background_tasks.add_task(es.process_impression, payload, tenant)
+        result.stored = len(stored)
+        return SingleResponse(status=RequestStatus.success, value=result)
+    except Exception:
+        logger.exception("Error while processing events batch")
         return SingleResponse(
             status=RequestStatus.error, value=None, error="Internal error"
         )
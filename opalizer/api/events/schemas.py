@@ -1,4 +1,4 @@
-from typing import Dict, Optional, Union
+from typing import Dict, List, Optional, Union
 
 from pydantic import Extra
 
@@ -33,3 +33,12 @@ class EventSchemaIn(ORJSONModel):
 
     class Config:
         extra = Extra.forbid
+
+
+class EventBatchResult(ORJSONModel):
+    received: int
+    accepted: int
+    rejected: int
+    stored: int = 0
+    queued: int = 0
+    errors: List[Dict] = []
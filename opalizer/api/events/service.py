@@ -1,82 +1,140 @@
-import uuid
-from typing import List
+import logging
+from typing import List, Union
 
-from asyncpg.exceptions import UniqueViolationError
-from sqlalchemy import text
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import opalizer.api.geomap.service as gs
-import opalizer.api.store.service as ss
-from opalizer.api.events.models import Address, Event
-from opalizer.api.events.schemas import EventSchemaIn
-from opalizer.api.events.utils import event_in_perimeter, parse_utm_values
+from opalizer.api.events.addresses import address_buffers
+from opalizer.api.events.buffer import event_buffers
+from opalizer.api.events.fastpath import EventPayload
+from opalizer.api.events.impressions import impression_counter
+from opalizer.api.events.models import Event
+from opalizer.api.events.queue import dead_letter
+from opalizer.api.events.utils import event_in_perimeter, event_values
+from opalizer.api.geomap.deferred import defer_geocoding
 from opalizer.api.geomap.models import GeoMap
-from opalizer.api.store.models import Store
+from opalizer.api.store.cache import get_store_index
 from opalizer.api.tenants.models import Tenant
+from opalizer.config import settings
 from opalizer.database import with_async_db
 
+log = logging.getLogger(__name__)
+
 
 async def process_event(
-    payload: EventSchemaIn,
+    payload: EventPayload,
     tenant: Tenant,
     public_session: AsyncSession,
     private_session: AsyncSession,
+    buffered: bool = True,
 ):
-    """ """
+    """Stores the event if it falls in a store perimeter and records its address.
+    :param buffered: hand the event row to the write-behind buffer when it is
+        enabled, callers that must know the row is stored pass `False`
+    """
     try:
-        stores: List[Store] = await ss.get_all(session=private_session)
+        stores = await get_store_index(tenant)
         if event_in_perimeter(stores=stores, e=payload):
-            new_event = Event(**payload.dict())
-            new_event.__dict__.update(
-                **parse_utm_values(payload.window_location_json.search)
-            )
-            address: GeoMap = await gs.get_address(
-                latitude=new_event.latitude, longitude=new_event.longitude
+            values = {**event_values(payload), "tenant_id": tenant.id}
+            address = await resolve_address(
+                tenant, latitude=payload.latitude, longitude=payload.longitude
             )
-            new_event.tenant_id = tenant.id
             await add_or_update_address(tenant, address)
-            private_session.add(new_event)
-            await private_session.commit()
-    except Exception as e:
-        print(e)
-        # TODo : add to deadletter
+            if buffered and settings.events.write_behind.enabled:
+                await event_buffers.put(tenant.schema, values)
+            else:
+                private_session.add(Event(**values))
+                await private_session.commit()
+    except Exception:
+        log.exception(f"Could not process event of tenant '{tenant.schema}'")
         raise
 
 
-async def add_or_update_address(tenant: Tenant, geomap: GeoMap):
+async def handle_event(payload: EventPayload, tenant: Tenant):
+    """Background task variant of `process_event` with its own sessions, failed
+    events are moved to the dead letters instead of being lost.
+    """
     try:
-        if geomap:
-            async with with_async_db(tenant_schema_name=tenant.schema) as session:
-                new_address = Address()
-                new_address.geohash = geomap.geohash
-                new_address.geomap_id = geomap.id
-                session.add(new_address)
-                await session.commit()
-    except IntegrityError as e:
-        if e.orig:
-            if e.orig.sqlstate == UniqueViolationError.sqlstate:
-                pass
-    except Exception:
-        raise
+        async with with_async_db("public") as public_session:
+            async with with_async_db(tenant.schema) as private_session:
+                await process_event(payload, tenant, public_session, private_session)
+    except Exception as e:
+        try:
+            await dead_letter(tenant, payload, repr(e))
+        except Exception:
+            log.exception(f"Could not dead letter event of tenant '{tenant.schema}'")
+
+
+async def process_queued_event(payload: EventPayload, tenant: Tenant):
+    """Processes an event claimed from the durable queue, the event row is
+    written before the queue entry is completed.
+    """
+    async with with_async_db("public") as public_session:
+        async with with_async_db(tenant.schema) as private_session:
+            await process_event(
+                payload, tenant, public_session, private_session, buffered=False
+            )
+    await process_impression(payload, tenant)
+
+
+async def create_events(
+    session: AsyncSession, payloads: List[EventPayload], tenant: Tenant
+) -> List[EventPayload]:
+    """Inserts the events that fall in a store perimeter in one bulk insert.
+    :returns the stored payloads
+    """
+    if not payloads:
+        return []
+    stores = await get_store_index(tenant)
+    accepted = [p for p in payloads if event_in_perimeter(stores=stores, e=p)]
+    if accepted:
+        rows = [{**event_values(p), "tenant_id": tenant.id} for p in accepted]
+        await session.execute(insert(Event), rows)
+        await session.commit()
+    return accepted
 
 
-async def process_impression(e: EventSchemaIn, tenant: Tenant):
+async def enrich_events(payloads: List[EventPayload], tenant: Tenant):
+    """Resolves and records the addresses of already stored events."""
+    for payload in payloads:
+        address = await resolve_address(
+            tenant, latitude=payload.latitude, longitude=payload.longitude
+        )
+        await add_or_update_address(tenant, address)
+
+
+async def resolve_address(
+    tenant: Tenant, latitude: float, longitude: float
+) -> Union[GeoMap, None]:
+    """Address of the location, `None` when there is none. Locations that can
+    not be geocoded now are deferred to be geocoded later, the event itself is
+    still stored.
+    """
+    try:
+        return await gs.get_address(latitude=latitude, longitude=longitude)
+    except gs.GeocodingUnavailable as e:
+        await defer_geocoding(tenant, latitude, longitude, str(e))
+        return None
+
+
+async def add_or_update_address(tenant: Tenant, geomap: Union[GeoMap, None]):
+    """Records the address of the tenant location, repeated locations are
+    skipped in memory and new ones inserted in batches.
+    """
+    if geomap:
+        await address_buffers.add(tenant.schema, geomap)
+
+
+async def store_address(tenant: Tenant, geomap: Union[GeoMap, None]):
+    """Records the address of the tenant location before returning, unlike
+    `add_or_update_address` a failed insert raises.
+    """
+    if geomap:
+        await address_buffers.store(tenant.schema, geomap)
+
+
+async def process_impression(e: EventPayload, tenant: Tenant):
     if not e.ga_user_id:
         return
-    try:
-        async with with_async_db(tenant_schema_name=tenant.schema) as session:
-            update_query = f"""
-                INSERT INTO {tenant.schema}.impressions(id, user_id, count)
-                VALUES ('{uuid.uuid4()}', '{e.ga_user_id}', 1)
-                ON CONFLICT (user_id)
-                DO UPDATE SET count = {tenant.schema}.impressions.count + 1
-            """
-            await session.execute(text(update_query))
-            await session.commit()
-    except IntegrityError as e:
-        if e.orig:
-            if e.orig.sqlstate == UniqueViolationError.sqlstate:
-                pass
-    except Exception:
-        raise
+    impression_counter.add(tenant.schema, e.ga_user_id)
@@ -1,10 +1,18 @@
-from typing import Dict, List
+from typing import Any, Dict, List, Tuple, Union
 from urllib.parse import parse_qs
 
-from geopy.distance import Distance, geodesic
+import orjson
+from pydantic import ValidationError
 
+from opalizer.api.events.fastpath import (
+    EventPayload,
+    EventValidationError,
+    validate_event,
+)
 from opalizer.api.events.schemas import EventSchemaIn
+from opalizer.api.store.index import StoreIndex
 from opalizer.api.store.models import Store
+from opalizer.config import settings
 
 
 def get_utm_keys() -> List[str]:
@@ -26,13 +34,64 @@ def parse_utm_values(q: str) -> Dict[str, str]:
     return result
 
 
-def event_in_perimeter(stores: List[Store], e: EventSchemaIn) -> bool:
-    if len(stores) <= 0:
-        return False
-    for s in stores:
-        store_point = (s.latitude, s.longitude)
-        radius = Distance(miles=s.radius)
-        event_point = (e.latitude, e.longitude)
-        if geodesic(store_point, event_point).miles <= radius:
-            return True
-    return False
+def event_in_perimeter(stores: Union[List[Store], StoreIndex], e: EventPayload) -> bool:
+    """Whether the event falls within the radius of any of the stores.
+    :param stores: stores or a prebuilt index of them, build the index once
+        when checking several events against the same stores
+    """
+    index = stores if isinstance(stores, StoreIndex) else StoreIndex(stores)
+    return index.contains(e.latitude, e.longitude)
+
+
+def event_values(payload: EventPayload) -> Dict[str, Any]:
+    """Column values of the `Event` row for the given payload"""
+    values = payload.dict()
+    values.update(parse_utm_values(values["window_location_json"]["search"] or ""))
+    return values
+
+
+def parse_events_body(body: bytes, content_type: Union[str, None]) -> List[Any]:
+    """Parse a batch request body, either a JSON array or NDJSON lines.
+    Malformed NDJSON lines are returned as `ValueError` items so that they can
+    be rejected individually.
+    :param body: raw request body
+    :param content_type: request content type header
+    """
+    if content_type and ("ndjson" in content_type or "jsonlines" in content_type):
+        items = []
+        for line in body.splitlines():
+            if not line.strip():
+                continue
+            try:
+                items.append(orjson.loads(line))
+            except orjson.JSONDecodeError as e:
+                items.append(ValueError(str(e)))
+        return items
+
+    try:
+        items = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON body - {str(e)}")
+    if not isinstance(items, list):
+        raise ValueError("Expected a JSON array of events.")
+    return items
+
+
+def validate_events(
+    items: List[Any],
+) -> Tuple[List[EventPayload], List[Dict]]:
+    """Validate all the batch items in one pass, with the fast path validator
+    when `events.fast_path` is enabled.
+    :returns valid payloads and the errors of rejected items by index
+    """
+    validate = validate_event if settings.events.fast_path else EventSchemaIn.parse_obj
+    payloads, errors = [], []
+    for index, item in enumerate(items):
+        if isinstance(item, ValueError):
+            errors.append({"index": index, "errors": [{"msg": str(item)}]})
+            continue
+        try:
+            payloads.append(validate(item))
+        except (ValidationError, EventValidationError) as e:
+            errors.append({"index": index, "errors": e.errors()})
+    return payloads, errors
@@ -0,0 +1,125 @@
+import re
+import unicodedata
+from collections import Counter
+from typing import Dict, Union
+
+import geohash
+
+from opalizer.config import settings
+from opalizer.core.cache import TTLCache
+from opalizer.core.circuit_breaker import CircuitBreaker
+from opalizer.core.singleflight import SingleFlight
+from opalizer.geolocator.gmaps import GEO_HASH_PRECISION
+
+TIERS = ("memory", "database", "geocoder")
+
+# negative cache entries
+NOT_FOUND, FAILED = "not_found", "failed"
+
+# geohash bucket -> GeoMap, geomaps never change once geocoded
+address_cache = TTLCache(
+    max_size=int(settings.geomap.cache_size),
+    ttl=float(settings.geomap.cache_ttl) or None,
+)
+
+# geohash bucket -> NOT_FOUND when the geocoder has no address for it, FAILED
+# when it failed, kept for `geomap.not_found_ttl` and `geomap.failed_ttl`
+not_found_cache = TTLCache(
+    max_size=int(settings.geomap.negative_cache_size),
+    ttl=float(settings.geomap.not_found_ttl),
+)
+failed_cache = TTLCache(
+    max_size=int(settings.geomap.negative_cache_size),
+    ttl=float(settings.geomap.failed_ttl),
+)
+
+# lookups answered by each tier, `not_found` counts the lookups that the
+# geocoder could not resolve either, `negative` the ones answered by the
+# negative caches and `failed` the geocoder failures
+lookups: Counter = Counter()
+
+geocoder_breaker = CircuitBreaker(
+    "geocoder",
+    failure_threshold=int(settings.geomap.circuit_breaker.failure_threshold),
+    reset_timeout=float(settings.geomap.circuit_breaker.reset_timeout),
+)
+
+# in-flight database and geocoder lookups by geohash bucket
+address_flights = SingleFlight()
+
+# normalized address -> (latitude, longitude), forward geocoding of stores
+geocode_cache = TTLCache(max_size=int(settings.geomap.geocode_cache_size), ttl=None)
+
+# forward geocoding lookups answered by each tier, `not_found` counts the
+# addresses the geocoder has no location for
+geocode_lookups: Counter = Counter()
+
+# in-flight forward geocoding lookups by normalized address
+geocode_flights = SingleFlight()
+
+
+def cache_precision() -> int:
+    """Geohash precision of the cache buckets, the stored geohash keeps the
+    full `GEO_HASH_PRECISION`.
+    """
+    precision = int(settings.geomap.cache_precision)
+    if not 1 <= precision <= GEO_HASH_PRECISION:
+        raise ValueError(
+            f"geomap.cache_precision must be between 1 and {GEO_HASH_PRECISION}"
+        )
+    return precision
+
+
+def address_bucket(latitude: float, longitude: float) -> str:
+    return geohash.encode(
+        latitude=latitude, longitude=longitude, precision=cache_precision()
+    )
+
+
+def normalize_address(address: str) -> str:
+    """Key of an address, case, accents, punctuation and spacing aside"""
+    address = unicodedata.normalize("NFKD", address)
+    address = "".join(c for c in address if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[\W_]+", " ", address.casefold()).split())
+
+
+def address_cache_stats() -> Dict[str, Union[int, float, Dict]]:
+    """Hits and hit rate of every tier, the rate of a tier is over the lookups
+    that reached it.
+    """
+    total = sum(lookups.values())
+    stats = {"precision": cache_precision(), "lookups": total}
+    # the negative caches are checked first
+    remaining = total - lookups["negative"]
+    for tier in TIERS:
+        hits = lookups[tier]
+        stats[tier] = {
+            "hits": hits,
+            "hit_rate": round(hits / remaining, 4) if remaining else 0.0,
+        }
+        remaining -= hits
+    stats["not_found"] = lookups["not_found"]
+    stats["negative"] = lookups["negative"]
+    stats["failed"] = lookups["failed"]
+    stats["coalesced"] = address_flights.coalesced
+    stats["circuit_breaker"] = geocoder_breaker.stats()
+    stats["memory"]["size"] = len(address_cache)
+    return stats
+
+
+def geocode_cache_stats() -> Dict[str, Union[int, float, Dict]]:
+    """Hits and hit rate of every forward geocoding tier"""
+    total = sum(geocode_lookups.values())
+    stats = {"lookups": total}
+    remaining = total
+    for tier in TIERS:
+        hits = geocode_lookups[tier]
+        stats[tier] = {
+            "hits": hits,
+            "hit_rate": round(hits / remaining, 4) if remaining else 0.0,
+        }
+        remaining -= hits
+    stats["not_found"] = geocode_lookups["not_found"]
+    stats["coalesced"] = geocode_flights.coalesced
+    stats["memory"]["size"] = len(geocode_cache)
+    return stats
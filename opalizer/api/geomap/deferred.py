@@ -0,0 +1,228 @@
+import asyncio
+import logging
+from datetime import timedelta
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Union
+from uuid import UUID
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from opalizer.api.geomap.cache import address_bucket, geocoder_breaker
+from opalizer.api.geomap.models import DeferredGeocode, GeoMap
+from opalizer.api.geomap.service import (
+    GeocoderCircuitOpen,
+    GeocodingUnavailable,
+    get_address,
+)
+from opalizer.api.tenants.models import Tenant
+from opalizer.config import settings
+from opalizer.database import resolve_tenant, with_async_db
+
+log = logging.getLogger(__name__)
+
+
+class ClaimedGeocode(NamedTuple):
+    id: int
+    tenant_id: UUID
+    latitude: float
+    longitude: float
+    attempts: int
+
+
+async def defer_geocoding(
+    tenant: Tenant, latitude: float, longitude: float, error: str
+) -> None:
+    """Records the location to be geocoded later, once per tenant and bucket"""
+    async with with_async_db("public") as session:
+        await session.execute(
+            pg_insert(DeferredGeocode)
+            .values(
+                tenant_id=tenant.id,
+                bucket=address_bucket(latitude, longitude),
+                latitude=latitude,
+                longitude=longitude,
+                attempts=0,
+                last_error=error,
+            )
+            .on_conflict_do_nothing(index_elements=["tenant_id", "bucket"])
+        )
+        await session.commit()
+
+
+async def claim(
+    session: AsyncSession, limit: int, lease_seconds: int
+) -> List[ClaimedGeocode]:
+    """Claims up to `limit` due locations with `FOR UPDATE SKIP LOCKED`, leased
+    for `lease_seconds`.
+    """
+    claimable = (
+        select(DeferredGeocode.id)
+        .where(DeferredGeocode.available_at <= func.now())
+        .order_by(DeferredGeocode.available_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        update(DeferredGeocode)
+        .where(DeferredGeocode.id.in_(claimable))
+        .values(
+            available_at=func.now() + timedelta(seconds=lease_seconds),
+            attempts=DeferredGeocode.attempts + 1,
+        )
+        .returning(
+            DeferredGeocode.id,
+            DeferredGeocode.tenant_id,
+            DeferredGeocode.latitude,
+            DeferredGeocode.longitude,
+            DeferredGeocode.attempts,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    claimed = [ClaimedGeocode(*row) for row in result.all()]
+    await session.commit()
+    return claimed
+
+
+async def complete(session: AsyncSession, item: ClaimedGeocode) -> None:
+    await session.execute(
+        delete(DeferredGeocode)
+        .where(DeferredGeocode.id == item.id)
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+
+
+def retry_delay(attempts: int, interval: int) -> int:
+    """Seconds before the next attempt, doubling up to six hours"""
+    return min(interval * 2 ** max(attempts - 1, 0), 6 * 3600)
+
+
+async def release(session: AsyncSession, items: List[ClaimedGeocode]) -> None:
+    """Gives the claimed locations back untried, their claim is not counted as
+    an attempt.
+    """
+    await session.execute(
+        update(DeferredGeocode)
+        .where(DeferredGeocode.id.in_([item.id for item in items]))
+        .values(available_at=func.now(), attempts=DeferredGeocode.attempts - 1)
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+
+
+async def reschedule(session: AsyncSession, item: ClaimedGeocode, error: str) -> None:
+    """Schedules the next attempt, or gives up after `max_attempts`"""
+    if item.attempts >= int(settings.geomap.deferred.max_attempts):
+        log.warning(
+            f"Giving up geocoding ({item.latitude}, {item.longitude}) of tenant "
+            f"{item.tenant_id} after {item.attempts} attempts - {error}"
+        )
+        await complete(session, item)
+        return
+    delay = retry_delay(item.attempts, int(settings.geomap.deferred.interval_seconds))
+    await session.execute(
+        update(DeferredGeocode)
+        .where(DeferredGeocode.id == item.id)
+        .values(
+            available_at=func.now() + timedelta(seconds=delay),
+            last_error=error,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    await session.commit()
+
+
+class DeferredGeocoder:
+    """Geocodes the deferred locations every `interval` seconds while the
+    geocoder circuit is not open, and passes the addresses to `handler`.
+    A location is completed once `handler` returned, a handler that raises
+    leaves it claimed until its lease expires and it is geocoded again.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Tenant, GeoMap], Awaitable[None]],
+        interval: float = 60.0,
+        batch_size: int = 50,
+    ) -> None:
+        self.handler = handler
+        self.interval = interval
+        self.batch_size = batch_size
+        self.geocoded = 0
+        self.failed = 0
+        self._task: Union[asyncio.Task, None] = None
+        self._stopped = asyncio.Event()
+
+    @classmethod
+    def from_settings(cls, handler) -> "DeferredGeocoder":
+        config = settings.geomap.deferred
+        return cls(
+            handler,
+            interval=float(config.interval_seconds),
+            batch_size=int(config.batch_size),
+        )
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                await self.run_once()
+            except Exception:
+                log.exception("Could not geocode the deferred locations")
+            try:
+                await asyncio.wait_for(self._stopped.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_once(self) -> int:
+        """Geocodes one batch of due locations.
+        :returns number of locations geocoded
+        """
+        if geocoder_breaker.state == geocoder_breaker.OPEN:
+            return 0
+        async with with_async_db("public") as session:
+            items = await claim(session, self.batch_size, int(self.interval) * 2)
+        geocoded = 0
+        for i, item in enumerate(items):
+            try:
+                await self.handle(item)
+                geocoded += 1
+            except GeocoderCircuitOpen:
+                # the trial call of the half open circuit failed, the rest of
+                # the batch waits for the circuit instead of using attempts
+                async with with_async_db("public") as session:
+                    await release(session, items[i:])
+                break
+            except GeocodingUnavailable as e:
+                self.failed += 1
+                async with with_async_db("public") as session:
+                    await reschedule(session, item, str(e))
+        self.geocoded += geocoded
+        return geocoded
+
+    async def handle(self, item: ClaimedGeocode) -> None:
+        tenant = await resolve_tenant(str(item.tenant_id))
+        if tenant is not None:
+            address = await get_address(item.latitude, item.longitude)
+            if address is not None:
+                await self.handler(tenant, address)
+        async with with_async_db("public") as session:
+            await complete(session, item)
+
+    def stats(self) -> Dict[str, Union[int, bool]]:
+        return {
+            "geocoded": self.geocoded,
+            "failed": self.failed,
+            "running": self._task is not None and not self._task.done(),
+        }
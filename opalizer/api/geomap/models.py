@@ -3,6 +3,7 @@ from uuid import uuid4
 import sqlalchemy as sa
 from sqlalchemy.sql import func
 
+from opalizer.api.tenants.models import Tenant
 from opalizer.shared_models import Base
 
 
@@ -12,12 +13,12 @@ class GeoMap(Base):
     id = sa.Column(
         "id", sa.UUID(as_uuid=True), primary_key=True, default=uuid4, nullable=False
     )
-    geohash = sa.Column(
-        "geohash", sa.String(16), nullable=False, index=True, unique=True
-    )
+    geohash = sa.Column("geohash", sa.String(16), nullable=False, index=True)
     latitude = sa.Column("latitude", sa.Float(), nullable=False)
     longitude = sa.Column("longitude", sa.Float(), nullable=False)
     address = sa.Column("address", sa.JSON(), nullable=False)
+    # reverse geocoding backend of the address, `geocoder.backend`
+    source = sa.Column("source", sa.String(16), nullable=False, server_default="gmaps")
 
     created_at = sa.Column(
         sa.TIMESTAMP(timezone=True), nullable=False, server_default=func.now()
@@ -26,4 +27,102 @@ class GeoMap(Base):
         sa.TIMESTAMP(timezone=True), default=None, onupdate=func.now()
     )
 
+    __table_args__ = (
+        sa.Index("public_geomaps_source_geohash_idx", "source", "geohash", unique=True),
+        # prefix lookups by cache bucket
+        sa.Index(
+            "public_geomaps_geohash_prefix_idx",
+            "geohash",
+            postgresql_ops={"geohash": "varchar_pattern_ops"},
+        ),
+        {"schema": "public"},
+    )
+
+
+class Geocode(Base):
+    """Forward geocoding of an address, keyed by its normalized form"""
+
+    __tablename__ = "geocodes"
+
+    id = sa.Column("id", sa.BigInteger(), sa.Identity(), primary_key=True)
+    address_key = sa.Column("address_key", sa.Text(), nullable=False, unique=True)
+    address = sa.Column("address", sa.Text(), nullable=False)
+    latitude = sa.Column("latitude", sa.Float(), nullable=False)
+    longitude = sa.Column("longitude", sa.Float(), nullable=False)
+
+    created_at = sa.Column(
+        sa.TIMESTAMP(timezone=True), nullable=False, server_default=func.now()
+    )
+
     __table_args__ = {"schema": "public"}
+
+
+class DeferredGeocode(Base):
+    """Tenant location that could not be geocoded, geocoded again later"""
+
+    __tablename__ = "deferred_geocodes"
+
+    id = sa.Column("id", sa.BigInteger(), sa.Identity(), primary_key=True)
+    tenant_id = sa.Column(
+        "tenant_id",
+        sa.UUID(as_uuid=True),
+        sa.ForeignKey(Tenant.id, ondelete="CASCADE"),
+        nullable=False,
+    )
+    bucket = sa.Column("bucket", sa.String(16), nullable=False)
+    latitude = sa.Column("latitude", sa.Float(), nullable=False)
+    longitude = sa.Column("longitude", sa.Float(), nullable=False)
+    attempts = sa.Column("attempts", sa.Integer(), nullable=False, default=0)
+    available_at = sa.Column(
+        sa.TIMESTAMP(timezone=True), nullable=False, server_default=func.now()
+    )
+    last_error = sa.Column("last_error", sa.Text(), nullable=True)
+
+    created_at = sa.Column(
+        sa.TIMESTAMP(timezone=True), nullable=False, server_default=func.now()
+    )
+
+    __table_args__ = (
+        sa.UniqueConstraint("tenant_id", "bucket"),
+        {"schema": "public"},
+    )
+
+
+class GeomapPrewarmJob(Base):
+    """Geomaps of the cells covering a store perimeter to geocode ahead of the
+    events, `cells_done` of `cells_total` are geocoded.
+    """
+
+    __tablename__ = "geomap_prewarm_jobs"
+
+    id = sa.Column("id", sa.BigInteger(), sa.Identity(), primary_key=True)
+    tenant_id = sa.Column(
+        "tenant_id",
+        sa.UUID(as_uuid=True),
+        sa.ForeignKey(Tenant.id, ondelete="CASCADE"),
+        nullable=False,
+    )
+    store_id = sa.Column("store_id", sa.UUID(as_uuid=True), nullable=False)
+    latitude = sa.Column("latitude", sa.Float(), nullable=False)
+    longitude = sa.Column("longitude", sa.Float(), nullable=False)
+    radius_km = sa.Column("radius_km", sa.Float(), nullable=False)
+    cell_precision = sa.Column("cell_precision", sa.SmallInteger(), nullable=False)
+    cells_done = sa.Column("cells_done", sa.Integer(), nullable=False, default=0)
+    cells_total = sa.Column("cells_total", sa.Integer(), nullable=True)
+    attempts = sa.Column("attempts", sa.Integer(), nullable=False, default=0)
+    available_at = sa.Column(
+        sa.TIMESTAMP(timezone=True), nullable=False, server_default=func.now()
+    )
+    last_error = sa.Column("last_error", sa.Text(), nullable=True)
+
+    created_at = sa.Column(
+        sa.TIMESTAMP(timezone=True), nullable=False, server_default=func.now()
+    )
+    updated_at = sa.Column(
+        sa.TIMESTAMP(timezone=True), default=None, onupdate=func.now()
+    )
+
+    __table_args__ = (
+        sa.UniqueConstraint("tenant_id", "store_id"),
+        {"schema": "public"},
+    )
@@ -0,0 +1,277 @@
+import asyncio
+import heapq
+import logging
+from datetime import timedelta
+from typing import Dict, List, NamedTuple, Union
+
+import geohash
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from opalizer.api.geomap.cache import cache_precision, geocoder_breaker
+from opalizer.api.geomap.deferred import retry_delay
+from opalizer.api.geomap.models import GeomapPrewarmJob
+from opalizer.api.geomap.service import GeocodingUnavailable, get_address
+from opalizer.api.store.index import perimeter_km
+from opalizer.api.store.models import Store
+from opalizer.api.tenants.models import Tenant
+from opalizer.config import settings
+from opalizer.core.rate_limiter import TokenBucket
+from opalizer.database import with_async_db
+from opalizer.geolocator.offline import haversine_km
+
+log = logging.getLogger(__name__)
+
+
+class ClaimedPrewarm(NamedTuple):
+    id: int
+    latitude: float
+    longitude: float
+    radius_km: float
+    cell_precision: int
+    cells_done: int
+    attempts: int
+
+
+def _distance_to_cell(latitude: float, longitude: float, cell: str) -> float:
+    """Kilometers from the location to the closest point of the geohash cell"""
+    box = geohash.bbox(cell)
+    return haversine_km(
+        latitude,
+        longitude,
+        min(max(latitude, box["s"]), box["n"]),
+        min(max(longitude, box["w"]), box["e"]),
+    )
+
+
+def covering_cells(
+    latitude: float, longitude: float, radius_km: float, precision: int, limit: int
+) -> List[str]:
+    """Geohash cells of `precision` overlapping the circle, nearest first and at
+    most `limit` of them. The order is stable, a job resumes at its index.
+    """
+    first = geohash.encode(latitude, longitude, precision)
+    heap, seen, cells = [(0.0, first)], {first}, []
+    while heap and len(cells) < limit:
+        _, cell = heapq.heappop(heap)
+        cells.append(cell)
+        for neighbor in geohash.neighbors(cell):
+            if neighbor in seen:
+                continue
+            seen.add(neighbor)
+            distance = _distance_to_cell(latitude, longitude, neighbor)
+            if distance <= radius_km:
+                heapq.heappush(heap, (distance, neighbor))
+    return cells
+
+
+async def schedule_prewarm(tenant: Tenant, stores: List[Store]) -> None:
+    """Records a prewarm job for the perimeter of every new store, once per store"""
+    if not settings.geomap.prewarm.enabled or not stores:
+        return
+    precision = cache_precision()
+    async with with_async_db("public") as session:
+        await session.execute(
+            pg_insert(GeomapPrewarmJob)
+            .values(
+                [
+                    {
+                        "tenant_id": tenant.id,
+                        "store_id": store.id,
+                        "latitude": store.latitude,
+                        "longitude": store.longitude,
+                        "radius_km": perimeter_km(store.radius),
+                        "cell_precision": precision,
+                        "cells_done": 0,
+                        "attempts": 0,
+                    }
+                    for store in stores
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=["tenant_id", "store_id"])
+        )
+        await session.commit()
+
+
+async def claim(
+    session: AsyncSession, limit: int, lease_seconds: int
+) -> List[ClaimedPrewarm]:
+    """Claims up to `limit` due jobs with `FOR UPDATE SKIP LOCKED`, leased for
+    `lease_seconds`.
+    """
+    claimable = (
+        select(GeomapPrewarmJob.id)
+        .where(GeomapPrewarmJob.available_at <= func.now())
+        .order_by(GeomapPrewarmJob.available_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    result = await session.execute(
+        update(GeomapPrewarmJob)
+        .where(GeomapPrewarmJob.id.in_(claimable))
+        .values(available_at=func.now() + timedelta(seconds=lease_seconds))
+        .returning(
+            GeomapPrewarmJob.id,
+            GeomapPrewarmJob.latitude,
+            GeomapPrewarmJob.longitude,
+            GeomapPrewarmJob.radius_km,
+            GeomapPrewarmJob.cell_precision,
+            GeomapPrewarmJob.cells_done,
+            GeomapPrewarmJob.attempts,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    claimed = [ClaimedPrewarm(*row) for row in result.all()]
+    await session.commit()
+    return claimed
+
+
+async def save_progress(
+    session: AsyncSession,
+    job: ClaimedPrewarm,
+    cells_done: int,
+    cells_total: int,
+    error: Union[str, None] = None,
+) -> None:
+    """Records the cells done, the job is deleted once all are. A failed job is
+    retried with backoff and given up after `max_attempts` failures in a row.
+    """
+    config = settings.geomap.prewarm
+    if cells_done >= cells_total:
+        statement = delete(GeomapPrewarmJob).where(GeomapPrewarmJob.id == job.id)
+    elif error is not None and job.attempts + 1 >= int(config.max_attempts):
+        log.warning(
+            f"Giving up prewarming geomaps around ({job.latitude}, "
+            f"{job.longitude}) at {cells_done}/{cells_total} cells - {error}"
+        )
+        statement = delete(GeomapPrewarmJob).where(GeomapPrewarmJob.id == job.id)
+    else:
+        attempts, delay = 0, 0
+        if error is not None:
+            attempts = job.attempts + 1
+            delay = retry_delay(attempts, int(config.interval_seconds))
+        statement = (
+            update(GeomapPrewarmJob)
+            .where(GeomapPrewarmJob.id == job.id)
+            .values(
+                cells_done=cells_done,
+                cells_total=cells_total,
+                attempts=attempts,
+                available_at=func.now() + timedelta(seconds=delay),
+                last_error=error,
+            )
+        )
+    await session.execute(statement.execution_options(synchronize_session=False))
+    await session.commit()
+
+
+class GeomapPrewarmer:
+    """Geocodes the cells around new stores every `interval` seconds, up to
+    `chunk_size` cells per job and run at `rate_per_second`, so that the first
+    events of a store find their address in `public.geomaps`.
+
+    Progress is saved after every chunk, a job interrupted by a failure, a
+    shutdown or an open geocoder circuit resumes at the first cell not done.
+    """
+
+    def __init__(
+        self,
+        interval: float = 30.0,
+        batch_size: int = 5,
+        chunk_size: int = 50,
+        max_cells: int = 25,
+        rate_per_second: float = 2.0,
+    ) -> None:
+        self.interval = interval
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.max_cells = max_cells
+        self.rate_limit = TokenBucket(rate=rate_per_second, capacity=1)
+        self.warmed = 0
+        self.failed = 0
+        self._task: Union[asyncio.Task, None] = None
+        self._stopped = asyncio.Event()
+
+    @classmethod
+    def from_settings(cls) -> "GeomapPrewarmer":
+        config = settings.geomap.prewarm
+        return cls(
+            interval=float(config.interval_seconds),
+            batch_size=int(config.batch_size),
+            chunk_size=int(config.chunk_size),
+            max_cells=int(config.max_cells),
+            rate_per_second=float(config.rate_per_second),
+        )
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                await self.run_once()
+            except Exception:
+                log.exception("Could not prewarm the geomaps")
+            try:
+                await asyncio.wait_for(self._stopped.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_once(self) -> int:
+        """Prewarms one chunk of every claimed job.
+        :returns number of cells geocoded
+        """
+        if geocoder_breaker.state == geocoder_breaker.OPEN:
+            return 0
+        # enough for every claimed chunk at the rate limit
+        cells = self.batch_size * self.chunk_size
+        lease = int(self.interval + 2 * cells / self.rate_limit.rate)
+        async with with_async_db("public") as session:
+            jobs = await claim(session, self.batch_size, lease)
+        warmed = 0
+        for job in jobs:
+            warmed += await self.warm(job)
+        return warmed
+
+    async def warm(self, job: ClaimedPrewarm) -> int:
+        cells = covering_cells(
+            job.latitude,
+            job.longitude,
+            job.radius_km,
+            job.cell_precision,
+            self.max_cells,
+        )
+        done, error = job.cells_done, None
+        for cell in cells[done : done + self.chunk_size]:
+            if self._stopped.is_set():
+                break
+            await self.rate_limit.acquire()
+            latitude, longitude = geohash.decode(cell)
+            try:
+                await get_address(latitude, longitude)
+            except GeocodingUnavailable as e:
+                self.failed += 1
+                error = str(e)
+                break
+            done += 1
+        warmed = done - job.cells_done
+        self.warmed += warmed
+        async with with_async_db("public") as session:
+            await save_progress(session, job, done, len(cells), error)
+        return warmed
+
+    def stats(self) -> Dict[str, Union[int, bool]]:
+        return {
+            "warmed": self.warmed,
+            "failed": self.failed,
+            "running": self._task is not None and not self._task.done(),
+        }
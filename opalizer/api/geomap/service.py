@@ -1,45 +1,187 @@
-from typing import Union
+from typing import Tuple, Union
 
 import geohash
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from opalizer.api.geomap.models import GeoMap
+from opalizer.api.geomap.cache import (
+    FAILED,
+    NOT_FOUND,
+    address_bucket,
+    address_cache,
+    address_flights,
+    failed_cache,
+    geocode_cache,
+    geocode_flights,
+    geocode_lookups,
+    geocoder_breaker,
+    lookups,
+    normalize_address,
+    not_found_cache,
+)
+from opalizer.api.geomap.models import Geocode, GeoMap
+from opalizer.api.store.schemas import StoreSchemaIn
+from opalizer.core.circuit_breaker import CircuitOpenError
 from opalizer.database import with_async_db
+from opalizer.geolocator.backend import reverse_backend, reverse_geocoder
 from opalizer.geolocator.gmaps import GEO_HASH_PRECISION, gmaps
 
 
+class GeocodingUnavailable(Exception):
+    """The geocoder failed or its circuit is open, the location is to be
+    geocoded again later.
+    """
+
+
+class GeocoderCircuitOpen(GeocodingUnavailable):
+    """The geocoder circuit rejected the call, the geocoder was not tried"""
+
+
 async def get_address(latitude: float, longitude: float) -> Union[GeoMap, None]:
-    async with with_async_db("public") as session:
-        address = await _get_address(
-            session=session, latitude=latitude, longitude=longitude
-        )
+    """Address of the location, `None` when the geocoder has none.
+    :raises GeocodingUnavailable: the location could not be geocoded now
+    """
+    bucket = address_bucket(latitude, longitude)
+    if not_found_cache.get(bucket) is not None:
+        lookups["negative"] += 1
+        return None
+    if failed_cache.get(bucket) is not None:
+        lookups["negative"] += 1
+        raise GeocodingUnavailable(f"Geocoding of bucket '{bucket}' recently failed")
+    address = address_cache.get(bucket)
+    if address is not None:
+        lookups["memory"] += 1
         return address
+    return await address_flights.do(
+        bucket, _lookup_address, latitude=latitude, longitude=longitude, bucket=bucket
+    )
+
+
+async def _lookup_address(
+    latitude: float, longitude: float, bucket: str
+) -> Union[GeoMap, None]:
+    address = await _get_address(latitude=latitude, longitude=longitude, bucket=bucket)
+    if address is not None:
+        address_cache.set(bucket, address)
+    return address
+
+
+async def _find_address(
+    session: AsyncSession, bucket: str, source: str
+) -> Union[GeoMap, None]:
+    result = await session.execute(
+        select(GeoMap)
+        .where(GeoMap.source == source, GeoMap.geohash.like(f"{bucket}%"))
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
 
 
 async def _get_address(
-    session: AsyncSession, latitude: float, longitude: float
+    latitude: float,
+    longitude: float,
+    bucket: Union[str, None] = None,
 ) -> Union[GeoMap, None]:
+    """Address of any geocoded point within the geohash bucket of the location,
+    the location is geocoded and stored when the bucket has none yet.
+    No connection is held while the geocoder is called, workers missing the
+    bucket at the same time may each geocode it, the first stored wins.
+    Addresses are kept by geocoding backend, the city level ones of the
+    offline geocoder are not served once back on gmaps.
+    """
+    bucket = bucket or address_bucket(latitude, longitude)
+    source = reverse_backend()
+    async with with_async_db("public") as session:
+        address = await _find_address(session, bucket, source)
+    if address:
+        lookups["database"] += 1
+        return address
+
     try:
-        hash = geohash.encode(
-            latitude=latitude, longitude=longitude, precision=GEO_HASH_PRECISION
+        address = await geocoder_breaker.call(
+            reverse_geocoder().get_address, latitude, longitude
         )
-        result = await session.execute(select(GeoMap).where(GeoMap.geohash == hash))
-        address = result.scalar_one_or_none()
-        if address:
-            return address
-
-        address = await gmaps.get_address(latitude, longitude)
-        if address:
-            geomap = GeoMap()
-            geomap.address = address._raw
-            geomap.geohash = hash
-            geomap.latitude = latitude
-            geomap.longitude = longitude
-            session.add(geomap)
-            await session.commit()
-            await session.refresh(geomap)
-            return geomap
+    except CircuitOpenError as e:
+        lookups["failed"] += 1
+        raise GeocoderCircuitOpen(str(e)) from e
+    except Exception as e:
+        lookups["failed"] += 1
+        failed_cache.set(bucket, FAILED)
+        raise GeocodingUnavailable(f"Geocoding failed - {repr(e)}") from e
+    if not address:
+        lookups["not_found"] += 1
+        not_found_cache.set(bucket, NOT_FOUND)
         return None
-    except Exception:
-        raise
+
+    lookups["geocoder"] += 1
+    geomap = GeoMap()
+    geomap.address = address._raw
+    geomap.geohash = geohash.encode(
+        latitude=latitude, longitude=longitude, precision=GEO_HASH_PRECISION
+    )
+    geomap.latitude = latitude
+    geomap.longitude = longitude
+    geomap.source = source
+    async with with_async_db("public") as session:
+        session.add(geomap)
+        try:
+            await session.commit()
+        except IntegrityError:
+            # stored meanwhile by another worker
+            await session.rollback()
+            return await _find_address(session, bucket, source)
+        await session.refresh(geomap)
+    return geomap
+
+
+async def get_geocode(address: StoreSchemaIn) -> Union[Tuple[float, float], None]:
+    """Location of a store address, `None` when the geocoder has none.
+    Addresses are cached by their normalized form, in memory and in
+    `public.geocodes`, so that the same address is geocoded once.
+    """
+    key = normalize_address(str(address))
+    location = geocode_cache.get(key)
+    if location is not None:
+        geocode_lookups["memory"] += 1
+        return location
+    return await geocode_flights.do(
+        key, _lookup_geocode, address=address, address_key=key
+    )
+
+
+async def _lookup_geocode(
+    address: StoreSchemaIn, address_key: str
+) -> Union[Tuple[float, float], None]:
+    async with with_async_db("public") as session:
+        result = await session.execute(
+            select(Geocode.latitude, Geocode.longitude).where(
+                Geocode.address_key == address_key
+            )
+        )
+        row = result.first()
+    if row is not None:
+        geocode_lookups["database"] += 1
+        location = (row.latitude, row.longitude)
+    else:
+        # no connection is held while waiting for gmaps
+        location = await gmaps.get_geocode(address)
+        if location is None:
+            geocode_lookups["not_found"] += 1
+            return None
+        geocode_lookups["geocoder"] += 1
+        async with with_async_db("public") as session:
+            await session.execute(
+                pg_insert(Geocode)
+                .values(
+                    address_key=address_key,
+                    address=str(address),
+                    latitude=location[0],
+                    longitude=location[1],
+                )
+                .on_conflict_do_nothing(index_elements=["address_key"])
+            )
+            await session.commit()
+    geocode_cache.set(address_key, location)
+    return location
@@ -0,0 +1,297 @@
+import asyncio
+import csv
+import io
+import logging
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple, Union
+from uuid import UUID, uuid4
+
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import opalizer.api.geomap.service as gs
+from opalizer.api.geomap.cache import normalize_address
+from opalizer.api.geomap.prewarm import schedule_prewarm
+from opalizer.api.store.models import Store, StoreImportJob
+from opalizer.api.store.schemas import StoreSchemaIn
+from opalizer.api.tenants.models import Tenant
+from opalizer.config import settings
+from opalizer.core.invalidation import invalidation_bus
+from opalizer.database import with_async_db
+
+log = logging.getLogger(__name__)
+
+# (row index, store) of the rows still being imported
+ImportRow = Tuple[int, StoreSchemaIn]
+
+
+def parse_stores_body(body: bytes, content_type: Union[str, None]) -> List[Any]:
+    """Parse a bulk import body, CSV with a header row (`text/csv`) or JSON
+    lines of stores. Malformed lines are returned as `ValueError` items so
+    that they can be rejected individually.
+    """
+    if content_type and "csv" in content_type:
+        try:
+            text = body.decode("utf-8-sig")
+        except UnicodeDecodeError as e:
+            raise ValueError(f"Invalid CSV body - {str(e)}")
+        rows = []
+        for row in csv.DictReader(io.StringIO(text)):
+            # blank cells are missing values, extra cells have no header
+            rows.append(
+                {
+                    k.strip(): v.strip()
+                    for k, v in row.items()
+                    if k and isinstance(v, str) and v.strip()
+                }
+            )
+        return rows
+
+    items = []
+    for line in body.splitlines():
+        if not line.strip():
+            continue
+        try:
+            items.append(orjson.loads(line))
+        except orjson.JSONDecodeError as e:
+            items.append(ValueError(str(e)))
+    return items
+
+
+def validate_stores(items: List[Any]) -> Tuple[List[ImportRow], List[Dict]]:
+    """Validate all the rows, rejecting the names repeated within the import.
+    :returns valid rows and the errors of rejected rows by index
+    """
+    rows, errors, names = [], [], set()
+    for index, item in enumerate(items):
+        if isinstance(item, ValueError):
+            errors.append(row_error(index, str(item)))
+            continue
+        try:
+            payload = StoreSchemaIn.parse_obj(item)
+        except ValidationError as e:
+            errors.append({"index": index, "errors": e.errors()})
+            continue
+        if payload.name in names:
+            errors.append(row_error(index, f"Store name '{payload.name}' is repeated."))
+            continue
+        names.add(payload.name)
+        rows.append((index, payload))
+    return rows, errors
+
+
+def row_error(index: int, msg: str) -> Dict:
+    return {"index": index, "errors": [{"msg": msg}]}
+
+
+def address_key(payload: StoreSchemaIn) -> str:
+    """Rows with the same normalized address are geocoded once"""
+    return normalize_address(str(payload))
+
+
+async def create_import_job(
+    session: AsyncSession, tenant: Tenant, total: int, errors: List[Dict]
+) -> StoreImportJob:
+    """:param session: public schema session"""
+    job = StoreImportJob(
+        tenant_id=tenant.id,
+        status="running",
+        total=total,
+        geocoded=0,
+        created=0,
+        failed=len(errors),
+        errors=errors,
+    )
+    session.add(job)
+    await session.commit()
+    await session.refresh(job)
+    return job
+
+
+async def get_import_job(
+    session: AsyncSession, tenant: Tenant, id: UUID
+) -> Union[StoreImportJob, None]:
+    result = await session.execute(
+        select(StoreImportJob).where(
+            StoreImportJob.id == id, StoreImportJob.tenant_id == tenant.id
+        )
+    )
+    return result.scalar_one_or_none()
+
+
+class StoreImport:
+    """Imports validated rows into the tenant stores.
+
+    Rows whose name is taken are rejected, distinct addresses are geocoded
+    `concurrency` at a time and the stores are inserted `batch_size` at a
+    time. The job row is updated along the way with the progress and the
+    errors of the rejected rows. Geomaps are prewarmed around the first
+    `prewarm_stores` stores only, every prewarmed store costs geocoder calls.
+    """
+
+    def __init__(
+        self,
+        job_id: UUID,
+        tenant: Tenant,
+        errors: List[Dict],
+        concurrency: int = 10,
+        batch_size: int = 500,
+        prewarm_stores: int = 10,
+    ) -> None:
+        self.job_id = job_id
+        self.tenant = tenant
+        self.errors = errors
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.prewarm_stores = prewarm_stores
+        self.prewarmed = 0
+        self.geocoded = 0
+        self.created = 0
+        self._saved = 0
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_settings(cls, job_id: UUID, tenant: Tenant, errors: List[Dict]):
+        config = settings.stores.bulk
+        return cls(
+            job_id,
+            tenant,
+            errors,
+            concurrency=int(config.geocode_concurrency),
+            batch_size=int(config.batch_size),
+            prewarm_stores=int(settings.geomap.prewarm.max_stores_per_import),
+        )
+
+    async def run(self, rows: List[ImportRow]) -> None:
+        try:
+            rows = await self.reject_taken_names(rows)
+            located = await self.geocode(rows)
+            for start in range(0, len(located), self.batch_size):
+                await self.insert(located[start : start + self.batch_size])
+            await self.save(status="done", finished_at=func.now())
+        except Exception:
+            log.exception(f"Store import {self.job_id} of '{self.tenant.schema}'")
+            await self.save(status="failed", finished_at=func.now())
+
+    async def reject_taken_names(self, rows: List[ImportRow]) -> List[ImportRow]:
+        taken = set()
+        async with with_async_db(self.tenant.schema) as session:
+            for start in range(0, len(rows), self.batch_size):
+                names = [p.name for _, p in rows[start : start + self.batch_size]]
+                result = await session.execute(
+                    select(Store.name).where(Store.name.in_(names))
+                )
+                taken.update(result.scalars().all())
+        for index, payload in rows:
+            if payload.name in taken:
+                self.errors.append(
+                    row_error(index, f"Store name '{payload.name}' is not available.")
+                )
+        return [(i, p) for i, p in rows if p.name not in taken]
+
+    async def geocode(
+        self, rows: List[ImportRow]
+    ) -> List[Tuple[int, StoreSchemaIn, Tuple[float, float]]]:
+        """Geocodes every distinct address once.
+        :returns rows with their location, in row order
+        """
+        groups: Dict[str, List[ImportRow]] = defaultdict(list)
+        for index, payload in rows:
+            groups[address_key(payload)].append((index, payload))
+        semaphore = asyncio.Semaphore(self.concurrency)
+        located = []
+
+        async def locate(group: List[ImportRow]) -> None:
+            async with semaphore:
+                try:
+                    location = await gs.get_geocode(group[0][1])
+                    error = "Address not found."
+                except Exception as e:
+                    location, error = None, f"Geocoding failed - {repr(e)}"
+            for index, payload in group:
+                if location:
+                    located.append((index, payload, location))
+                else:
+                    self.errors.append(row_error(index, error))
+            self.geocoded += len(group)
+            if self.geocoded - self._saved >= self.batch_size:
+                await self.save()
+
+        await asyncio.gather(*(locate(group) for group in groups.values()))
+        located.sort(key=lambda row: row[0])
+        return located
+
+    async def insert(
+        self, rows: List[Tuple[int, StoreSchemaIn, Tuple[float, float]]]
+    ) -> None:
+        values = [
+            {
+                "id": uuid4(),
+                "name": payload.name,
+                "owner": payload.owner,
+                "latitude": latitude,
+                "longitude": longitude,
+                "radius": payload.radius,
+                "tenant_id": self.tenant.id,
+            }
+            for _, payload, (latitude, longitude) in rows
+        ]
+        async with with_async_db(self.tenant.schema) as session:
+            result = await session.execute(
+                pg_insert(Store)
+                .values(values)
+                .on_conflict_do_nothing()
+                .returning(
+                    Store.id, Store.name, Store.latitude, Store.longitude, Store.radius
+                )
+            )
+            stored = result.all()
+            await session.commit()
+
+        names = {store.name for store in stored}
+        for index, payload, _ in rows:
+            if payload.name not in names:
+                self.errors.append(
+                    row_error(index, "Unique field values are required.")
+                )
+        self.created += len(stored)
+        if stored:
+            await invalidation_bus.publish("store", self.tenant.schema)
+            try:
+                await self.prewarm(stored)
+            except Exception:
+                log.exception(f"Could not schedule geomap prewarm of {self.job_id}")
+        await self.save()
+
+    async def prewarm(self, stored: List[Store]) -> None:
+        stores = stored[: max(self.prewarm_stores - self.prewarmed, 0)]
+        if stores:
+            await schedule_prewarm(self.tenant, stores)
+            self.prewarmed += len(stores)
+
+    async def save(self, **values) -> None:
+        async with self._lock:
+            self._saved = self.geocoded
+            async with with_async_db("public") as session:
+                await session.execute(
+                    update(StoreImportJob)
+                    .where(StoreImportJob.id == self.job_id)
+                    .values(
+                        geocoded=self.geocoded,
+                        created=self.created,
+                        failed=len(self.errors),
+                        errors=sorted(self.errors, key=lambda e: e["index"]),
+                        **values,
+                    )
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+
+
+async def run_import(
+    job_id: UUID, tenant: Tenant, rows: List[ImportRow], errors: List[Dict]
+) -> None:
+    await StoreImport.from_settings(job_id, tenant, errors).run(rows)
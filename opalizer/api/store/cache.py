@@ -0,0 +1,99 @@
+import asyncio
+from typing import NamedTuple, Union
+from uuid import UUID
+
+from sqlalchemy import select
+
+from opalizer.api.store.index import StoreIndex
+from opalizer.api.store.models import Store
+from opalizer.api.tenants.models import Tenant
+from opalizer.config import settings
+from opalizer.core.cache import TTLCache
+from opalizer.core.invalidation import invalidation_bus
+from opalizer.database import with_async_db
+
+
+class StoreRow(NamedTuple):
+    """Compact, read only store used on the event hot path"""
+
+    id: UUID
+    latitude: float
+    longitude: float
+    radius: float
+
+
+# tenant schema -> StoreIndex over the tenant's StoreRows
+store_snapshots = TTLCache(max_size=int(settings.store_cache.max_tenants), ttl=None)
+
+
+class SnapshotLoader:
+    """Serializes the loads of a tenant snapshot, `generation` is bumped by the
+    invalidations so that a load overtaken by one is not cached.
+    """
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.generation = 0
+
+
+# tenant schema -> SnapshotLoader, bounded like the snapshots
+_loaders = TTLCache(max_size=int(settings.store_cache.max_tenants), ttl=None)
+
+
+def snapshot_loader(schema: str) -> SnapshotLoader:
+    loader = _loaders.get(schema)
+    if loader is None:
+        loader = SnapshotLoader()
+        _loaders.set(schema, loader)
+    return loader
+
+
+async def load_store_index(schema: str) -> StoreIndex:
+    # from the primary, a replica behind it would miss the store whose creation
+    # invalidated the snapshot, which is then kept until the next invalidation
+    async with with_async_db(schema) as session:
+        result = await session.execute(
+            select(Store.id, Store.latitude, Store.longitude, Store.radius)
+        )
+        return StoreIndex(StoreRow(*row) for row in result.all())
+
+
+async def get_store_index(tenant: Tenant) -> StoreIndex:
+    """Snapshot of the tenant stores, loaded on first use and dropped whenever
+    a store of the tenant is created or deleted.
+    """
+    index = store_snapshots.get(tenant.schema)
+    if index is not None:
+        return index
+    loader = snapshot_loader(tenant.schema)
+    async with loader.lock:
+        index = store_snapshots.get(tenant.schema)
+        if index is not None:
+            return index
+        generation = loader.generation
+        index = await load_store_index(tenant.schema)
+        # skip caching a snapshot that was invalidated while loading
+        if generation == loader.generation:
+            store_snapshots.set(tenant.schema, index)
+        return index
+
+
+def invalidate_stores(tenant: Union[str, None], key: Union[str, None] = None) -> None:
+    """Drops the store snapshot of the tenant schema, of all tenants for `None`"""
+
+    def overtake(schema: str, loader: SnapshotLoader) -> bool:
+        loader.generation += 1
+        return True
+
+    if tenant is None:
+        _loaders.evict(overtake)
+        store_snapshots.clear()
+        return
+    loader = _loaders.pop(tenant)
+    if loader is not None:
+        overtake(tenant, loader)
+    store_snapshots.pop(tenant)
+
+
+invalidation_bus.subscribe("store", invalidate_stores)
+invalidation_bus.subscribe("tenant", invalidate_stores)
@@ -0,0 +1,108 @@
+import math
+from collections import defaultdict
+from typing import Dict, Iterable, List, Tuple
+
+from geopy.distance import Distance, geodesic
+
+# Lower bounds of the length of one degree on the WGS-84 ellipsoid, a bit
+# under the true minimum so that bounding boxes are always conservative.
+MIN_MILES_PER_LAT_DEGREE = 68.0  # meridian at the equator, ~68.7
+MIN_MILES_PER_LON_DEGREE = 69.0  # parallel at the equator is ~69.17 * cos(lat)
+
+DEFAULT_CELL_SIZE = 0.25  # degrees
+MAX_CELLS_PER_STORE = 256
+
+
+def within_store_radius(store, latitude: float, longitude: float) -> bool:
+    """Exact perimeter check of one store"""
+    store_point = (store.latitude, store.longitude)
+    radius = Distance(miles=store.radius)
+    event_point = (latitude, longitude)
+    # NOTE: geopy compares a float against a Distance in kilometers, so the
+    # radius is effectively `radius` kilometers expressed in miles.
+    return geodesic(store_point, event_point).miles <= radius
+
+
+def perimeter_km(radius: float) -> float:
+    """Geodesic kilometers within which `within_store_radius` holds for a store
+    of the given radius.
+    """
+    return Distance(miles=Distance(miles=radius).km).km
+
+
+class StoreIndex:
+    """Grid index over store perimeters.
+
+    Each store is registered in every grid cell overlapped by the bounding box
+    of its perimeter. A lookup only runs the exact geodesic check against the
+    stores registered in the cell of the point, which gives the same result as
+    checking every store. Stores whose box is too large to grid (huge radius,
+    near the poles) are checked on every lookup.
+
+    :param stores: objects with `latitude`, `longitude` and `radius` attributes
+    :param cell_size: grid cell size in degrees
+    """
+
+    def __init__(self, stores: Iterable, cell_size: float = DEFAULT_CELL_SIZE) -> None:
+        if abs(360 / cell_size - round(360 / cell_size)) > 1e-9:
+            raise ValueError("cell_size must evenly divide 360 degrees")
+        self.cell_size = cell_size
+        self.rows = math.ceil(180 / cell_size)
+        self.cols = round(360 / cell_size)
+        self.stores: List = list(stores)
+        self._cells: Dict[Tuple[int, int], List] = defaultdict(list)
+        self._wide: List = []
+        for store in self.stores:
+            self._add(store)
+
+    def __len__(self) -> int:
+        return len(self.stores)
+
+    def _row(self, latitude: float) -> int:
+        return min(max(int((latitude + 90) // self.cell_size), 0), self.rows - 1)
+
+    def _col(self, longitude: float) -> int:
+        return int(((longitude + 180) % 360) // self.cell_size) % self.cols
+
+    def _add(self, store) -> None:
+        # compared against geodesic miles, see `within_store_radius`
+        reach = Distance(miles=store.radius).km * 1.01
+        lat_delta = reach / MIN_MILES_PER_LAT_DEGREE
+        lat_min = store.latitude - lat_delta
+        lat_max = store.latitude + lat_delta
+        max_abs_lat = max(abs(lat_min), abs(lat_max))
+        if max_abs_lat >= 89:
+            self._wide.append(store)
+            return
+        lon_delta = reach / (
+            MIN_MILES_PER_LON_DEGREE * math.cos(math.radians(max_abs_lat))
+        )
+        if lon_delta >= 180:
+            self._wide.append(store)
+            return
+
+        rows = range(self._row(lat_min), self._row(lat_max) + 1)
+        first_col = int((store.longitude - lon_delta + 180) // self.cell_size)
+        last_col = int((store.longitude + lon_delta + 180) // self.cell_size)
+        if len(rows) * (last_col - first_col + 1) > MAX_CELLS_PER_STORE:
+            self._wide.append(store)
+            return
+        for row in rows:
+            for col in range(first_col, last_col + 1):
+                self._cells[(row, col % self.cols)].append(store)
+
+    def candidates(self, latitude: float, longitude: float) -> List:
+        """Stores whose perimeter box contains the point"""
+        cell = self._cells.get((self._row(latitude), self._col(longitude)), [])
+        return cell + self._wide if self._wide else cell
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        """Whether the point falls within the radius of any store"""
+        if not self.stores:
+            return False
+        if not -90 <= latitude <= 90:
+            # keep geopy's validation errors of the plain scan
+            candidates = self.stores
+        else:
+            candidates = self.candidates(latitude, longitude)
+        return any(within_store_radius(s, latitude, longitude) for s in candidates)
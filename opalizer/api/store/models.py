@@ -1,10 +1,12 @@
 from uuid import uuid4
 
 import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 
 from opalizer.api.tenants.models import Tenant
 from opalizer.database import Base
+from opalizer.shared_models import Base as SharedBase
 
 
 class Store(Base):
@@ -30,3 +32,35 @@ class Store(Base):
     updated_at = sa.Column(
         sa.TIMESTAMP(timezone=True), default=None, onupdate=sa.func.now()
     )
+
+
+class StoreImportJob(SharedBase):
+    """Progress of a bulk store import, `errors` of the rejected rows by index"""
+
+    __tablename__ = "store_import_jobs"
+
+    id = sa.Column(
+        "id", sa.UUID(as_uuid=True), primary_key=True, default=uuid4, nullable=False
+    )
+    tenant_id = sa.Column(
+        "tenant_id",
+        sa.UUID(as_uuid=True),
+        sa.ForeignKey(Tenant.id, ondelete="CASCADE"),
+        nullable=False,
+    )
+    status = sa.Column("status", sa.String(16), nullable=False)
+    total = sa.Column("total", sa.Integer(), nullable=False)
+    geocoded = sa.Column("geocoded", sa.Integer(), nullable=False, default=0)
+    created = sa.Column("created", sa.Integer(), nullable=False, default=0)
+    failed = sa.Column("failed", sa.Integer(), nullable=False, default=0)
+    errors = sa.Column("errors", JSONB(), nullable=False, default=list)
+
+    created_at = sa.Column(
+        sa.TIMESTAMP(timezone=True), nullable=False, server_default=sa.func.now()
+    )
+    updated_at = sa.Column(
+        sa.TIMESTAMP(timezone=True), default=None, onupdate=sa.func.now()
+    )
+    finished_at = sa.Column(sa.TIMESTAMP(timezone=True), nullable=True)
+
+    __table_args__ = {"schema": "public"}
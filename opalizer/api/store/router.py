@@ -2,19 +2,30 @@ import uuid
 from typing import List
 
 from asyncpg.exceptions import UniqueViolationError
-from fastapi import APIRouter, Depends, Request, Response, Security
+from fastapi import APIRouter, BackgroundTasks, Depends, Request, Response, Security
 from fastapi import status as HttpStatus
 from pydantic import parse_obj_as
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+import opalizer.api.geomap.service as gs
+import opalizer.api.store.bulk as sb
 import opalizer.api.store.service as ss
-from opalizer.api.store.schemas import StoreSchema, StoreSchemaIn
+from opalizer.api.store.schemas import (
+    StoreImportJobSchema,
+    StoreSchema,
+    StoreSchemaIn,
+)
 from opalizer.api.tenants.models import Tenant
 from opalizer.auth.key import validate_api_key
+from opalizer.config import settings
 from opalizer.core.rate_limiter import limiter
-from opalizer.database import get_async_db, get_tanant
-from opalizer.geolocator.gmaps import gmaps
+from opalizer.database import (
+    get_async_db,
+    get_lazy_public_async_db,
+    get_read_async_db,
+    get_tanant,
+)
 from opalizer.schemas import CollectionResponse, RequestStatus, SingleResponse
 
 stores_router = APIRouter(
@@ -30,7 +41,7 @@ async def get_store(
     request: Request,
     response: Response,
     id: uuid.UUID,
-    db: Session = Depends(get_async_db),
+    db: Session = Depends(get_read_async_db),
 ):
     try:
         store = await ss.get_by_id(session=db, id=id)
@@ -47,7 +58,7 @@ async def get_store(
 
 @stores_router.get("/", status_code=HttpStatus.HTTP_200_OK)
 async def get_all_stores(
-    request: Request, response: Response, db: Session = Depends(get_async_db)
+    request: Request, response: Response, db: Session = Depends(get_read_async_db)
 ):
     try:
         stores = await ss.get_all(db)
@@ -79,7 +90,7 @@ async def create_store(
                 error=f"Store name '{payload.name}' is not available. Please use different store name.",
             )
 
-        lat, long = await gmaps.get_geocode(payload)
+        lat, long = await gs.get_geocode(payload)
         new_payload = StoreSchema(
             name=payload.name,
             owner=payload.owner,
@@ -105,16 +116,85 @@ async def create_store(
         )
 
 
+@stores_router.post("/bulk", status_code=HttpStatus.HTTP_202_ACCEPTED)
+@limiter.limit("1/second")
+async def create_stores_bulk(
+    request: Request,
+    response: Response,
+    background_tasks: BackgroundTasks,
+    tenant: Tenant = Depends(get_tanant),
+    public_session=Depends(get_lazy_public_async_db),
+) -> SingleResponse:
+    """Imports a CSV (`text/csv`, with a header row) or JSON lines body of
+    stores in the background, the returned job reports the progress.
+    """
+    try:
+        items = sb.parse_stores_body(
+            await request.body(), request.headers.get("content-type")
+        )
+    except ValueError as e:
+        response.status_code = HttpStatus.HTTP_400_BAD_REQUEST
+        return SingleResponse(status=RequestStatus.error, value=None, error=str(e))
+
+    max_rows = int(settings.stores.bulk.max_rows)
+    if len(items) > max_rows:
+        response.status_code = HttpStatus.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        return SingleResponse(
+            status=RequestStatus.error,
+            value=None,
+            error=f"Import size {len(items)} exceeds the maximum of {max_rows} stores.",
+        )
+
+    try:
+        rows, errors = sb.validate_stores(items)
+        job = await sb.create_import_job(public_session, tenant, len(items), errors)
+        background_tasks.add_task(sb.run_import, job.id, tenant, rows, list(errors))
+        return SingleResponse(
+            status=RequestStatus.success, value=StoreImportJobSchema.from_orm(job)
+        )
+    except Exception:
+        response.status_code = HttpStatus.HTTP_500_INTERNAL_SERVER_ERROR
+        return SingleResponse(
+            status=RequestStatus.error, value=None, error="Internal error"
+        )
+
+
+@stores_router.get("/bulk/{job_id}", status_code=HttpStatus.HTTP_200_OK)
+@limiter.limit("10/second")
+async def get_stores_bulk_job(
+    request: Request,
+    response: Response,
+    job_id: uuid.UUID,
+    tenant: Tenant = Depends(get_tanant),
+    public_session=Depends(get_lazy_public_async_db),
+) -> SingleResponse:
+    try:
+        job = await sb.get_import_job(public_session, tenant, job_id)
+        if job is None:
+            response.status_code = HttpStatus.HTTP_404_NOT_FOUND
+            return SingleResponse(
+                status=RequestStatus.error, value=None, error="Job not found."
+            )
+        return SingleResponse(
+            status=RequestStatus.success, value=StoreImportJobSchema.from_orm(job)
+        )
+    except Exception:
+        return SingleResponse(
+            status=RequestStatus.error, value=None, error="Internal error"
+        )
+
+
 @stores_router.get("/{id}", status_code=HttpStatus.HTTP_200_OK)
 @limiter.limit("10/second")
 async def delete_store(
     request: Request,
     response: Response,
     id: uuid.UUID,
+    tenant: Tenant = Depends(get_tanant),
     db: Session = Depends(get_async_db),
 ):
     try:
-        await ss.delete_store(session=db, id=id)
+        await ss.delete_store(session=db, id=id, tenant=tenant)
         return SingleResponse(status=RequestStatus.success, value=None)
     except Exception:
         return SingleResponse(
@@ -1,4 +1,5 @@
-from typing import Optional
+from datetime import datetime
+from typing import Dict, List, Optional
 
 from pydantic import UUID4, Extra, Field
 
@@ -46,3 +47,15 @@ class StoreSchema(ORJSONModel):
 
     class Config:
         extra = Extra.ignore
+
+
+class StoreImportJobSchema(ORJSONModel):
+    id: UUID4
+    status: str = Field(description="running, done or failed")
+    total: int = Field(description="Rows received.")
+    geocoded: int = Field(description="Rows whose address is geocoded.")
+    created: int = Field(description="Stores created.")
+    failed: int = Field(description="Rows rejected, see `errors`.")
+    errors: List[Dict] = Field(description="Errors of the rejected rows by index.")
+    created_at: datetime
+    finished_at: Optional[datetime]
@@ -1,11 +1,16 @@
+import logging
 from typing import List, Union
 
 from sqlalchemy import UUID, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from opalizer.api.geomap.prewarm import schedule_prewarm
 from opalizer.api.store.models import Store
 from opalizer.api.store.schemas import StoreSchema
 from opalizer.api.tenants.models import Tenant
+from opalizer.core.invalidation import invalidation_bus
+
+log = logging.getLogger(__name__)
 
 
 async def get_by_id(session: AsyncSession, id: UUID) -> Union[None, Store]:
@@ -37,13 +42,21 @@ async def create_store(
     session.add(new_store)
     await session.commit()
     await session.refresh(new_store)
+    await invalidation_bus.publish("store", tenant.schema, str(new_store.id))
+    try:
+        await schedule_prewarm(tenant, [new_store])
+    except Exception:
+        # the store is created, its geomaps get geocoded by the events instead
+        log.exception(f"Could not schedule geomap prewarm of store {new_store.id}")
     return new_store
 
 
-async def delete_store(session: AsyncSession, id: UUID) -> None:
+async def delete_store(session: AsyncSession, id: UUID, tenant: Tenant) -> None:
     try:
         store = await get_by_id(session, id)
         if store:
             await session.delete(store)
+            await session.commit()
+            await invalidation_bus.publish("store", tenant.schema, str(id))
     except Exception:
         raise
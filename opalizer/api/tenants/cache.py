@@ -0,0 +1,61 @@
+import uuid
+from typing import Union
+
+from opalizer.api.tenants.models import Tenant
+from opalizer.config import settings
+from opalizer.core.cache import TTLCache
+from opalizer.core.invalidation import invalidation_bus
+
+tenant_cache = TTLCache(
+    max_size=int(settings.tenant_cache.max_size),
+    ttl=float(settings.tenant_cache.ttl),
+)
+
+
+def tenant_cache_key(tenant_name: str) -> str:
+    """Normalizes the tenant id/name extracted from an api key."""
+    tenant_name = tenant_name.strip()
+    try:
+        return str(uuid.UUID(tenant_name))
+    except ValueError:
+        return tenant_name.lower()
+
+
+def invalidate_tenant(
+    tenant_id: Union[uuid.UUID, str, None] = None,
+    name: Union[str, None] = None,
+    schema: Union[str, None] = None,
+) -> int:
+    """Drops cached tenants matching any of the given id, name or schema.
+    :param tenant_id: tenant id
+    :param name: tenant name
+    :param schema: tenant schema name
+    """
+    keys = set()
+    if tenant_id:
+        keys.add(tenant_cache_key(str(tenant_id)))
+    if name:
+        keys.add(tenant_cache_key(name))
+
+    def _matches(key: str, tenant: Tenant) -> bool:
+        if key in keys:
+            return True
+        if tenant is None:
+            return False
+        if tenant_id and str(tenant.id) == str(tenant_id):
+            return True
+        if name and tenant.name.lower() == name.lower():
+            return True
+        return bool(schema) and tenant.schema == schema
+
+    return tenant_cache.evict(_matches)
+
+
+def _on_tenant_invalidation(tenant: Union[str, None], key: Union[str, None]) -> None:
+    if tenant is None and key is None:
+        tenant_cache.clear()
+        return
+    invalidate_tenant(tenant_id=key, schema=tenant)
+
+
+invalidation_bus.subscribe("tenant", _on_tenant_invalidation)
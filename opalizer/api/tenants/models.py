@@ -3,6 +3,7 @@ from uuid import uuid4
 import sqlalchemy as sa
 from sqlalchemy.sql import func
 
+from opalizer.core.shards import DEFAULT_SHARD
 from opalizer.shared_models import Base
 
 
@@ -18,6 +19,10 @@ class Tenant(Base):
     api_key = sa.Column(
         "api_key", sa.String(256), nullable=True, index=True, unique=True
     )
+    # database holding the tenant schema, see `db.shards`
+    shard = sa.Column(
+        "shard", sa.String(64), nullable=False, server_default=DEFAULT_SHARD
+    )
 
     created_at = sa.Column(
         sa.TIMESTAMP(timezone=True), nullable=False, server_default=func.now()
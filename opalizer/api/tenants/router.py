@@ -8,7 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from opalizer.api.tenants import service as ts
 from opalizer.api.tenants.schemas import TenantSchema, TenantSchemaIn
 from opalizer.core.rate_limiter import limiter
-from opalizer.database import get_public_async_db
+from opalizer.database import get_public_async_db, get_read_public_async_db
 from opalizer.exceptions import TenantNameNotAvailableError
 from opalizer.internal.admin.auth import validate_basic_credentials
 from opalizer.schemas import CollectionResponse, RequestStatus, SingleResponse
@@ -26,7 +26,7 @@ async def get_tenant(
     request: Request,
     response: Response,
     name: str,
-    db: AsyncSession = Depends(get_public_async_db),
+    db: AsyncSession = Depends(get_read_public_async_db),
 ):
     try:
         tenant = await ts.get_by_name(session=db, tenant_name=name)
@@ -45,7 +45,7 @@ async def get_tenant(
 async def get_all_tenants(
     request: Request,
     response: Response,
-    db: AsyncSession = Depends(get_public_async_db),
+    db: AsyncSession = Depends(get_read_public_async_db),
 ):
     try:
         tenants = await ts.get_all(db)
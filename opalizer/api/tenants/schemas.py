@@ -10,6 +10,7 @@ class TenantSchema(ORJSONModel):
     id: UUID4
     name: str = Field(min_length=3)
     api_key: Optional[str]
+    shard: Optional[str]
     created_at: datetime.datetime
     updated_at: Union[datetime.datetime, None]
 
@@ -7,6 +7,7 @@ from typing import List, Union
 import asyncpg.exceptions as pgexec
 import sqlalchemy as sa
 from sqlalchemy import UUID, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import ProgrammingError
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -17,8 +18,14 @@ from opalizer.api.tenants.schemas import TenantSchema
 from opalizer.api.tenants.utils import generate_tenant_schema_name, slugify
 from opalizer.auth.utils import generate_api_key
 from opalizer.config import get_root_dir, settings
-from opalizer.database import async_engine, with_async_db
-from opalizer.exceptions import TenantNameNotAvailableError, UpgradeAlembicHeadError
+from opalizer.core.invalidation import invalidation_bus
+from opalizer.core.shards import DEFAULT_SHARD
+from opalizer.database import shards, with_async_db
+from opalizer.exceptions import (
+    SharedSchemaOutdatedError,
+    TenantNameNotAvailableError,
+    UpgradeAlembicHeadError,
+)
 
 root_dir = get_root_dir()
 
@@ -30,6 +37,22 @@ def get_alembic_config() -> Config:
 
 alembic_cfg = get_alembic_config()
 
+# columns of the shared public tables added by the tenant migrations, public
+# itself is only upgraded to its init revision on startup
+SHARED_COLUMNS = [("tenants", "shard"), ("geomaps", "source")]
+
+# the DDL of those migrations touching the shared tables, applied to public on
+# startup so that the columns exist before any tenant is migrated
+SHARED_DDL = [
+    "ALTER TABLE public.tenants"
+    " ADD COLUMN IF NOT EXISTS shard VARCHAR(64) DEFAULT 'default' NOT NULL",
+    "ALTER TABLE public.geomaps"
+    " ADD COLUMN IF NOT EXISTS source VARCHAR(16) DEFAULT 'gmaps' NOT NULL",
+    "CREATE UNIQUE INDEX IF NOT EXISTS public_geomaps_source_geohash_idx"
+    " ON public.geomaps (source, geohash)",
+    "DROP INDEX IF EXISTS public.public_geomaps_geohash_idx",
+]
+
 
 def add_args(schema, dry_run, config):
     config.cmd_opts = argparse.Namespace()
@@ -41,7 +64,11 @@ def add_args(schema, dry_run, config):
 
 
 async def upgrade_head(
-    tenant_name: str, revision: str = "head", url: str = settings.db.url, dry_run=False
+    tenant_name: str,
+    revision: str = "head",
+    url: str = settings.db.url,
+    dry_run=False,
+    shard: str = DEFAULT_SHARD,
 ):
     try:
         config = Config(os.path.join(root_dir, "alembic.ini"))
@@ -53,8 +80,8 @@ async def upgrade_head(
             config.attributes["connection"] = connection
             command.upgrade(config=config, revision=revision, sql=sql, tag=tag)
 
-        # Using direct async_engine here to avoid bubbling an exception from with_async_db
-        async with async_engine.begin() as connection:
+        # Using direct shard engine here to avoid bubbling an exception from with_async_db
+        async with shards.engine(shard).begin() as connection:
             await connection.run_sync(run_upgrade, config, revision)
     except Exception:
         _, value, _ = sys.exc_info()
@@ -64,18 +91,54 @@ async def upgrade_head(
         raise UpgradeAlembicHeadError(value)
 
 
-async def provision_tenant(schema: str) -> dict:
+async def upgrade_shared_columns() -> None:
+    """Applies `SHARED_DDL` to public, then checks the shared columns exist.
+    :raises SharedSchemaOutdatedError: a shared column is still missing
+    """
+    try:
+        async with with_async_db(None) as db:
+            # processes starting together apply it one at a time
+            await db.execute(
+                sa.text("SELECT pg_advisory_xact_lock(hashtext('public shared ddl'))")
+            )
+            for statement in SHARED_DDL:
+                await db.execute(sa.text(statement))
+            await db.commit()
+    except Exception as e:
+        logging.warning(f"Could not upgrade the shared columns - {repr(e)}")
+    await check_shared_columns()
+
+
+async def check_shared_columns() -> None:
+    """Fails fast when a shared column is missing, every request using it would
+    fail otherwise.
+    :raises SharedSchemaOutdatedError: a shared column is missing
+    """
+    async with with_async_db(None) as db:
+        result = await db.execute(
+            sa.text(
+                "SELECT table_name, column_name FROM information_schema.columns"
+                " WHERE table_schema = 'public'"
+            )
+        )
+        existing = {(row.table_name, row.column_name) for row in result.all()}
+    missing = [f"public.{t}.{c}" for t, c in SHARED_COLUMNS if (t, c) not in existing]
+    if missing:
+        raise SharedSchemaOutdatedError(missing)
+
+
+async def provision_tenant(schema: str, shard: str = DEFAULT_SHARD) -> dict:
     """Creates a new schema and upgrade to current head
     :param schema: schema name
+    :param shard: shard the schema is created on
     """
     try:
         if schema == "public":
             raise TenantNameNotAvailableError(schema=schema)
 
-        async with with_async_db("public") as session:
-            await session.execute(sa.schema.CreateSchema(schema))
-            await session.commit()
-        await upgrade_head(tenant_name=schema)
+        async with shards.engine(shard).begin() as connection:
+            await connection.execute(sa.schema.CreateSchema(schema))
+        await upgrade_head(tenant_name=schema, shard=shard)
         return {"schema": schema}
     except ProgrammingError as e:
         if e.orig and e.orig.sqlstate:
@@ -83,22 +146,33 @@ async def provision_tenant(schema: str) -> dict:
                 logging.warning(f"Schema '{schema} already exists!")
                 raise TenantNameNotAvailableError(schema=schema)
     except UpgradeAlembicHeadError:
-        async with with_async_db("public") as session:
-            await session.execute(sa.text(f"DROP SCHEMA IF EXISTS {str(schema)}"))
-            await session.commit()
+        async with shards.engine(shard).begin() as connection:
+            await connection.execute(sa.text(f"DROP SCHEMA IF EXISTS {str(schema)}"))
         raise
     except Exception as e:
         logging.fatal(e)
         raise
 
 
+async def mirror_tenant(tenant: Tenant, shard: str) -> None:
+    """Copies the tenant row to the public schema of the shard, the tables of
+    the tenant schema reference it.
+    """
+    if shard == DEFAULT_SHARD:
+        return
+    row = {column.key: getattr(tenant, column.key) for column in Tenant.__table__.c}
+    async with shards.engine(shard).begin() as connection:
+        await connection.execute(pg_insert(Tenant).values(row).on_conflict_do_nothing())
+
+
 async def delete_tenant(schema: str, cascade: bool = False) -> dict:
     """Delete's schema depending on the provided cascade flag.
     :param schema: schema name
     :param cascade: cascade delete
     """
     try:
-        async with with_async_db("public") as session:
+        # on the shard of the tenant
+        async with with_async_db(schema) as session:
             if cascade:
                 await session.execute(
                     sa.text(f"DROP SCHEMA IF EXISTS {str(schema)} CASCADE")
@@ -106,6 +180,7 @@ async def delete_tenant(schema: str, cascade: bool = False) -> dict:
             else:
                 await session.execute(sa.text(f"DROP SCHEMA IF EXISTS {str(schema)}"))
             await session.commit()
+        await invalidation_bus.publish("tenant", schema)
         return {"schema": schema}
     except Exception as e:
         logging.fatal(e)
@@ -118,9 +193,10 @@ async def create_tenant(session: AsyncSession, payload: TenantSchema) -> Tenant:
     new_tenant = Tenant(**payload.dict())
     new_tenant.schema = generate_tenant_schema_name(payload.name)
     new_tenant.slug = slugify(payload.name)
+    new_tenant.shard = settings.db.tenant_shard
     # new_tenant.api_key = generate_api_key(suffix=payload.name)
     session.add(new_tenant)
-    await provision_tenant(schema=new_tenant.schema)
+    await provision_tenant(schema=new_tenant.schema, shard=new_tenant.shard)
     await session.commit()
     await session.refresh(new_tenant)
     # create api key
@@ -128,6 +204,8 @@ async def create_tenant(session: AsyncSession, payload: TenantSchema) -> Tenant:
     await session.merge(new_tenant)
     await session.commit()
     await session.refresh(new_tenant)
+    await mirror_tenant(new_tenant, new_tenant.shard)
+    await invalidation_bus.publish("tenant", new_tenant.schema, str(new_tenant.id))
     return new_tenant
 
 
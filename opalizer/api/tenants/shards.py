@@ -0,0 +1,178 @@
+"""Moves a tenant schema to another shard, see `db.shards`.
+
+    python -m opalizer.api.tenants.shards <tenant name> <shard>
+"""
+import argparse
+import asyncio
+import logging
+from typing import Dict, List, Union
+
+import sqlalchemy as sa
+from sqlalchemy import select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+import opalizer.api.events.models  # noqa: F401, tenant tables
+import opalizer.api.store.models  # noqa: F401, tenant tables
+from opalizer.api.tenants.models import Tenant
+from opalizer.api.tenants.service import get_by_name, provision_tenant, upgrade_head
+from opalizer.core.invalidation import invalidation_bus
+from opalizer.database import (
+    Base,
+    dispose_engines,
+    mirror_shared_rows,
+    shards,
+    with_async_db,
+)
+from opalizer.exceptions import TenantNameNotAvailableError
+
+log = logging.getLogger(__name__)
+
+
+def tenant_tables() -> List[sa.Table]:
+    """Tables of a tenant schema, referenced tables first"""
+    return [t for t in Base.metadata.sorted_tables if t.schema == "tenant"]
+
+
+async def copy_table(
+    source: AsyncEngine,
+    target: AsyncEngine,
+    schema: str,
+    table: sa.Table,
+    batch_size: int = 1000,
+) -> int:
+    """Copies the rows of the tenant table in primary key order, rows already in
+    the target are skipped so that a copy can be run again.
+    :returns number of rows read from the source
+    """
+    translate = {"schema_translate_map": {"tenant": schema}}
+    key = list(table.primary_key.columns)
+    copied, last = 0, None
+    while True:
+        query = select(table).order_by(*key).limit(batch_size)
+        if last is not None:
+            query = query.where(sa.tuple_(*key) > sa.tuple_(*last))
+        async with source.connect() as connection:
+            connection = await connection.execution_options(**translate)
+            result = await connection.execute(query)
+            rows = [dict(row._mapping) for row in result.all()]
+        if not rows:
+            return copied
+        await mirror_shared_rows(target, table, rows)
+        async with target.connect() as connection:
+            connection = await connection.execution_options(**translate)
+            await connection.execute(
+                pg_insert(table).values(rows).on_conflict_do_nothing()
+            )
+            await connection.commit()
+        copied += len(rows)
+        last = [rows[-1][column.key] for column in key]
+
+
+async def move_tenant(
+    tenant_name: str,
+    shard: str,
+    batch_size: int = 1000,
+    grace_seconds: float = 5.0,
+    drop_source: bool = False,
+) -> Dict[str, int]:
+    """Copies the tenant schema to the shard and flips the tenant to it.
+
+    Rows written to the old shard until every worker picked up the flip are
+    copied by a second pass after `grace_seconds`. Rows updated on the old
+    shard after they were copied keep their copied values, move a tenant
+    while its traffic is low. A move that failed can be run again.
+    :returns rows copied by table
+    """
+    shard = shard.lower()
+    target = shards.engine(shard)
+    async with with_async_db(None) as db:
+        tenant = await get_by_name(session=db, tenant_name=tenant_name)
+    if tenant is None:
+        raise ValueError(f"Tenant '{tenant_name}' does not exist.")
+    if tenant.shard == shard:
+        log.info(f"Tenant '{tenant_name}' is already on shard '{shard}'")
+        return {}
+    source_shard, source = tenant.shard, shards.engine(tenant.shard)
+
+    try:
+        await provision_tenant(schema=tenant.schema, shard=shard)
+    except TenantNameNotAvailableError:
+        # left by a move that failed, bring it to head and resume
+        await upgrade_head(tenant_name=tenant.schema, shard=shard)
+
+    copied = {}
+    for table in tenant_tables():
+        copied[table.name] = await copy_table(
+            source, target, tenant.schema, table, batch_size
+        )
+        log.info(f"Copied {copied[table.name]} rows of '{tenant.schema}.{table.name}'")
+
+    async with with_async_db(None) as db:
+        await db.execute(
+            update(Tenant).where(Tenant.id == tenant.id).values(shard=shard)
+        )
+        await db.commit()
+    await invalidation_bus.publish("tenant", tenant.schema, str(tenant.id))
+    log.info(f"Tenant '{tenant_name}' moved from '{source_shard}' to '{shard}'")
+
+    await asyncio.sleep(grace_seconds)
+    for table in tenant_tables():
+        await copy_table(source, target, tenant.schema, table, batch_size)
+
+    if drop_source:
+        async with source.begin() as connection:
+            await connection.execute(
+                sa.text(f'DROP SCHEMA IF EXISTS "{tenant.schema}" CASCADE')
+            )
+    return copied
+
+
+def parse_args(argv: Union[List[str], None] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="opalizer.api.tenants.shards",
+        description="Move a tenant schema to another shard.",
+    )
+    parser.add_argument("tenant", help="tenant name")
+    parser.add_argument("shard", help="shard id of db.shards, or default")
+    parser.add_argument(
+        "--batch-size", type=int, default=1000, help="rows copied at once"
+    )
+    parser.add_argument(
+        "--grace-seconds",
+        type=float,
+        default=5.0,
+        help="wait before copying the rows written during the flip",
+    )
+    parser.add_argument(
+        "--drop-source",
+        action="store_true",
+        help="drop the schema from the old shard once moved",
+    )
+    return parser.parse_args(argv)
+
+
+async def run(args: argparse.Namespace) -> None:
+    # the other workers drop their tenant shard mapping on the flip
+    await invalidation_bus.start()
+    try:
+        copied = await move_tenant(
+            args.tenant,
+            args.shard,
+            batch_size=args.batch_size,
+            grace_seconds=args.grace_seconds,
+            drop_source=args.drop_source,
+        )
+        log.info(f"Copied rows {copied}")
+    finally:
+        await invalidation_bus.stop()
+        await dispose_engines()
+
+
+def main(argv: Union[List[str], None] = None) -> None:
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run(parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -25,6 +25,8 @@ settings = Dynaconf(
 )
 # db url
 settings.db.url = f"postgresql+asyncpg://{settings.db.username}:{settings.db.password}@{settings.db.host}:{settings.db.port}/{settings.db.name}"
+# plain libpq style dsn for direct asyncpg connections
+settings.db.dsn = f"postgresql://{settings.db.username}:{settings.db.password}@{settings.db.host}:{settings.db.port}/{settings.db.name}"
 
 # `envvar_prefix` = export envvars with `export DYNACONF_FOO=bar`.
 # `settings_files` = Load these files in the order
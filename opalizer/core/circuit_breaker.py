@@ -0,0 +1,89 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Union
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling through an open circuit"""
+
+
+class CircuitBreaker:
+    """Stops calling a failing dependency for a while.
+
+    The circuit opens after `failure_threshold` consecutive failures. Once
+    `reset_timeout` seconds passed, a single trial call is let through (half
+    open), its success closes the circuit and its failure opens it again.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._timer = timer
+        self._failures = 0
+        self._opened_at: Union[float, None] = None
+        self._trial = False
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._timer() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and not self._trial:
+            self._trial = True
+            return True
+        self.rejected += 1
+        return False
+
+    def success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    def failure(self) -> None:
+        self._failures += 1
+        if self._trial or self._failures >= self.failure_threshold:
+            if self._opened_at is None:
+                self.trips += 1
+            self._opened_at = self._timer()
+        self._trial = False
+
+    async def call(self, func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit '{self.name}' is open")
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            # no outcome, let the next call be the trial
+            self._trial = False
+            raise
+        except Exception:
+            self.failure()
+            raise
+        self.success()
+        return result
+
+    def stats(self) -> Dict[str, Union[str, int]]:
+        return {
+            "state": self.state,
+            "failures": self._failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
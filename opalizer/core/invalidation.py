@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from typing import Callable, Dict, List, Union
+
+import asyncpg
+import orjson
+
+from opalizer.config import settings
+
+log = logging.getLogger(__name__)
+
+# Subscribers are called with (tenant, key), `None` for both means that the
+# subscriber may have missed invalidations and should drop everything.
+Subscriber = Callable[[Union[str, None], Union[str, None]], None]
+
+
+class InvalidationBus:
+    """Cross worker cache invalidation over Postgres LISTEN/NOTIFY.
+
+    Invalidations are `(kind, tenant, key)` triples, `kind` names a cache
+    family (tenant, store, geomap, ...), `tenant` is the tenant schema and
+    `key` an optional id inside it. Published invalidations are applied to the
+    local subscribers right away and broadcast to every other worker listening
+    on the same channel.
+    """
+
+    def __init__(self, dsn: str, channel: str, reconnect_delay: float = 1.0) -> None:
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.origin = uuid.uuid4().hex
+        self._subscribers: Dict[str, List[Subscriber]] = defaultdict(list)
+        self._connection: Union[asyncpg.Connection, None] = None
+        self._lock = asyncio.Lock()
+        self._reconnect_task: Union[asyncio.Task, None] = None
+        self._running = False
+
+    @property
+    def connected(self) -> bool:
+        return self._connection is not None and not self._connection.is_closed()
+
+    def subscribe(self, kind: str, callback: Subscriber) -> None:
+        """Registers a cache callback for invalidations of the given kind."""
+        if callback not in self._subscribers[kind]:
+            self._subscribers[kind].append(callback)
+
+    def unsubscribe(self, kind: str, callback: Subscriber) -> None:
+        if callback in self._subscribers[kind]:
+            self._subscribers[kind].remove(callback)
+
+    def dispatch(
+        self, kind: str, tenant: Union[str, None], key: Union[str, None]
+    ) -> None:
+        """Applies an invalidation to the local subscribers."""
+        for callback in list(self._subscribers.get(kind, [])):
+            try:
+                callback(tenant, key)
+            except Exception:
+                log.exception(f"Invalidation subscriber failed for '{kind}'")
+
+    def reset(self) -> None:
+        """Asks every subscriber to drop all of its entries."""
+        for kind in list(self._subscribers):
+            self.dispatch(kind, None, None)
+
+    async def publish(
+        self, kind: str, tenant: Union[str, None] = None, key: Union[str, None] = None
+    ) -> None:
+        """Invalidates `(kind, tenant, key)` in this worker and all the others.
+        :param kind: cache family
+        :param tenant: tenant schema name
+        :param key: entry key inside the tenant
+        """
+        self.dispatch(kind, tenant, key)
+        if not self.connected:
+            return
+        payload = orjson.dumps(
+            {
+                "origin": self.origin,
+                "kind": kind,
+                "tenant": tenant,
+                "key": None if key is None else str(key),
+            }
+        ).decode()
+        try:
+            async with self._lock:
+                await self._connection.execute(
+                    "SELECT pg_notify($1, $2)", self.channel, payload
+                )
+        except Exception:
+            log.exception(f"Could not publish invalidation for '{kind}'")
+
+    async def start(self) -> None:
+        """Starts listening, retried in the background when Postgres is not
+        reachable yet.
+        """
+        self._running = True
+        try:
+            await self._connect()
+        except Exception as e:
+            log.warning(f"Invalidation bus is not connected, retrying - {str(e)}")
+            self.reset()
+            self._schedule_reconnect()
+
+    async def stop(self) -> None:
+        self._running = False
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        connection, self._connection = self._connection, None
+        if connection and not connection.is_closed():
+            try:
+                await connection.remove_listener(self.channel, self._on_notification)
+            finally:
+                await connection.close()
+
+    async def _connect(self) -> None:
+        connection = await asyncpg.connect(self.dsn)
+        await connection.add_listener(self.channel, self._on_notification)
+        connection.add_termination_listener(self._on_termination)
+        self._connection = connection
+        log.info(f"Listening for cache invalidations on '{self.channel}'")
+
+    def _on_notification(self, connection, pid, channel, payload: str) -> None:
+        try:
+            message = orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            log.warning(f"Ignoring malformed invalidation '{payload}'")
+            return
+        if message.get("origin") == self.origin:
+            return
+        self.dispatch(message.get("kind"), message.get("tenant"), message.get("key"))
+
+    def _on_termination(self, connection) -> None:
+        self._connection = None
+        if not self._running:
+            return
+        # anything published while we were disconnected is lost
+        self.reset()
+        self._schedule_reconnect()
+
+    def _schedule_reconnect(self) -> None:
+        if self._reconnect_task is None or self._reconnect_task.done():
+            self._reconnect_task = asyncio.get_event_loop().create_task(
+                self._reconnect()
+            )
+
+    async def _reconnect(self) -> None:
+        delay = self.reconnect_delay
+        while self._running and not self.connected:
+            try:
+                await self._connect()
+                self.reset()
+            except Exception as e:
+                log.warning(f"Invalidation bus reconnect failed - {str(e)}")
+                # entries cached meanwhile may have missed invalidations too
+                self.reset()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+
+
+invalidation_bus = InvalidationBus(
+    dsn=settings.db.dsn, channel=settings.invalidation.channel
+)
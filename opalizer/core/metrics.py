@@ -0,0 +1,59 @@
+import bisect
+import threading
+from typing import Dict, Sequence, Union
+
+# seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    """Cumulative histogram of observed values, Prometheus style buckets.
+
+    :param buckets: sorted upper bounds, values above the last one are only
+        counted in `+Inf`
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self._counts)
+
+    def quantile(self, q: float) -> Union[float, None]:
+        """Upper bound of the bucket holding the `q` quantile, `None` when
+        nothing was observed or it is past the last bucket.
+        """
+        total = self.count
+        if not total:
+            return None
+        rank, seen = q * total, 0
+        for bound, count in zip(self.buckets, self._counts[:-1], strict=True):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def stats(self) -> Dict[str, Union[int, float, None, Dict[str, int]]]:
+        cumulative, seen = {}, 0
+        for bound, count in zip(self.buckets, self._counts[:-1], strict=True):
+            seen += count
+            cumulative[str(bound)] = seen
+        cumulative["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "sum": round(self._sum, 6),
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": cumulative,
+        }
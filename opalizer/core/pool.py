@@ -0,0 +1,99 @@
+import time
+from typing import Any, Dict, Union
+
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from opalizer.core.metrics import Histogram
+
+
+class PoolMetrics:
+    """Checkouts of a connection pool, the wait includes opening a connection
+    when the pool has none idle.
+    """
+
+    def __init__(self) -> None:
+        self.wait = Histogram()
+        self.timeouts = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"checkout_wait": self.wait.stats(), "timeouts": self.timeouts}
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """`AsyncAdaptedQueuePool` recording the checkout waits and timeouts.
+
+    Its size, overflow and timeout can be changed at runtime with
+    `configure`, the changes apply to the pool replacing it on
+    `engine.dispose()`, see `configure_pool`. The metrics carry over.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+        self._changes: Dict[str, Union[int, float]] = {}
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            self.metrics.wait.observe(time.perf_counter() - start)
+
+    def configure(
+        self,
+        size: Union[int, None] = None,
+        max_overflow: Union[int, None] = None,
+        timeout: Union[float, None] = None,
+    ) -> None:
+        if size is not None:
+            self._changes["size"] = size
+        if max_overflow is not None:
+            self._changes["max_overflow"] = max_overflow
+        if timeout is not None:
+            self._changes["timeout"] = timeout
+
+    def recreate(self) -> "InstrumentedQueuePool":
+        # as `QueuePool.recreate`, with the configured settings
+        self.logger.info("Pool recreating")
+        pool = self.__class__(
+            self._creator,
+            pool_size=self._changes.get("size", self._pool.maxsize),
+            max_overflow=self._changes.get("max_overflow", self._max_overflow),
+            pre_ping=self._pre_ping,
+            use_lifo=self._pool.use_lifo,
+            timeout=self._changes.get("timeout", self._timeout),
+            recycle=self._recycle,
+            echo=self.echo,
+            logging_name=self._orig_logging_name,
+            reset_on_return=self._reset_on_return,
+            _dispatch=self.dispatch,
+            dialect=self._dialect,
+        )
+        pool.metrics = self.metrics
+        return pool
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "timeout": self._timeout,
+            "checked_out": self.checkedout(),
+            "idle": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            **self.metrics.stats(),
+        }
+
+
+async def configure_pool(engine: AsyncEngine, **changes) -> Dict[str, Any]:
+    """Replaces the pool of the engine with one of the given size, overflow or
+    timeout. Idle connections are closed, checked out ones are closed when
+    returned.
+    """
+    engine.pool.configure(**changes)
+    await engine.dispose()
+    return engine.pool.stats()
@@ -1,4 +1,53 @@
+import asyncio
+import time
+from typing import Callable, Union
+
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 
 limiter = Limiter(key_func=get_remote_address, headers_enabled=True)
+
+
+class TokenBucket:
+    """Async token bucket, `rate` tokens per second up to `capacity` tokens.
+
+    :param rate: tokens added per second
+    :param capacity: maximum burst, defaults to one second worth of tokens
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Union[float, None] = None,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._timer = timer
+        self._tokens = self.capacity
+        self._updated = timer()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = self._timer()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1) -> float:
+        """Waits until `tokens` are available and takes them.
+        :returns seconds waited
+        """
+        waited = 0.0
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                delay = (tokens - self._tokens) / self.rate
+                await asyncio.sleep(delay)
+                waited += delay
+                self._refill()
+            self._tokens -= tokens
+        return waited
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Dict, Union
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+log = logging.getLogger(__name__)
+
+# seconds the replica is behind, 0 for a primary and for a replica that replayed
+# everything it received, `pg_last_xact_replay_timestamp` alone keeps growing
+# on an idle primary
+REPLICATION_LAG = text(
+    "SELECT CASE"
+    " WHEN NOT pg_is_in_recovery()"
+    " OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+    " ELSE COALESCE("
+    "EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class ReplicaRouter:
+    """Picks the engine of read only sessions, the replica while it is reachable
+    and at most `max_lag` seconds behind, the primary otherwise.
+
+    The lag is checked at most every `check_interval` seconds, a replica that
+    failed is left alone until the next check.
+    """
+
+    def __init__(
+        self,
+        primary: AsyncEngine,
+        replica: Union[AsyncEngine, None],
+        max_lag: float = 5.0,
+        check_interval: float = 5.0,
+        timer: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.primary = primary
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._timer = timer
+        self.healthy = False
+        self.lag: Union[float, None] = None
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self._next_check = 0.0
+        self._lock = asyncio.Lock()
+
+    async def engine(self) -> AsyncEngine:
+        if self.replica is None:
+            return self.primary
+        if self._timer() >= self._next_check:
+            async with self._lock:
+                if self._timer() >= self._next_check:
+                    await self.check()
+        if self.healthy:
+            self.replica_reads += 1
+            return self.replica
+        self.primary_reads += 1
+        return self.primary
+
+    async def check(self) -> None:
+        try:
+            self.lag = await asyncio.wait_for(self._lag(), self.check_interval)
+            self.healthy = self.lag <= self.max_lag
+            if not self.healthy:
+                log.warning(f"Replica is {self.lag:.1f}s behind, reading from primary")
+        except Exception as e:
+            self.lag, self.healthy = None, False
+            log.warning(f"Replica is unavailable, reading from primary - {repr(e)}")
+        self._next_check = self._timer() + self.check_interval
+
+    async def _lag(self) -> float:
+        async with self.replica.connect() as connection:
+            result = await connection.execute(REPLICATION_LAG)
+            return float(result.scalar())
+
+    def failed(self) -> None:
+        """Reads go to the primary until the next check"""
+        self.healthy = False
+        self._next_check = self._timer() + self.check_interval
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "configured": self.replica is not None,
+            "healthy": self.healthy,
+            "lag": self.lag,
+            "replica_reads": self.replica_reads,
+            "primary_reads": self.primary_reads,
+        }
@@ -32,6 +32,7 @@ class Scheduler(object):
             self.registered_tasks.append(
                 {"name": name, "func": func, "job": job.do(run_threaded, func)}
             )
+            return func
 
         return decorator
 
@@ -0,0 +1,58 @@
+from typing import Any, Callable, Dict, List
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+# shard of the primary database, every tenant is on it unless mapped elsewhere
+DEFAULT_SHARD = "default"
+
+
+class UnknownShardError(Exception):
+    def __init__(self, shard: str) -> None:
+        super().__init__(f"Shard '{shard}' is not configured in db.shards.")
+        self.shard = shard
+
+
+class ShardRegistry:
+    """Engines of the databases holding tenant schemas, one per shard, created
+    on first use. The `default` shard is the primary database, the shared
+    public tables live there.
+    """
+
+    def __init__(
+        self,
+        primary: AsyncEngine,
+        urls: Dict[str, str],
+        create_engine: Callable[[str], AsyncEngine],
+    ) -> None:
+        self.primary = primary
+        # environment variables come with upper case keys
+        self.urls = {shard.lower(): url for shard, url in urls.items() if url}
+        self._create_engine = create_engine
+        self._engines: Dict[str, AsyncEngine] = {DEFAULT_SHARD: primary}
+
+    @property
+    def shards(self) -> List[str]:
+        return [DEFAULT_SHARD, *(s for s in self.urls if s != DEFAULT_SHARD)]
+
+    def url(self, shard: str) -> str:
+        if shard == DEFAULT_SHARD:
+            return self.primary.url.render_as_string(hide_password=False)
+        if shard not in self.urls:
+            raise UnknownShardError(shard)
+        return self.urls[shard]
+
+    def engine(self, shard: str) -> AsyncEngine:
+        engine = self._engines.get(shard)
+        if engine is None:
+            engine = self._create_engine(self.url(shard))
+            self._engines[shard] = engine
+        return engine
+
+    async def dispose(self) -> None:
+        """Closes the connections of the shard engines, the primary excepted"""
+        for shard, engine in list(self._engines.items()):
+            if shard != DEFAULT_SHARD:
+                await engine.dispose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {shard: engine.pool.stats() for shard, engine in self._engines.items()}
@@ -1,32 +1,59 @@
 import logging
 import uuid
 from contextlib import asynccontextmanager
-from typing import Union
+from typing import Any, Dict, List, Union
 
 import sqlalchemy as sa
-from fastapi import Depends
-from sqlalchemy import func, select
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from fastapi import Depends, Request
+from sqlalchemy import exc, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
+from opalizer.api.tenants.cache import tenant_cache, tenant_cache_key
 from opalizer.api.tenants.models import Tenant
 from opalizer.api.tenants.schemas import TenantSchema
 from opalizer.auth.utils import get_tenant_id_from_api_key
 from opalizer.config import settings
+from opalizer.core.cache import TTLCache
+from opalizer.core.invalidation import invalidation_bus
+from opalizer.core.pool import InstrumentedQueuePool
+from opalizer.core.replica import ReplicaRouter
+from opalizer.core.shards import DEFAULT_SHARD, ShardRegistry
 
 # if settings.environment == Env.tst:
 #     async_engine = create_async_engine(settings.test_db_url, echo=bool(settings.sql_echo), pool_size=100, pool_pre_ping=True, pool_recycle=240)
 # else:
 #     async_engine = create_async_engine(settings.db_url, echo=bool(settings.sql_echo), pool_size=100, pool_pre_ping=True, pool_recycle=240)
 
-async_engine = create_async_engine(
-    settings.db.url,
-    echo=bool(settings.db.echo),
-    pool_size=10,
-    pool_pre_ping=True,
-    pool_recycle=240,
-    future=True,
+
+def create_pooled_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        echo=bool(settings.db.echo),
+        poolclass=InstrumentedQueuePool,
+        pool_size=int(settings.db.pool.size),
+        max_overflow=int(settings.db.pool.max_overflow),
+        pool_timeout=float(settings.db.pool.timeout),
+        pool_pre_ping=bool(settings.db.pool.pre_ping),
+        pool_recycle=int(settings.db.pool.recycle),
+        future=True,
+    )
+
+
+async_engine = create_pooled_engine(settings.db.url)
+# optional read replica, see `read_router`
+replica_engine = (
+    create_pooled_engine(settings.db.replica.url) if settings.db.replica.url else None
+)
+read_router = ReplicaRouter(
+    async_engine,
+    replica_engine,
+    max_lag=float(settings.db.replica.max_lag_seconds),
+    check_interval=float(settings.db.replica.check_interval_seconds),
 )
+# engines of the databases holding tenant schemas, see `schema_engine`
+shards = ShardRegistry(async_engine, dict(settings.db.shards), create_pooled_engine)
 async_session = sessionmaker(
     bind=async_engine, class_=AsyncSession, expire_on_commit=False
 )
@@ -46,24 +73,93 @@ metadata = sa.MetaData(
 Base = declarative_base(metadata=metadata)
 
 
-@asynccontextmanager
-async def with_async_db(tenant_schema_name: Union[str, None]) -> AsyncSession:
-    schema_translate_map = None
-    if tenant_schema_name:
-        schema_translate_map = {"tenant": tenant_schema_name}
+# (engine, tenant schema) -> session factory bound to the schema translated
+# engine, the engine proxies share the compiled statement cache of their engine
+schema_sessions = TTLCache(max_size=int(settings.db.schema_sessions), ttl=None)
 
-    schema_engine = async_engine.execution_options(
-        schema_translate_map=schema_translate_map
-    )
+
+def schema_session_factory(
+    tenant_schema_name: Union[str, None], engine: AsyncEngine = async_engine
+) -> sessionmaker:
+    factory = schema_sessions.get((engine, tenant_schema_name))
+    if factory is None:
+        schema_translate_map = None
+        if tenant_schema_name:
+            schema_translate_map = {"tenant": tenant_schema_name}
+        schema_engine = engine.execution_options(
+            schema_translate_map=schema_translate_map
+        )
+        factory = sessionmaker(
+            bind=schema_engine,
+            class_=AsyncSession,
+            expire_on_commit=False,
+            autoflush=False,
+        )
+        schema_sessions.set((engine, tenant_schema_name), factory)
+    return factory
+
+
+# tenant schema -> shard holding it
+schema_shards = TTLCache(max_size=int(settings.db.schema_sessions), ttl=None)
+
+
+async def tenant_shard(tenant_schema_name: str) -> str:
+    shard = schema_shards.get(tenant_schema_name)
+    if shard is None:
+        async with with_async_db(None) as db:
+            result = await db.execute(
+                select(Tenant.shard).where(Tenant.schema == tenant_schema_name)
+            )
+            shard = result.scalar_one_or_none()
+        if shard is None:
+            # not a tenant schema, or one being provisioned
+            return DEFAULT_SHARD
+        schema_shards.set(tenant_schema_name, shard)
+    return shard
+
+
+async def schema_engine(
+    tenant_schema_name: Union[str, None], read_only: bool = False
+) -> AsyncEngine:
+    """Engine of the database holding the schema, read only sessions of the
+    primary may use the read replica.
+    """
+    shard = DEFAULT_SHARD
+    if tenant_schema_name and tenant_schema_name != "public":
+        shard = await tenant_shard(tenant_schema_name)
+    if shard != DEFAULT_SHARD:
+        return shards.engine(shard)
+    return await read_router.engine() if read_only else async_engine
+
+
+def _on_tenant_invalidation(tenant: Union[str, None], key: Union[str, None]) -> None:
+    # moved tenants publish an invalidation once their shard is flipped
+    if tenant is None:
+        schema_shards.clear()
+    else:
+        schema_shards.pop(tenant)
+
+
+invalidation_bus.subscribe("tenant", _on_tenant_invalidation)
+
+
+@asynccontextmanager
+async def with_async_db(
+    tenant_schema_name: Union[str, None], read_only: bool = False
+) -> AsyncSession:
+    """Session of the schema, on the shard of the tenant.
+    :param read_only: the session only reads, it may use the read replica
+    """
+    engine = await schema_engine(tenant_schema_name, read_only)
     try:
-        async with async_session(
-            autocommit=False, autoflush=False, bind=schema_engine
-        ) as session:
+        async with schema_session_factory(tenant_schema_name, engine)() as session:
             yield session
     # except ProgrammingError as e:
     #     await session.rollback()
     #     raise e
     except Exception as e:
+        if engine is read_router.replica and isinstance(e, (OSError, exc.DBAPIError)):
+            read_router.failed()
         logging.fatal(e, {"tenant": tenant_schema_name})
         await session.rollback()
         raise  # raise so that it can bubble up and can be handled by the caller!
@@ -71,25 +167,80 @@ async def with_async_db(tenant_schema_name: Union[str, None]) -> AsyncSession:
         await session.close()
 
 
+async def mirror_shared_rows(
+    engine: AsyncEngine, table: sa.Table, rows: List[Dict[str, Any]]
+) -> None:
+    """Copies the public rows referenced by rows of a tenant table to the shard
+    of `engine`, the foreign keys of a tenant schema point to its own database
+    while the shared tables are written on the primary.
+    """
+    if engine is async_engine:
+        return
+    for fk in table.foreign_keys:
+        shared = fk.column.table
+        if shared.schema != "public":
+            continue
+        ids = {row[fk.parent.key] for row in rows if row.get(fk.parent.key)}
+        if not ids:
+            continue
+        async with async_engine.connect() as connection:
+            result = await connection.execute(select(shared).where(fk.column.in_(ids)))
+            found = [dict(row._mapping) for row in result.all()]
+        if found:
+            async with engine.begin() as connection:
+                await connection.execute(
+                    pg_insert(shared).values(found).on_conflict_do_nothing()
+                )
+
+
+async def resolve_tenant(tenant_name: str) -> Union[Tenant, None]:
+    """Looks a tenant up by id or name, going through the tenant cache.
+    :param tenant_name: tenant id or tenant name
+    """
+    cache_key = tenant_cache_key(tenant_name)
+    tenant = tenant_cache.get(cache_key)
+    if tenant is not None:
+        return tenant
+
+    tenant_name = tenant_name.strip()
+    try:
+        tenant_id = uuid.UUID(tenant_name)
+        q = select(Tenant).filter(Tenant.id == tenant_id)
+    except ValueError:
+        q = select(Tenant).filter(func.lower(Tenant.name) == tenant_name.lower())
+
+    async with with_async_db(None, read_only=True) as db:
+        result = await db.execute(q)
+        tenant = result.scalar_one_or_none()
+    if tenant is None and read_router.replica is not None:
+        # a tenant created moments ago may not be replicated yet
+        async with with_async_db(None) as db:
+            result = await db.execute(q)
+            tenant = result.scalar_one_or_none()
+
+    if tenant is not None:
+        tenant_cache.set(cache_key, tenant)
+        schema_shards.set(tenant.schema, tenant.shard)
+    return tenant
+
+
 async def get_tanant(
+    request: Request,
     tenant_name: str = Depends(get_tenant_id_from_api_key),
 ) -> TenantSchema:
     try:
         if tenant_name is None:
             return None
-        tenant_name = tenant_name.strip()
-        try:
-            tenant_id = uuid.UUID(tenant_name)
-            q = select(Tenant).filter(Tenant.id == tenant_id)
-        except ValueError:
-            q = select(Tenant).filter(func.lower(Tenant.name) == tenant_name.lower())
-
-        async with with_async_db(None) as db:
-            result = await db.execute(q)
-            tenant = result.scalar_one_or_none()
+        cache_key = tenant_cache_key(tenant_name)
+        # request scoped dedupe, auth and route dependencies share one lookup
+        resolved = getattr(request.state, "tenant", None)
+        if resolved and resolved[0] == cache_key:
+            return resolved[1]
 
+        tenant = await resolve_tenant(tenant_name)
         if tenant is None:
             return None
+        request.state.tenant = (cache_key, tenant)
     except Exception as e:
         logging.fatal(e, tenant=tenant_name)
     return tenant
@@ -106,3 +257,81 @@ async def get_async_db(tenant: Tenant = Depends(get_tanant)) -> AsyncSession:
 async def get_public_async_db() -> AsyncSession:
     async with with_async_db("public") as db:
         yield db
+
+
+async def get_read_async_db(tenant: Tenant = Depends(get_tanant)) -> AsyncSession:
+    """`get_async_db` of read only routes, the session may use the read replica"""
+    if not tenant:
+        yield None
+        return
+    async with with_async_db(tenant.schema, read_only=True) as db:
+        yield db
+
+
+async def get_read_public_async_db() -> AsyncSession:
+    async with with_async_db("public", read_only=True) as db:
+        yield db
+
+
+async def dispose_engines() -> None:
+    await async_engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+    await shards.dispose()
+
+
+class LazyAsyncSession:
+    """Stands for the `AsyncSession` of a schema, the session is only created
+    when first used. Requests that never touch it, or bail out early, skip the
+    session altogether. `engine` is the one of the shard holding the schema,
+    see `schema_engine`.
+    """
+
+    def __init__(
+        self, tenant_schema_name: Union[str, None], engine: AsyncEngine = async_engine
+    ) -> None:
+        self.tenant_schema_name = tenant_schema_name
+        self.engine = engine
+        self._session: Union[AsyncSession, None] = None
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name: str):
+        if self._session is None:
+            factory = schema_session_factory(self.tenant_schema_name, self.engine)
+            self._session = factory()
+        return getattr(self._session, name)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            session, self._session = self._session, None
+            await session.close()
+
+
+async def get_lazy_async_db(
+    tenant: Tenant = Depends(get_tanant),
+) -> Union[LazyAsyncSession, None]:
+    """`get_async_db` creating the session on first use, for routes that hand
+    their work to background tasks. Background tasks open their own sessions
+    with `with_async_db`, the request session is closed once it responded.
+    """
+    if not tenant:
+        yield None
+        return
+    # the shard of the tenant was cached when resolving it, no query is made
+    engine = await schema_engine(tenant.schema)
+    session = LazyAsyncSession(tenant.schema, engine)
+    try:
+        yield session
+    finally:
+        await session.close()
+
+
+async def get_lazy_public_async_db() -> LazyAsyncSession:
+    session = LazyAsyncSession("public")
+    try:
+        yield session
+    finally:
+        await session.close()
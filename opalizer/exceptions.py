@@ -21,3 +21,16 @@ class TenantNameNotAvailableError(Exception):
     ):
         self.message = message.format(schema)
         super().__init__(self.message)
+
+
+class SharedSchemaOutdatedError(Exception):
+    """Raised on startup when columns of the shared public tables are still
+    missing once their DDL was applied to public.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        super().__init__(
+            f"Missing shared columns {', '.join(columns)}. "
+            "Please upgrade a tenant schema to head first."
+        )
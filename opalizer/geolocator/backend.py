@@ -0,0 +1,35 @@
+from opalizer.config import settings
+from opalizer.geolocator.geocoder import ReverseGeoLocator
+from opalizer.geolocator.gmaps import gmaps
+from opalizer.geolocator.offline import offline_geocoder
+
+BACKENDS = {"gmaps": gmaps, "offline": offline_geocoder}
+
+
+def reverse_backend() -> str:
+    """Name of the reverse geocoding backend, `geocoder.backend`, addresses are
+    stored in `public.geomaps` under it.
+    """
+    backend = settings.geocoder.backend
+    if backend not in BACKENDS:
+        raise ValueError(f"geocoder.backend must be one of {tuple(BACKENDS)}")
+    return backend
+
+
+def reverse_geocoder() -> ReverseGeoLocator:
+    """Reverse geocoding backend selected by `geocoder.backend`"""
+    return BACKENDS[reverse_backend()]
+
+
+async def open_geocoders() -> None:
+    """Opens gmaps, still used to geocode store addresses, and the offline
+    geocoder when it is the reverse geocoding backend.
+    """
+    await gmaps.open()
+    if reverse_geocoder() is offline_geocoder:
+        await offline_geocoder.open()
+
+
+async def close_geocoders() -> None:
+    await gmaps.close()
+    await offline_geocoder.close()
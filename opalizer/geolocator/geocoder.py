@@ -21,16 +21,14 @@ class SingletonMeta(type):
         return cls._instances[cls]
 
 
-class GeoLocator(metaclass=SingletonMeta):
-    """ """
+class ReverseGeoLocator(metaclass=SingletonMeta):
+    """Geocoder finding the address of a location"""
 
     @classmethod
     def __subclasshook__(cls, subclass):
         return (
             hasattr(subclass, "get_address")
             and callable(subclass.get_address)
-            and hasattr(subclass, "get_geocode")
-            and callable(subclass.get_geocode)
             or NotImplemented
         )
 
@@ -39,7 +37,33 @@ class GeoLocator(metaclass=SingletonMeta):
         """Get address using geocode apis"""
         raise NotImplementedError
 
+
+class ForwardGeoLocator(metaclass=SingletonMeta):
+    """Geocoder finding the location of an address"""
+
+    @classmethod
+    def __subclasshook__(cls, subclass):
+        return (
+            hasattr(subclass, "get_geocode")
+            and callable(subclass.get_geocode)
+            or NotImplemented
+        )
+
     @abc.abstractmethod
     async def get_geocode(self, adsress: str):
         """Extract text from the data set"""
         raise NotImplementedError
+
+
+class GeoLocator(ReverseGeoLocator, ForwardGeoLocator):
+    """Geocoder of both directions"""
+
+    @classmethod
+    def __subclasshook__(cls, subclass):
+        return (
+            hasattr(subclass, "get_address")
+            and callable(subclass.get_address)
+            and hasattr(subclass, "get_geocode")
+            and callable(subclass.get_geocode)
+            or NotImplemented
+        )
@@ -1,17 +1,60 @@
-from typing import Tuple, Union
+import asyncio
+import time
+from collections import Counter
+from functools import partial
+from typing import Any, Dict, Tuple, Union
 
+import aiohttp
 from geopy.adapters import AioHTTPAdapter
 from geopy.geocoders import GoogleV3
 from geopy.location import Location
 
 from opalizer.api.store.schemas import StoreSchemaIn
 from opalizer.config import settings
+from opalizer.core.metrics import Histogram
+from opalizer.core.rate_limiter import TokenBucket
 from opalizer.geolocator.geocoder import GeoLocator
 
 GEO_HASH_PRECISION = 12
 
 
+class PooledAioHTTPAdapter(AioHTTPAdapter):
+    """`AioHTTPAdapter` keeping a bounded pool of keep-alive connections"""
+
+    def __init__(
+        self,
+        *,
+        proxies,
+        ssl_context,
+        pool_size: int = 10,
+        keepalive_timeout: float = 30.0,
+    ):
+        super().__init__(proxies=proxies, ssl_context=ssl_context)
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+
+    @property
+    def session(self):
+        session = self.__dict__.get("session")
+        if session is None:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            )
+            session = aiohttp.ClientSession(
+                connector=connector, trust_env=False, raise_for_status=False
+            )
+            self.__dict__["session"] = session
+        return session
+
+
 class Gmaps(GeoLocator):
+    """Google maps geocoder sharing one pooled HTTP client, opened on startup
+    (or on first use) and closed on shutdown. Calls are limited to
+    `gmaps.max_concurrency` in flight and `gmaps.rate_per_second`.
+    """
+
     def __init__(self, api_key: str = None) -> None:
         super().__init__()
         if not settings.get("gmaps_key"):
@@ -22,28 +65,74 @@ class Gmaps(GeoLocator):
         if api_key:
             self.api_key = api_key
 
+        config = settings.gmaps
+        self.semaphore = asyncio.Semaphore(int(config.max_concurrency))
+        self.rate_limit = TokenBucket(
+            rate=float(config.rate_per_second), capacity=float(config.burst) or None
+        )
+        self.latency = {"reverse": Histogram(), "geocode": Histogram()}
+        self.errors: Counter = Counter()
+        self._geolocator: Union[GoogleV3, None] = None
+        # concurrent first calls would each create, and leak, an HTTP client
+        self._open_lock = asyncio.Lock()
+
+    async def open(self) -> GoogleV3:
+        if self._geolocator is not None:
+            return self._geolocator
+        async with self._open_lock:
+            if self._geolocator is not None:
+                return self._geolocator
+            config = settings.gmaps
+            geolocator = GoogleV3(
+                api_key=self.api_key,
+                user_agent=f"{settings.app.name}/{settings.app.version}".lower(),
+                adapter_factory=partial(
+                    PooledAioHTTPAdapter,
+                    pool_size=int(config.max_concurrency),
+                    keepalive_timeout=float(config.keepalive_timeout),
+                ),
+            )
+            self._geolocator = await geolocator.__aenter__()
+        return self._geolocator
+
+    async def close(self) -> None:
+        if self._geolocator is not None:
+            geolocator, self._geolocator = self._geolocator, None
+            await geolocator.__aexit__(None, None, None)
+
+    async def _call(self, kind: str, method: str, **kwargs) -> Any:
+        geolocator = await self.open()
+        async with self.semaphore:
+            await self.rate_limit.acquire()
+            start = time.perf_counter()
+            try:
+                return await getattr(geolocator, method)(**kwargs)
+            except Exception:
+                self.errors[kind] += 1
+                raise
+            finally:
+                self.latency[kind].observe(time.perf_counter() - start)
+
     async def get_address(self, lat: float, long: float) -> Union[Location, None]:
-        async with GoogleV3(
-            api_key=self.api_key,
-            user_agent=f"{settings.app.name}/{settings.app.version}".lower(),
-            adapter_factory=AioHTTPAdapter,
-        ) as geolocator:
-            address = await geolocator.reverse(query=(lat, long), exactly_one=True)
-            return address
+        return await self._call(
+            "reverse", "reverse", query=(lat, long), exactly_one=True
+        )
 
     async def get_geocode(self, address: StoreSchemaIn) -> Tuple[float, float]:
         try:
-            async with GoogleV3(
-                api_key=self.api_key,
-                user_agent=f"{settings.app.name}/{settings.app.version}".lower(),
-                adapter_factory=AioHTTPAdapter,
-                timeout=5,
-            ) as geolocator:
-                address = await geolocator.geocode(query=str(address), exactly_one=True)
-                if address:
-                    return (address.latitude, address.longitude)
+            address = await self._call(
+                "geocode", "geocode", query=str(address), exactly_one=True, timeout=5
+            )
+            if address:
+                return (address.latitude, address.longitude)
         except Exception:
             raise
 
+    def stats(self) -> Dict[str, Dict]:
+        return {
+            kind: {**histogram.stats(), "errors": self.errors[kind]}
+            for kind, histogram in self.latency.items()
+        }
+
 
 gmaps = Gmaps()
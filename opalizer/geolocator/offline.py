@@ -0,0 +1,247 @@
+import asyncio
+import logging
+import math
+from typing import Dict, List, NamedTuple, Tuple, Union
+
+from geopy.location import Location
+
+from opalizer.config import settings
+from opalizer.geolocator.geocoder import ReverseGeoLocator
+
+log = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# https://download.geonames.org/export/dump/readme.txt
+GEONAMES_COLUMNS = {
+    "geonameid": 0,
+    "name": 1,
+    "latitude": 4,
+    "longitude": 5,
+    "feature_code": 7,
+    "country_code": 8,
+    "admin1_code": 10,
+    "population": 14,
+    "timezone": 17,
+}
+
+
+class Place(NamedTuple):
+    geonameid: int
+    name: str
+    latitude: float
+    longitude: float
+    feature_code: str
+    country_code: str
+    admin1: str
+    population: int
+    timezone: str
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def read_admin1_names(path: str) -> Dict[str, str]:
+    """`admin1CodesASCII.txt`, `<country>.<admin1 code>` -> region name"""
+    names = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) >= 2:
+                names[parts[0]] = parts[1]
+    return names
+
+
+def read_places(path: str, admin1_names: Union[Dict[str, str], None] = None):
+    """Places of a GeoNames dump file such as `cities1000.txt`"""
+    admin1_names = admin1_names or {}
+    c = GEONAMES_COLUMNS
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) < 18:
+                continue
+            try:
+                latitude, longitude = float(parts[c["latitude"]]), float(
+                    parts[c["longitude"]]
+                )
+            except ValueError:
+                continue
+            country = parts[c["country_code"]]
+            admin1 = parts[c["admin1_code"]]
+            yield Place(
+                geonameid=int(parts[c["geonameid"]]),
+                name=parts[c["name"]],
+                latitude=latitude,
+                longitude=longitude,
+                feature_code=parts[c["feature_code"]],
+                country_code=country,
+                admin1=admin1_names.get(f"{country}.{admin1}", admin1),
+                population=int(parts[c["population"]] or 0),
+                timezone=parts[c["timezone"]],
+            )
+
+
+class PlaceIndex:
+    """Grid of `cell_size` degrees over places for nearest place lookups.
+
+    Cells are searched in rings around the location until no closer place can
+    be found or `max_distance_km` is reached. Where the rows within reach hold
+    fewer places than cells, as close to the poles, their places are scanned.
+    """
+
+    def __init__(self, places: List[Place], cell_size: float = 0.1) -> None:
+        if (360 / cell_size) % 1:
+            raise ValueError("cell_size must evenly divide 360")
+        self.cell_size = cell_size
+        self.rows = int(180 / cell_size)
+        self.cols = int(360 / cell_size)
+        self.places = places
+        # cell -> (latitude radians, longitude radians, cos latitude, place)
+        self._cells: Dict[Tuple[int, int], List[Tuple]] = {}
+        self._rows: Dict[int, List[Tuple]] = {}
+        for place in places:
+            lat, lon = math.radians(place.latitude), math.radians(place.longitude)
+            entry = (lat, lon, math.cos(lat), place)
+            row, col = self._cell(place.latitude, place.longitude)
+            self._cells.setdefault((row, col), []).append(entry)
+            self._rows.setdefault(row, []).append(entry)
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        row = min(int((latitude + 90) / self.cell_size), self.rows - 1)
+        col = int(((longitude + 180) % 360) / self.cell_size)
+        return row, col
+
+    def _ring(self, row: int, col: int, ring: int, max_rows: int, max_cols: int):
+        """Places of the cells `ring` cells away from (row, col)"""
+        for dr in range(-min(ring, max_rows), min(ring, max_rows) + 1):
+            r = row + dr
+            if not 0 <= r < self.rows:
+                continue
+            if abs(dr) == ring:
+                dcs = range(-min(ring, max_cols), min(ring, max_cols) + 1)
+            elif ring <= max_cols:
+                dcs = (-ring, ring)
+            else:
+                continue
+            for dc in dcs:
+                yield from self._cells.get((r, (col + dc) % self.cols), ())
+
+    def nearest(
+        self, latitude: float, longitude: float, max_distance_km: float
+    ) -> Union[Tuple[Place, float], None]:
+        row, col = self._cell(latitude, longitude)
+        cell_km = self.cell_size * KM_PER_DEGREE
+        lat, lon = math.radians(latitude), math.radians(longitude)
+        cos_lat = math.cos(lat)
+        # compared as haversine `a` terms, converted to km for the closest one
+        reach = min(max_distance_km / EARTH_RADIUS_KM, math.pi)
+        best, best_a = None, math.sin(reach / 2) ** 2
+
+        def closest(entries) -> None:
+            nonlocal best, best_a
+            for p_lat, p_lon, p_cos, place in entries:
+                a = (
+                    math.sin((p_lat - lat) / 2) ** 2
+                    + cos_lat * p_cos * math.sin((p_lon - lon) / 2) ** 2
+                )
+                if a <= best_a:
+                    best, best_a = place, a
+
+        # cells that can hold a place within max_distance_km
+        max_rows = math.ceil(max_distance_km / cell_km) + 1
+        lat_edge = min(90.0, abs(latitude) + (max_rows + 1) * self.cell_size)
+        cos_edge = math.cos(math.radians(lat_edge))
+        max_cols = (self.cols - 1) // 2
+        if cos_edge > 0:
+            max_cols = min(
+                max_cols, math.ceil(max_distance_km / cell_km / cos_edge) + 1
+            )
+
+        band = [
+            self._rows.get(r, ()) for r in range(row - max_rows, row + max_rows + 1)
+        ]
+        if (2 * max_cols + 1) * len(band) > sum(len(places) for places in band):
+            # fewer places in the rows within reach than cells, as near the poles
+            for places in band:
+                closest(places)
+        else:
+            for ring in range(max(max_rows, max_cols) + 1):
+                if best is not None and ring > 1:
+                    # closest any place of the ring can be, with a margin for
+                    # the great circle being shorter than the parallel
+                    edge = min(90.0, abs(latitude) + ring * self.cell_size)
+                    bound = 0.99 * (ring - 1) * cell_km * math.cos(math.radians(edge))
+                    if bound > 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(best_a)):
+                        break
+                closest(self._ring(row, col, ring, max_rows, max_cols))
+
+        if best is None:
+            return None
+        return best, 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(best_a)))
+
+
+class OfflineGeocoder(ReverseGeoLocator):
+    """Reverse geocoder answering with the nearest place of a local GeoNames
+    dataset, `geocoder.offline.cities_path`, indexed on `open()`. It has no
+    forward geocoding, store addresses are still geocoded by gmaps.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.index: Union[PlaceIndex, None] = None
+        self._lock = asyncio.Lock()
+
+    def load(self) -> PlaceIndex:
+        config = settings.geocoder.offline
+        if not config.get("cities_path"):
+            raise ValueError(
+                "geocoder.offline.cities_path is required by the offline geocoder"
+            )
+        admin1_names = None
+        if config.get("admin1_path"):
+            admin1_names = read_admin1_names(config.admin1_path)
+        places = list(read_places(config.cities_path, admin1_names))
+        log.info(f"Loaded {len(places)} places for offline reverse geocoding")
+        return PlaceIndex(places, cell_size=float(config.cell_size))
+
+    async def open(self) -> PlaceIndex:
+        async with self._lock:
+            if self.index is None:
+                self.index = await asyncio.to_thread(self.load)
+        return self.index
+
+    async def close(self) -> None:
+        self.index = None
+
+    async def get_address(self, lat: float, long: float) -> Union[Location, None]:
+        index = self.index or await self.open()
+        found = index.nearest(
+            lat, long, float(settings.geocoder.offline.max_distance_km)
+        )
+        if found is None:
+            return None
+        place, km = found
+        address = ", ".join(
+            p for p in (place.name, place.admin1, place.country_code) if p
+        )
+        raw = {
+            "source": "geonames",
+            **place._asdict(),
+            "distance_km": round(km, 3),
+            "formatted_address": address,
+        }
+        return Location(address, (place.latitude, place.longitude), raw)
+
+
+offline_geocoder = OfflineGeocoder()
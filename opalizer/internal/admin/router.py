@@ -1,12 +1,96 @@
-from typing import Annotated
+from typing import Annotated, Union
 
 from fastapi import APIRouter, Depends
+from pydantic import Field
 
+from opalizer.api.events.addresses import address_buffers
+from opalizer.api.events.buffer import event_buffers
+from opalizer.api.geomap.cache import address_cache_stats, geocode_cache_stats
+from opalizer.api.tenants.cache import tenant_cache
+from opalizer.core.pool import configure_pool
+from opalizer.database import async_engine, read_router, shards
+from opalizer.geolocator.gmaps import gmaps
 from opalizer.internal.admin.utils import validate_basic_credentials
+from opalizer.schemas import ORJSONModel, RequestStatus, SingleResponse
 
 admin_router = APIRouter(prefix="/admin")
 
 
+class PoolSettings(ORJSONModel):
+    size: Union[int, None] = Field(default=None, ge=1)
+    max_overflow: Union[int, None] = Field(default=None, ge=-1)
+    timeout: Union[float, None] = Field(default=None, gt=0)
+
+
 @admin_router.get("/me")
 def read_current_user(username: Annotated[str, Depends(validate_basic_credentials)]):
     return {"username": username}
+
+
+@admin_router.get("/caches")
+def read_cache_stats(
+    username: Annotated[str, Depends(validate_basic_credentials)]
+) -> SingleResponse:
+    """Hit and miss counters of the in-process caches of this worker process"""
+    stats = {
+        "tenants": tenant_cache.stats(),
+        "addresses": address_cache_stats(),
+        "geocodes": geocode_cache_stats(),
+    }
+    return SingleResponse(status=RequestStatus.success, value=stats)
+
+
+@admin_router.get("/buffers")
+def read_buffer_stats(
+    username: Annotated[str, Depends(validate_basic_credentials)]
+) -> SingleResponse:
+    """Pending rows and flushes of the write-behind buffers by tenant schema"""
+    stats = {"events": event_buffers.stats(), "addresses": address_buffers.stats()}
+    return SingleResponse(status=RequestStatus.success, value=stats)
+
+
+@admin_router.get("/geocoder")
+def read_geocoder_stats(
+    username: Annotated[str, Depends(validate_basic_credentials)]
+) -> SingleResponse:
+    """Latency and errors of the Google Maps calls of this worker process"""
+    return SingleResponse(status=RequestStatus.success, value=gmaps.stats())
+
+
+@admin_router.get("/db/pool")
+def read_pool_stats(
+    username: Annotated[str, Depends(validate_basic_credentials)]
+) -> SingleResponse:
+    """Connection pool pressure of this worker process"""
+    return SingleResponse(status=RequestStatus.success, value=async_engine.pool.stats())
+
+
+@admin_router.get("/db/replica")
+def read_replica_stats(
+    username: Annotated[str, Depends(validate_basic_credentials)]
+) -> SingleResponse:
+    """Read replica lag and the reads it took or left to the primary"""
+    stats = read_router.stats()
+    if read_router.replica is not None:
+        stats["pool"] = read_router.replica.pool.stats()
+    return SingleResponse(status=RequestStatus.success, value=stats)
+
+
+@admin_router.get("/db/shards")
+def read_shard_stats(
+    username: Annotated[str, Depends(validate_basic_credentials)]
+) -> SingleResponse:
+    """Connection pools of the shards used by this worker process"""
+    return SingleResponse(status=RequestStatus.success, value=shards.stats())
+
+
+@admin_router.put("/db/pool")
+async def update_pool_settings(
+    payload: PoolSettings,
+    username: Annotated[str, Depends(validate_basic_credentials)],
+) -> SingleResponse:
+    """Resizes the connection pool of this worker process until it restarts,
+    `db.pool` settings apply to new processes.
+    """
+    stats = await configure_pool(async_engine, **payload.dict(exclude_none=True))
+    return SingleResponse(status=RequestStatus.success, value=stats)
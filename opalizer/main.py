@@ -4,13 +4,23 @@ from fastapi import FastAPI, Header, Request, Response
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
+from opalizer.api.events.addresses import address_buffers
+from opalizer.api.events.buffer import event_buffers
+from opalizer.api.events.impressions import impression_counter
+from opalizer.api.events.queue import EventQueueConsumer
 from opalizer.api.events.router import events_router
+from opalizer.api.events.service import process_queued_event, store_address
+from opalizer.api.geomap.deferred import DeferredGeocoder
+from opalizer.api.geomap.prewarm import GeomapPrewarmer
 from opalizer.api.store.router import stores_router
 from opalizer.api.tenants.router import tenants_router
-from opalizer.api.tenants.service import upgrade_head
+from opalizer.api.tenants.service import upgrade_head, upgrade_shared_columns
 from opalizer.config import settings
+from opalizer.core.invalidation import invalidation_bus
 from opalizer.core.logging import setup_logging
 from opalizer.core.rate_limiter import limiter
+from opalizer.geolocator.backend import close_geocoders, open_geocoders
+from opalizer.internal.admin.router import admin_router
 
 log = logging.getLogger(__name__)
 setup_logging()
@@ -24,9 +34,13 @@ def create_app() -> FastAPI:
 
 
 app = create_app()
+queue_consumer = EventQueueConsumer.from_settings(process_queued_event)
+deferred_geocoder = DeferredGeocoder.from_settings(store_address)
+geomap_prewarmer = GeomapPrewarmer.from_settings()
 app.include_router(router=tenants_router)
 app.include_router(stores_router)
 app.include_router(events_router)
+app.include_router(admin_router)
 
 
 @app.get("/")
@@ -55,12 +69,30 @@ async def startup_event():
         logging.info("Starting up...")
     except Exception as e:
         print(f"startup error - {str(e)}")
+    await upgrade_shared_columns()
+    try:
+        await invalidation_bus.start()
+    except Exception as e:
+        log.warning(f"Cache invalidation bus is not available - {str(e)}")
+    await open_geocoders()
+    if settings.events.queue.consume_in_app:
+        queue_consumer.start()
+        deferred_geocoder.start()
+        geomap_prewarmer.start()
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     import os
 
+    await queue_consumer.stop()
+    await deferred_geocoder.stop()
+    await geomap_prewarmer.stop()
+    await event_buffers.close()
+    await address_buffers.close()
+    await impression_counter.close()
+    await invalidation_bus.stop()
+    await close_geocoders()
     try:
         os.remove("log.log")
     except FileNotFoundError:
@@ -0,0 +1,154 @@
+"""Standalone event worker, consumes the durable event queue outside of the api.
+
+    python -m opalizer.worker --processes 4 --concurrency 8
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import signal
+import threading
+from typing import List, Union
+
+from opalizer.api.events.addresses import address_buffers
+from opalizer.api.events.buffer import event_buffers
+from opalizer.api.events.impressions import impression_counter
+from opalizer.api.events.partitions import manage_event_partitions_job
+from opalizer.api.events.queue import EventQueueConsumer
+from opalizer.api.events.service import process_queued_event, store_address
+from opalizer.api.geomap.deferred import DeferredGeocoder
+from opalizer.api.geomap.prewarm import GeomapPrewarmer
+from opalizer.api.tenants.service import upgrade_shared_columns
+from opalizer.config import settings
+from opalizer.core.invalidation import invalidation_bus
+from opalizer.core.scheduler import run_threaded, scheduler
+from opalizer.database import dispose_engines
+from opalizer.geolocator.backend import close_geocoders, open_geocoders
+
+log = logging.getLogger("opalizer.worker")
+
+
+def parse_args(argv: Union[List[str], None] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="opalizer.worker", description="Run the event processing workers."
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=int(settings.worker.processes),
+        help="number of worker processes",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=int(settings.events.queue.concurrency),
+        help="concurrent queue consumers per process",
+    )
+    parser.add_argument(
+        "--no-scheduler",
+        dest="scheduler",
+        action="store_false",
+        default=bool(settings.worker.scheduler),
+        help="do not run the scheduled jobs (event partitions) in this worker",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="events claimed at once by a consumer",
+    )
+    return parser.parse_args(argv)
+
+
+async def serve(concurrency: int, batch_size: Union[int, None] = None) -> None:
+    """Consumes the queue until SIGTERM/SIGINT, then lets the in-flight events
+    finish and flushes the buffered writes.
+    """
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopped.set)
+
+    await upgrade_shared_columns()
+    try:
+        await invalidation_bus.start()
+    except Exception as e:
+        log.warning(f"Cache invalidation bus is not available - {str(e)}")
+
+    await open_geocoders()
+    consumer = EventQueueConsumer.from_settings(
+        process_queued_event, concurrency=concurrency, batch_size=batch_size
+    )
+    consumer.start()
+    retrier = DeferredGeocoder.from_settings(store_address)
+    retrier.start()
+    prewarmer = GeomapPrewarmer.from_settings()
+    prewarmer.start()
+    log.info(f"Worker started with {concurrency} consumers")
+    await stopped.wait()
+
+    log.info("Stopping worker...")
+    await consumer.stop()
+    await retrier.stop()
+    await prewarmer.stop()
+    await event_buffers.close()
+    await address_buffers.close()
+    await impression_counter.close()
+    await invalidation_bus.stop()
+    await close_geocoders()
+    await dispose_engines()
+    log.info(f"Worker stopped, {consumer.stats()}")
+
+
+def run_process(concurrency: int, batch_size: Union[int, None] = None) -> None:
+    logging.basicConfig(level=logging.INFO)
+    try:
+        import uvloop
+
+        uvloop.install()
+    except ImportError:
+        pass
+    asyncio.run(serve(concurrency, batch_size))
+
+
+def start_scheduler() -> None:
+    """Runs the scheduled jobs in a daemon thread, partitions are ensured once
+    right away.
+    """
+    run_threaded(manage_event_partitions_job)
+    threading.Thread(target=scheduler.start, name="scheduler", daemon=True).start()
+
+
+def main(argv: Union[List[str], None] = None) -> None:
+    args = parse_args(argv)
+    if args.scheduler:
+        start_scheduler()
+    if args.processes <= 1:
+        run_process(args.concurrency, args.batch_size)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(
+            target=run_process,
+            args=(args.concurrency, args.batch_size),
+            name=f"opalizer-worker-{i}",
+        )
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    def _terminate(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    signal.signal(signal.SIGTERM, _terminate)
+    signal.signal(signal.SIGINT, _terminate)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,14 @@ from sqlalchemy.orm import Session, sessionmaker
 os.environ["FORCE_ENV_FOR_DYNACONF"] = "test"  # noqa
 
 from opalizer.config import settings
-from opalizer.database import get_async_db, get_public_async_db
+from opalizer.database import (
+    get_async_db,
+    get_lazy_async_db,
+    get_lazy_public_async_db,
+    get_public_async_db,
+    get_read_async_db,
+    get_read_public_async_db,
+)
 from opalizer.main import app
 
 
@@ -31,6 +38,10 @@ async def client(session: Session):
 
     application.dependency_overrides[get_async_db] = get_session_override
     application.dependency_overrides[get_public_async_db] = get_session_override
+    application.dependency_overrides[get_lazy_async_db] = get_session_override
+    application.dependency_overrides[get_lazy_public_async_db] = get_session_override
+    application.dependency_overrides[get_read_async_db] = get_session_override
+    application.dependency_overrides[get_read_public_async_db] = get_session_override
 
     async with TestClient(application=application) as c:
         yield c
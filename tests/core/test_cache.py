@@ -0,0 +1,50 @@
+from opalizer.core.cache import TTLCache
+
+
+class FakeTimer:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cache_hit_miss_counters():
+    cache = TTLCache(max_size=2, ttl=None)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(max_size=2, ttl=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cache_entries_expire():
+    timer = FakeTimer()
+    cache = TTLCache(max_size=2, ttl=10, timer=timer)
+    cache.set("a", 1)
+    timer.now = 9
+    assert cache.get("a") == 1
+    timer.now = 10
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_cache_evict_by_predicate():
+    cache = TTLCache(max_size=4, ttl=None)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.evict(lambda k, v: v == 2) == 1
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
@@ -0,0 +1,67 @@
+import pytest
+
+from opalizer.core.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+async def fail():
+    raise ConnectionError("geocoder down")
+
+
+async def succeed():
+    return "ok"
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_after_consecutive_failures():
+    clock = Clock()
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30, timer=clock)
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            await breaker.call(fail)
+    assert breaker.state == breaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(succeed)
+    assert breaker.stats() == {
+        "state": "open",
+        "failures": 3,
+        "trips": 1,
+        "rejected": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=2, timer=Clock())
+    with pytest.raises(ConnectionError):
+        await breaker.call(fail)
+    assert await breaker.call(succeed) == "ok"
+    with pytest.raises(ConnectionError):
+        await breaker.call(fail)
+    assert breaker.state == breaker.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_half_open_lets_a_single_trial_through():
+    clock = Clock()
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30, timer=clock)
+    with pytest.raises(ConnectionError):
+        await breaker.call(fail)
+    clock.now = 30
+    assert breaker.state == breaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # a failed trial opens the circuit for another reset_timeout
+    breaker.failure()
+    assert breaker.state == breaker.OPEN
+    clock.now = 60
+    assert await breaker.call(succeed) == "ok"
+    assert breaker.state == breaker.CLOSED
@@ -0,0 +1,83 @@
+import asyncio
+
+import asyncpg
+import orjson
+import pytest
+
+from opalizer.core.invalidation import InvalidationBus
+
+
+@pytest.mark.asyncio
+async def test_publish_dispatches_locally_without_connection():
+    bus = InvalidationBus(dsn="postgresql://localhost/none", channel="test")
+    received = []
+    bus.subscribe("store", lambda tenant, key: received.append((tenant, key)))
+    await bus.publish("store", "tenant_a", "1")
+    await bus.publish("tenant", "tenant_a", "1")
+    assert received == [("tenant_a", "1")]
+
+
+def test_notifications_from_other_workers_are_dispatched():
+    bus = InvalidationBus(dsn="postgresql://localhost/none", channel="test")
+    received = []
+    bus.subscribe("store", lambda tenant, key: received.append((tenant, key)))
+    own = {"origin": bus.origin, "kind": "store", "tenant": "a", "key": "1"}
+    other = {"origin": "other", "kind": "store", "tenant": "b", "key": "2"}
+    bus._on_notification(None, 1, "test", orjson.dumps(own).decode())
+    bus._on_notification(None, 1, "test", orjson.dumps(other).decode())
+    assert received == [("b", "2")]
+
+
+def test_reset_notifies_every_subscriber():
+    bus = InvalidationBus(dsn="postgresql://localhost/none", channel="test")
+    received = []
+    bus.subscribe("store", lambda tenant, key: received.append(("store", tenant)))
+    bus.subscribe("tenant", lambda tenant, key: received.append(("tenant", tenant)))
+    bus.reset()
+    assert sorted(received) == [("store", None), ("tenant", None)]
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    async def add_listener(self, channel, callback):
+        pass
+
+    async def remove_listener(self, channel, callback):
+        pass
+
+    def add_termination_listener(self, callback):
+        pass
+
+    def is_closed(self):
+        return self.closed
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_failed_start_keeps_reconnecting(monkeypatch):
+    attempts = []
+
+    async def connect(dsn):
+        attempts.append(dsn)
+        if len(attempts) < 3:
+            raise OSError("connection refused")
+        return FakeConnection()
+
+    monkeypatch.setattr(asyncpg, "connect", connect)
+    bus = InvalidationBus(dsn="postgresql://localhost/none", channel="test")
+    bus.reconnect_delay = 0.01
+    resets = []
+    bus.subscribe("store", lambda tenant, key: resets.append(tenant))
+
+    await bus.start()
+    assert not bus.connected
+    await asyncio.wait_for(bus._reconnect_task, 1)
+    assert bus.connected
+    assert len(attempts) == 3
+    # dropped on every failure and once connected
+    assert resets == [None, None, None]
+    await bus.stop()
@@ -0,0 +1,27 @@
+import asyncio
+
+import pytest
+
+from opalizer.core.metrics import Histogram
+from opalizer.core.rate_limiter import TokenBucket
+
+
+def test_histogram_cumulative_buckets_and_quantiles():
+    histogram = Histogram(buckets=(0.1, 1.0))
+    for value in (0.05, 0.05, 0.5, 3.0):
+        histogram.observe(value)
+    stats = histogram.stats()
+    assert stats["count"] == 4
+    assert stats["buckets"] == {"0.1": 2, "1.0": 3, "+Inf": 4}
+    assert stats["p50"] == 0.1
+    assert stats["p99"] is None
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_waits_for_tokens():
+    bucket = TokenBucket(rate=100, capacity=2)
+    assert await bucket.acquire() == 0
+    assert await bucket.acquire() == 0
+    start = asyncio.get_running_loop().time()
+    assert await bucket.acquire() > 0
+    assert asyncio.get_running_loop().time() - start >= 0.005
@@ -0,0 +1,54 @@
+from unittest import mock
+
+import pytest
+from sqlalchemy import exc
+from sqlalchemy.util import greenlet_spawn
+
+from opalizer.core.pool import InstrumentedQueuePool
+
+
+def make_pool(**kwargs):
+    return InstrumentedQueuePool(mock.Mock, pre_ping=False, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_checkout_waits_and_timeouts_are_recorded():
+    pool = make_pool(pool_size=1, max_overflow=0, timeout=0.01)
+    connection = await greenlet_spawn(pool.connect)
+    assert pool.stats()["checked_out"] == 1
+    with pytest.raises(exc.TimeoutError):
+        await greenlet_spawn(pool.connect)
+    await greenlet_spawn(connection.close)
+
+    stats = pool.stats()
+    assert stats["checked_out"] == 0
+    assert stats["idle"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["checkout_wait"]["count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_configured_settings_apply_to_the_recreated_pool():
+    pool = make_pool(pool_size=1, max_overflow=0, timeout=0.01)
+    old = await greenlet_spawn(pool.connect)
+    pool.configure(size=2, max_overflow=1, timeout=5)
+    new = pool.recreate()
+    await greenlet_spawn(old.close)
+
+    connections = [await greenlet_spawn(new.connect) for _ in range(3)]
+    stats = new.stats()
+    assert (stats["size"], stats["max_overflow"], stats["timeout"]) == (2, 1, 5)
+    assert (stats["checked_out"], stats["overflow"]) == (3, 1)
+    assert stats["checkout_wait"]["count"] == 4
+    for connection in connections:
+        await greenlet_spawn(connection.close)
+
+
+def test_recreated_pool_keeps_the_unchanged_settings():
+    pool = make_pool(pool_size=3, max_overflow=2, timeout=7, recycle=60)
+    pool.configure(size=4)
+    new = pool.recreate()
+    assert type(new) is InstrumentedQueuePool
+    assert (new.size(), new._max_overflow, new._timeout) == (4, 2, 7)
+    assert new._recycle == 60
+    assert new.metrics is pool.metrics
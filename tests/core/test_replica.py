@@ -0,0 +1,62 @@
+import pytest
+
+from opalizer.core.replica import ReplicaRouter
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def router_with_lag(lags, clock):
+    primary, replica = object(), object()
+    router = ReplicaRouter(primary, replica, max_lag=5, check_interval=10, timer=clock)
+    lags = iter(lags)
+
+    async def lag():
+        value = next(lags)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    router._lag = lag
+    return router, primary, replica
+
+
+@pytest.mark.asyncio
+async def test_reads_use_the_primary_without_replica():
+    primary = object()
+    router = ReplicaRouter(primary, None)
+    assert await router.engine() is primary
+    assert router.stats()["configured"] is False
+
+
+@pytest.mark.asyncio
+async def test_reads_leave_a_lagging_replica_until_next_check():
+    clock = Clock()
+    router, primary, replica = router_with_lag([0.5, 30.0, 1.0], clock)
+    assert await router.engine() is replica
+    clock.now = 10
+    assert await router.engine() is primary
+    assert router.lag == 30.0
+    clock.now = 15
+    assert await router.engine() is primary  # not checked again yet
+    clock.now = 20
+    assert await router.engine() is replica
+    assert router.stats()["replica_reads"] == 2
+    assert router.stats()["primary_reads"] == 2
+
+
+@pytest.mark.asyncio
+async def test_reads_fall_back_to_primary_when_replica_fails():
+    clock = Clock()
+    router, primary, replica = router_with_lag([ConnectionError(), 0.0], clock)
+    assert await router.engine() is primary
+    assert router.lag is None
+    clock.now = 10
+    assert await router.engine() is replica
+    router.failed()
+    assert await router.engine() is primary
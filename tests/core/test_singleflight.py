@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+from opalizer.core.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_flight():
+    flights = SingleFlight()
+    calls = []
+
+    async def lookup(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return object()
+
+    results = await asyncio.gather(*(flights.do("a", lookup, "a") for _ in range(5)))
+    assert calls == ["a"]
+    assert all(r is results[0] for r in results)
+    assert flights.coalesced == 4
+    assert len(flights) == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_flight_is_shared_and_not_kept():
+    flights = SingleFlight()
+
+    async def lookup():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(
+        *(flights.do("a", lookup) for _ in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flights.calls == 1
+    with pytest.raises(ValueError):
+        await flights.do("a", lookup)
+    assert flights.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_followers_retry_when_the_leader_is_cancelled():
+    flights = SingleFlight()
+    started = asyncio.Event()
+
+    async def lookup():
+        started.set()
+        await asyncio.sleep(0.01)
+        return 1
+
+    leader = asyncio.create_task(flights.do("a", lookup))
+    await started.wait()
+    follower = asyncio.create_task(flights.do("a", lookup))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await follower == 1
+    assert flights.calls == 2
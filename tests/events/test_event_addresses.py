@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+import pytest
+
+from opalizer.api.events.addresses import AddressBuffer, AddressBufferRegistry
+
+
+def geomap(geohash):
+    return SimpleNamespace(id=geohash, geohash=geohash)
+
+
+@pytest.fixture
+def buffer(monkeypatch):
+    buffer = AddressBuffer("tenant_a", max_rows=10, flush_interval=0.01)
+    buffer.batches = []
+
+    async def _insert(rows):
+        buffer.batches.append([row["geohash"] for row in rows])
+
+    monkeypatch.setattr(buffer, "_insert", _insert)
+    return buffer
+
+
+@pytest.mark.asyncio
+async def test_known_geohashes_are_inserted_once(buffer):
+    for geohash in ["a", "b", "a", "a", "b", "c"]:
+        await buffer.add(geomap(geohash))
+    await buffer.close()
+    assert buffer.batches == [["a", "b", "c"]]
+    assert buffer.skipped == 3
+
+    assert not await buffer.add(geomap("a"))
+
+
+@pytest.mark.asyncio
+async def test_failed_batches_are_retried_by_the_next_events(buffer, monkeypatch):
+    async def _insert(rows):
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(buffer, "_insert", _insert)
+    await buffer.add(geomap("a"))
+    await buffer.close()
+    assert buffer.metrics.failed_rows == 1
+    assert await buffer.add(geomap("a"))
+    await buffer.close()
+
+
+def test_tenant_invalidation_forgets_the_known_geohashes():
+    registry = AddressBufferRegistry()
+    registry.get("tenant_a").known.set("a", True)
+    registry.get("tenant_b").known.set("b", True)
+    registry.forget("tenant_a")
+    assert registry.stats()["tenant_a"]["known"] == 0
+    assert registry.stats()["tenant_b"]["known"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stored_addresses_are_inserted_before_returning(buffer, monkeypatch):
+    await buffer.store(geomap("a"))
+    assert buffer.batches == [["a"]]
+    assert buffer.pending == 0
+    assert not await buffer.add(geomap("a"))
+
+    async def _insert(rows):
+        raise ConnectionError("database is down")
+
+    monkeypatch.setattr(buffer, "_insert", _insert)
+    with pytest.raises(ConnectionError):
+        await buffer.store(geomap("b"))
+    assert buffer.known.get("b") is None
@@ -0,0 +1,37 @@
+import orjson
+import pytest
+
+from opalizer.api.events.utils import parse_events_body, validate_events
+
+event = {
+    "latitude": 18.5204,
+    "longitude": 73.8567,
+    "ga_user_id": "GA1.1.123",
+    "window_location_json": {"href": "https://example.com/?utm_source=test"},
+    "browser_json": {"app_code_name": "Mozilla", "user_agent": "test"},
+    "extra_json": None,
+}
+
+
+def test_parse_json_array_body():
+    items = parse_events_body(orjson.dumps([event, event]), "application/json")
+    assert items == [event, event]
+
+
+def test_parse_json_body_must_be_an_array():
+    with pytest.raises(ValueError):
+        parse_events_body(orjson.dumps(event), "application/json")
+
+
+def test_parse_ndjson_body_keeps_bad_lines():
+    body = orjson.dumps(event) + b"\n\n{bad json\n" + orjson.dumps(event)
+    items = parse_events_body(body, "application/x-ndjson")
+    assert len(items) == 3
+    assert isinstance(items[1], ValueError)
+
+
+def test_validate_events_reports_rejected_indexes():
+    items = [event, {**event, "latitude": "north"}, ValueError("bad"), event]
+    payloads, errors = validate_events(items)
+    assert len(payloads) == 2
+    assert [e["index"] for e in errors] == [1, 2]
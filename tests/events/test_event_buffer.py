@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from opalizer.api.events.buffer import EVENT_COLUMNS, EventBuffer, event_record
+
+
+class RecordingBuffer(EventBuffer):
+    def __init__(self, **kwargs):
+        super().__init__(schema="test", **kwargs)
+        self.batches = []
+
+    async def _copy(self, rows):
+        self.batches.append(len(rows))
+
+
+@pytest.mark.asyncio
+async def test_buffer_flushes_every_max_rows():
+    buffer = RecordingBuffer(max_rows=2, flush_interval=10)
+    for _ in range(4):
+        await buffer.put({"latitude": 1.0})
+    await asyncio.sleep(0.01)
+    assert buffer.batches == [2, 2]
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_buffer_flushes_after_interval():
+    buffer = RecordingBuffer(max_rows=100, flush_interval=0.01)
+    await buffer.put({"latitude": 1.0})
+    await asyncio.sleep(0.05)
+    assert buffer.batches == [1]
+    assert buffer.metrics.stats()["rows"] == 1
+    await buffer.close()
+
+
+@pytest.mark.asyncio
+async def test_buffer_close_flushes_pending_rows():
+    buffer = RecordingBuffer(max_rows=100, flush_interval=10)
+    for _ in range(3):
+        await buffer.put({"latitude": 1.0})
+    await buffer.close()
+    assert buffer.batches == [3]
+
+
+def test_event_record_encodes_json_columns():
+    record = event_record({"latitude": 1.0, "browser_json": {"a": 1}})
+    assert len(record) == len(EVENT_COLUMNS)
+    assert record[EVENT_COLUMNS.index("browser_json")] == '{"a":1}'
+    assert record[EVENT_COLUMNS.index("extra_json")] is None
+
+
+class FailingBuffer(EventBuffer):
+    def __init__(self, failures, **kwargs):
+        super().__init__(schema="test", retry_delay=0, **kwargs)
+        self.failures = failures
+        self.attempts = 0
+        self.dead_letters = []
+
+    async def _write(self, rows):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise ConnectionError("db down")
+
+    async def _dead_letter(self, rows, error):
+        self.dead_letters.append((len(rows), error))
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_retried():
+    buffer = FailingBuffer(failures=2, max_attempts=3)
+    await buffer.flush([{"latitude": 1.0}])
+    assert buffer.attempts == 3
+    assert buffer.dead_letters == []
+    assert buffer.metrics.stats()["rows"] == 1
+
+
+@pytest.mark.asyncio
+async def test_rows_of_a_failing_flush_are_dead_lettered():
+    buffer = FailingBuffer(failures=5, max_attempts=3)
+    await buffer.flush([{"latitude": 1.0}, {"latitude": 2.0}])
+    assert buffer.attempts == 3
+    assert buffer.dead_letters == [(2, "ConnectionError('db down')")]
+    assert buffer.metrics.stats()["failed_rows"] == 2
@@ -0,0 +1,112 @@
+import math
+import random
+
+import orjson
+import pytest
+from pydantic import ValidationError
+
+from opalizer.api.events.fastpath import (
+    EventValidationError,
+    parse_event,
+    validate_event,
+)
+from opalizer.api.events.schemas import EventSchemaIn
+from opalizer.api.events.utils import event_values
+
+event = {
+    "latitude": 18.5204,
+    "longitude": 73.8567,
+    "accuracy": 12,
+    "ga_user_id": "GA1.1.123",
+    "window_location_json": {"href": "https://example.com/", "search": "?utm_term=x"},
+    "browser_json": {"app_code_name": "Mozilla", "user_agent": "test"},
+    "extra_json": {"k": [1, 2]},
+}
+
+values = [
+    None,
+    0,
+    1,
+    -2.5,
+    1e300,
+    10**30,
+    True,
+    "1.5",
+    " 2 ",
+    "1_0",
+    "nan",
+    "abc",
+    "",
+    "ab",
+    [],
+    [1],
+    ["ab"],
+    [["a", 1]],
+    {},
+    {"href": 1, "other": "x"},
+    {"app_code_name": "a", "user_agent": 3},
+    {"app_code_name": None, "user_agent": "x"},
+]
+
+
+def _mutations(rng: random.Random, count: int):
+    for _ in range(count):
+        item = dict(event)
+        for key in list(item):
+            if rng.random() < 0.15:
+                del item[key]
+            elif rng.random() < 0.3:
+                item[key] = rng.choice(values)
+        if rng.random() < 0.05:
+            item[rng.choice(["foo", "zzz"])] = 1
+        yield item
+    yield from values
+
+
+def _outcome(validate, item):
+    try:
+        return repr(validate(item).dict()), None
+    except (ValidationError, EventValidationError) as e:
+        return None, e.errors()
+
+
+def test_fast_path_matches_pydantic():
+    rng = random.Random(7)
+    accepted = 0
+    for item in _mutations(rng, 3000):
+        expected = _outcome(EventSchemaIn.parse_obj, item)
+        assert _outcome(validate_event, item) == expected, item
+        accepted += expected[0] is not None
+    assert accepted > 100
+
+
+def test_fast_path_event_values():
+    row = validate_event(event)
+    assert event_values(row) == event_values(EventSchemaIn.parse_obj(event))
+    assert event_values(row)["utm_term"] == "x"
+
+
+def test_parse_event_body():
+    row = parse_event(orjson.dumps(event), "application/json; charset=utf-8")
+    assert row.latitude == event["latitude"]
+    assert row.accuracy == 12.0
+
+
+def test_parse_event_falls_back_to_json_for_nan():
+    body = orjson.dumps(event).replace(b"18.5204", b"NaN")
+    assert math.isnan(parse_event(body).latitude)
+
+
+@pytest.mark.parametrize(
+    "body,content_type",
+    [
+        (b"", "application/json"),
+        (b"{bad", "application/json"),
+        (b"[]", "application/json"),
+        (orjson.dumps([event]), None),
+        (orjson.dumps(event), "text/plain"),
+    ],
+)
+def test_parse_event_rejects(body, content_type):
+    with pytest.raises(EventValidationError):
+        parse_event(body, content_type)
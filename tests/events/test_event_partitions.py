@@ -0,0 +1,106 @@
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+import opalizer.api.events.partitions as ep
+from opalizer.api.events.partitions import (
+    next_period,
+    parse_partition_bound,
+    partition_name,
+    period_start,
+)
+
+
+def test_monthly_periods():
+    start = period_start(date(2023, 12, 17), "month")
+    assert start == date(2023, 12, 1)
+    assert next_period(start, "month") == date(2024, 1, 1)
+    assert next_period(date(2024, 1, 1), "month") == date(2024, 2, 1)
+    assert partition_name(start, "month") == "events_p202312"
+
+
+def test_daily_periods():
+    start = period_start(date(2024, 2, 28), "day")
+    assert next_period(start, "day") == date(2024, 2, 29)
+    assert partition_name(start, "day") == "events_p20240228"
+
+
+def test_parse_partition_bounds():
+    partition = parse_partition_bound(
+        "events_p202307",
+        "FOR VALUES FROM ('2023-07-01 00:00:00+00') TO ('2023-08-01 00:00:00+00')",
+    )
+    assert partition.lower == datetime(2023, 7, 1, tzinfo=timezone.utc)
+    assert partition.upper == datetime(2023, 8, 1, tzinfo=timezone.utc)
+
+    legacy = parse_partition_bound(
+        "events_legacy", "FOR VALUES FROM (MINVALUE) TO ('2023-07-01 05:30:00+05:30')"
+    )
+    assert legacy.lower is None
+    assert legacy.upper == datetime(2023, 7, 1, tzinfo=timezone.utc)
+
+    assert parse_partition_bound("events_default", "DEFAULT") is None
+
+
+class RecordingConnection:
+    def __init__(self, statements):
+        self.statements = statements
+
+    async def execute(self, statement, parameters=None):
+        self.statements.append(str(statement))
+        return SimpleNamespace(rowcount=0)
+
+
+class RecordingEngine:
+    def __init__(self):
+        self.statements = []
+
+    @asynccontextmanager
+    async def connect(self):
+        yield RecordingConnection(self.statements)
+
+    begin = connect
+
+
+@pytest.mark.asyncio
+async def test_partitions_are_created_under_an_advisory_lock(monkeypatch):
+    existing = []
+
+    async def list_partitions(connection, schema):
+        return list(existing)
+
+    monkeypatch.setattr(ep, "list_partitions", list_partitions)
+    engine = RecordingEngine()
+    created = await ep.ensure_partitions(
+        engine, "tenant_a", date(2023, 7, 5), "month", premake=1
+    )
+    assert created == ["events_p202307", "events_p202308"]
+    locks = [i for i, s in enumerate(engine.statements) if "pg_advisory_xact_lock" in s]
+    creates = [i for i, s in enumerate(engine.statements) if s.startswith("CREATE")]
+    assert len(locks) == 2 and len(creates) == 2
+    assert all(lock < create for lock, create in zip(locks, creates, strict=True))
+
+
+@pytest.mark.asyncio
+async def test_partition_created_by_another_worker_is_skipped(monkeypatch):
+    july = ep.Partition(
+        "events_p202307",
+        datetime(2023, 7, 1, tzinfo=timezone.utc),
+        datetime(2023, 8, 1, tzinfo=timezone.utc),
+    )
+    listed = []
+
+    async def list_partitions(connection, schema):
+        # created elsewhere between the first listing and the lock
+        listed.append(schema)
+        return [] if len(listed) == 1 else [july]
+
+    monkeypatch.setattr(ep, "list_partitions", list_partitions)
+    engine = RecordingEngine()
+    created = await ep.ensure_partitions(
+        engine, "tenant_a", date(2023, 7, 5), "month", premake=0
+    )
+    assert created == []
+    assert not any(s.startswith("CREATE") for s in engine.statements)
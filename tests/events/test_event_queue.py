@@ -0,0 +1,160 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+import opalizer.api.events.queue as eq
+from opalizer.api.events.queue import backoff
+from opalizer.config import settings
+
+
+def test_backoff_doubles_up_to_the_maximum():
+    base = int(settings.events.queue.backoff_seconds)
+    maximum = int(settings.events.queue.max_backoff_seconds)
+    assert backoff(1) == base
+    assert backoff(2) == base * 2
+    assert backoff(3) == base * 4
+    assert backoff(100) == maximum
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+        self.commits = 0
+
+    async def execute(self, statement, *args):
+        self.statements.append(statement)
+        return SimpleNamespace(all=lambda: [])
+
+    async def commit(self):
+        self.commits += 1
+
+    def sql(self, i=0):
+        return str(self.statements[i].compile(dialect=postgresql.dialect()))
+
+
+def payload(latitude=1.0):
+    return {
+        "latitude": latitude,
+        "longitude": 73.8567,
+        "window_location_json": {"href": "https://example.com/"},
+        "browser_json": {"app_code_name": "Mozilla", "user_agent": "test"},
+        "extra_json": None,
+    }
+
+
+def claimed(attempts=1, id=1, latitude=1.0):
+    return eq.ClaimedEvent(id, uuid.uuid4(), payload(latitude), attempts)
+
+
+@pytest.mark.asyncio
+async def test_claim_skips_locked_events_and_leases_them():
+    session = RecordingSession()
+    assert await eq.claim(session, limit=5, lease_seconds=60) == []
+    sql = session.sql()
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "attempts=(public.event_queue.attempts + " in sql
+    assert "RETURNING" in sql
+    assert session.commits == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_event_is_rescheduled_with_backoff():
+    session = RecordingSession()
+    await eq.fail(session, claimed(attempts=1), "boom")
+    assert len(session.statements) == 1
+    assert session.sql().startswith("UPDATE public.event_queue SET available_at")
+    assert "last_error" in session.sql()
+
+
+@pytest.mark.asyncio
+async def test_event_out_of_attempts_is_dead_lettered():
+    session = RecordingSession()
+    attempts = int(settings.events.queue.max_attempts)
+    await eq.fail(session, claimed(attempts=attempts), "boom")
+    assert session.sql(0).startswith("INSERT INTO public.event_dead_letters")
+    assert session.sql(1).startswith("DELETE FROM public.event_queue")
+    assert session.commits == 1
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    calls = SimpleNamespace(completed=[], failed=[], extended=[])
+
+    @asynccontextmanager
+    async def with_async_db(schema):
+        yield None
+
+    async def resolve_tenant(tenant_id):
+        return SimpleNamespace(id=tenant_id, schema="tenant_a")
+
+    async def complete(session, event):
+        calls.completed.append(event.id)
+
+    async def fail(session, event, error):
+        calls.failed.append((event.id, error))
+
+    async def extend_lease(session, events, lease_seconds):
+        calls.extended.append([event.id for event in events])
+
+    monkeypatch.setattr(eq, "with_async_db", with_async_db)
+    monkeypatch.setattr(eq, "resolve_tenant", resolve_tenant)
+    monkeypatch.setattr(eq, "complete", complete)
+    monkeypatch.setattr(eq, "fail", fail)
+    monkeypatch.setattr(eq, "extend_lease", extend_lease)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_consumer_completes_handled_events_and_fails_the_others(queue):
+    async def handler(payload, tenant):
+        if payload.latitude > 1:
+            raise ValueError("bad event")
+
+    consumer = eq.EventQueueConsumer(handler, lease_seconds=60)
+    await consumer.handle_batch([claimed(id=1), claimed(id=2, latitude=2.0)])
+    assert queue.completed == [1]
+    assert queue.failed == [(2, "ValueError('bad event')")]
+    assert consumer.stats()["processed"] == 1
+    assert consumer.stats()["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_consumer_fails_events_running_past_the_timeout(queue):
+    async def handler(payload, tenant):
+        await asyncio.sleep(1)
+
+    consumer = eq.EventQueueConsumer(handler, lease_seconds=60, handler_timeout=0.01)
+    await consumer.handle(claimed(id=1))
+    assert queue.completed == []
+    assert queue.failed[0][0] == 1
+
+
+@pytest.mark.asyncio
+async def test_consumer_extends_the_lease_of_the_rest_of_the_batch(queue):
+    clock = Clock()
+
+    async def handler(payload, tenant):
+        clock.now += 20
+
+    consumer = eq.EventQueueConsumer(handler, lease_seconds=60, timer=clock)
+    await consumer.handle_batch([claimed(id=i) for i in range(1, 6)])
+    assert queue.completed == [1, 2, 3, 4, 5]
+    # half of the lease passed after the second and the fourth event
+    assert queue.extended == [[3, 4, 5], [5]]
+
+
+def test_handler_timeout_must_fit_in_the_lease():
+    with pytest.raises(ValueError):
+        eq.EventQueueConsumer(None, lease_seconds=60, handler_timeout=45)
@@ -0,0 +1,40 @@
+import pytest
+
+from opalizer.api.events.impressions import ImpressionCounter
+
+
+class RecordingCounter(ImpressionCounter):
+    def __init__(self, fail=False):
+        super().__init__(flush_interval=60)
+        self.fail = fail
+        self.upserts = []
+
+    async def _upsert(self, schema, counter):
+        if self.fail:
+            raise RuntimeError("database is down")
+        self.upserts.append((schema, dict(counter)))
+
+
+@pytest.mark.asyncio
+async def test_impressions_are_coalesced_per_tenant():
+    counter = RecordingCounter()
+    for user_id in ["a", "b", "a", "a"]:
+        counter.add("tenant_a", user_id)
+    counter.add("tenant_b", "a")
+    await counter.close()
+    assert sorted(counter.upserts) == [
+        ("tenant_a", {"a": 3, "b": 1}),
+        ("tenant_b", {"a": 1}),
+    ]
+    assert counter.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_counts():
+    counter = RecordingCounter(fail=True)
+    counter.add("tenant_a", "a")
+    await counter.close()
+    counter.add("tenant_a", "a")
+    counter.fail = False
+    await counter.close()
+    assert counter.upserts == [("tenant_a", {"a": 2})]
@@ -0,0 +1,76 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import opalizer.geolocator.gmaps as gmaps_module
+from opalizer.config import settings
+from opalizer.geolocator.gmaps import gmaps
+
+
+class FakeGeocoder:
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def reverse(self, query, exactly_one):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if query == (0, 0):
+            raise ValueError("quota")
+        return query
+
+
+@pytest.fixture
+def geocoder(monkeypatch):
+    fake = FakeGeocoder()
+    monkeypatch.setattr(gmaps, "_geolocator", fake)
+    monkeypatch.setattr(gmaps, "semaphore", asyncio.Semaphore(2))
+    monkeypatch.setattr(gmaps.rate_limit, "rate", 1000.0)
+    yield fake
+
+
+@pytest.mark.asyncio
+async def test_gmaps_limits_concurrent_calls(geocoder):
+    count = gmaps.latency["reverse"].count
+    results = await asyncio.gather(*(gmaps.get_address(1, i) for i in range(5)))
+    assert results == [(1, i) for i in range(5)]
+    assert geocoder.max_in_flight == 2
+    assert gmaps.latency["reverse"].count == count + 5
+
+
+@pytest.mark.asyncio
+async def test_gmaps_counts_errors(geocoder):
+    errors = gmaps.stats()["reverse"]["errors"]
+    with pytest.raises(ValueError):
+        await gmaps.get_address(0, 0)
+    assert gmaps.stats()["reverse"]["errors"] == errors + 1
+
+
+@pytest.mark.asyncio
+async def test_gmaps_opens_one_client_on_concurrent_first_calls(monkeypatch):
+    created = []
+
+    class FakeGoogleV3:
+        def __init__(self, **kwargs):
+            created.append(self)
+
+        async def __aenter__(self):
+            await asyncio.sleep(0.01)
+            return self
+
+    class Settings:
+        app = SimpleNamespace(name="opalizer", version="test")
+
+        def __getattr__(self, name):
+            return getattr(settings, name)
+
+    monkeypatch.setattr(gmaps_module, "GoogleV3", FakeGoogleV3)
+    monkeypatch.setattr(gmaps_module, "settings", Settings())
+    # Gmaps is a singleton, its client is restored once done
+    monkeypatch.setattr(gmaps, "_geolocator", None)
+    geolocators = await asyncio.gather(*(gmaps.open() for _ in range(5)))
+    assert len(created) == 1
+    assert all(geolocator is created[0] for geolocator in geolocators)
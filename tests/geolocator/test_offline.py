@@ -0,0 +1,90 @@
+import random
+
+import pytest
+
+from opalizer.config import settings
+from opalizer.geolocator import backend
+from opalizer.geolocator.geocoder import ForwardGeoLocator, ReverseGeoLocator
+from opalizer.geolocator.gmaps import gmaps
+from opalizer.geolocator.offline import (
+    Place,
+    PlaceIndex,
+    haversine_km,
+    offline_geocoder,
+    read_places,
+)
+
+rows = [
+    (1259229, "Pune", 18.51957, 73.85535, "PPLA2", "IN", "16", 3124458),
+    (1275339, "Mumbai", 19.07283, 72.88261, "PPLA", "IN", "16", 12691836),
+    (2988507, "Paris", 48.85341, 2.3488, "PPLC", "FR", "11", 2138551),
+]
+
+
+@pytest.fixture
+def geonames(tmp_path):
+    cities = tmp_path / "cities.txt"
+    lines = []
+    for gid, name, lat, lon, code, country, admin1, population in rows:
+        columns = [str(gid), name, name, "", str(lat), str(lon), "P", code, country]
+        columns += ["", admin1, "", "", "", str(population), "", "", "Asia/Kolkata"]
+        columns += ["2023-01-01"]
+        lines.append("\t".join(columns))
+    cities.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    admin1 = tmp_path / "admin1.txt"
+    admin1.write_text("IN.16\tMaharashtra\tMaharashtra\t1264418\n", encoding="utf-8")
+    return cities, admin1
+
+
+def test_read_places(geonames):
+    cities, _ = geonames
+    places = list(read_places(str(cities), {"IN.16": "Maharashtra"}))
+    assert [p.name for p in places] == ["Pune", "Mumbai", "Paris"]
+    assert places[0].admin1 == "Maharashtra"
+    assert places[2].admin1 == "11"
+
+
+def test_nearest_place_matches_a_linear_scan():
+    rng = random.Random(3)
+    places = [
+        Place(
+            i, str(i), rng.uniform(-89, 89), rng.uniform(-180, 180), "", "", "", 0, ""
+        )
+        for i in range(500)
+    ]
+    index = PlaceIndex(places, cell_size=1.0)
+    for _ in range(300):
+        lat, lon = rng.uniform(-90, 90), rng.uniform(-180, 180)
+        found = index.nearest(lat, lon, max_distance_km=1000)
+        distance = min(haversine_km(lat, lon, p.latitude, p.longitude) for p in places)
+        if distance > 1000:
+            assert found is None
+        else:
+            assert found[1] == pytest.approx(distance)
+
+
+@pytest.mark.asyncio
+async def test_offline_geocoder_address(geonames, monkeypatch):
+    cities, admin1 = geonames
+    config = settings.geocoder.offline
+    monkeypatch.setattr(config, "cities_path", str(cities))
+    monkeypatch.setattr(config, "admin1_path", str(admin1))
+    monkeypatch.setattr(config, "max_distance_km", 50)
+    monkeypatch.setattr(offline_geocoder, "index", None)
+
+    location = await offline_geocoder.get_address(18.5204, 73.8567)
+    assert location.address == "Pune, Maharashtra, IN"
+    assert location._raw["source"] == "geonames"
+    assert location._raw["distance_km"] < 1
+    assert len(offline_geocoder.index) == 3
+    # middle of the arabian sea
+    assert await offline_geocoder.get_address(15.0, 65.0) is None
+
+
+def test_backends_are_reverse_geolocators(monkeypatch):
+    assert isinstance(offline_geocoder, ReverseGeoLocator)
+    assert not isinstance(offline_geocoder, ForwardGeoLocator)
+    assert isinstance(gmaps, ReverseGeoLocator)
+    assert isinstance(gmaps, ForwardGeoLocator)
+    monkeypatch.setattr(settings.geocoder, "backend", "offline")
+    assert backend.reverse_geocoder() is offline_geocoder
@@ -0,0 +1,255 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+import opalizer.api.geomap.cache as gc
+import opalizer.api.geomap.service as gs
+
+
+@pytest.fixture
+def geocoded(monkeypatch):
+    calls = []
+
+    async def _get_address(latitude, longitude, bucket=None):
+        calls.append(bucket)
+        await asyncio.sleep(0)
+        gc.lookups["geocoder"] += 1
+        return SimpleNamespace(geohash=bucket, latitude=latitude, longitude=longitude)
+
+    monkeypatch.setattr(gs, "_get_address", _get_address)
+    gc.address_cache.clear()
+    gc.lookups.clear()
+    gc.address_flights.coalesced = 0
+    yield calls
+    gc.address_cache.clear()
+    gc.lookups.clear()
+
+
+@pytest.mark.asyncio
+async def test_nearby_locations_share_the_cached_address(geocoded):
+    first = await gs.get_address(18.520430, 73.856743)
+    # a few metres away, same precision 8 bucket
+    second = await gs.get_address(18.520440, 73.856750)
+    assert first is second
+    assert len(geocoded) == 1
+    assert len(geocoded[0]) == gc.cache_precision()
+
+
+@pytest.mark.asyncio
+async def test_address_cache_stats_per_tier(geocoded):
+    await gs.get_address(18.520430, 73.856743)
+    await gs.get_address(18.520430, 73.856743)
+    await gs.get_address(40.0, -3.0)
+    stats = gc.address_cache_stats()
+    assert stats["lookups"] == 3
+    assert stats["memory"] == {"hits": 1, "hit_rate": 0.3333, "size": 2}
+    assert stats["database"] == {"hits": 0, "hit_rate": 0.0}
+    assert stats["geocoder"] == {"hits": 2, "hit_rate": 1.0}
+
+
+def test_cache_precision_is_bounded(monkeypatch):
+    monkeypatch.setattr(gc.settings.geomap, "cache_precision", 13)
+    with pytest.raises(ValueError):
+        gc.cache_precision()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_of_a_bucket_are_coalesced(geocoded):
+    results = await asyncio.gather(
+        *(gs.get_address(18.520430, 73.856743) for _ in range(5))
+    )
+    assert len(geocoded) == 1
+    assert all(r is results[0] for r in results)
+    assert gc.address_cache_stats()["coalesced"] == 4
+
+
+class Result:
+    def scalar_one_or_none(self):
+        return None
+
+
+class Session:
+    """Session of a database without any geomap"""
+
+    def __init__(self):
+        self.statements = []
+        self.added = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+        return Result()
+
+    def add(self, geomap):
+        self.added.append(geomap)
+
+    async def commit(self):
+        pass
+
+    async def refresh(self, geomap):
+        pass
+
+
+@pytest.fixture
+def geocoder(monkeypatch):
+    calls, answers, sessions, active = [], [], [], []
+
+    @asynccontextmanager
+    async def with_async_db(schema):
+        session = Session()
+        sessions.append(session)
+        active.append(session)
+        try:
+            yield session
+        finally:
+            active.remove(session)
+
+    class Geocoder:
+        async def get_address(self, lat, long):
+            calls.append((lat, long))
+            # no connection is held while waiting for the geocoder
+            assert active == []
+            answer = answers.pop(0)
+            if isinstance(answer, Exception):
+                raise answer
+            return answer
+
+    monkeypatch.setattr(gs, "reverse_geocoder", Geocoder)
+    monkeypatch.setattr(gs, "with_async_db", with_async_db)
+    breaker = gc.CircuitBreaker("test", failure_threshold=2, reset_timeout=30)
+    monkeypatch.setattr(gs, "geocoder_breaker", breaker)
+    gc.not_found_cache.clear()
+    gc.failed_cache.clear()
+    gc.lookups.clear()
+    yield SimpleNamespace(
+        calls=calls, answers=answers, breaker=breaker, sessions=sessions
+    )
+    gc.not_found_cache.clear()
+    gc.failed_cache.clear()
+    gc.lookups.clear()
+
+
+@pytest.mark.asyncio
+async def test_not_found_locations_are_negatively_cached(geocoder):
+    geocoder.answers.append(None)
+    assert await gs._get_address(0.0, -160.0) is None
+    assert await gs.get_address(0.0, -160.0) is None
+    assert len(geocoder.calls) == 1
+    assert gc.lookups["not_found"] == 1
+    assert gc.lookups["negative"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_locations_are_not_geocoded_again_for_a_while(geocoder):
+    geocoder.answers.append(ConnectionError("timeout"))
+    with pytest.raises(gs.GeocodingUnavailable):
+        await gs._get_address(18.520430, 73.856743)
+    with pytest.raises(gs.GeocodingUnavailable):
+        await gs.get_address(18.520430, 73.856743)
+    assert len(geocoder.calls) == 1
+    assert gc.lookups["failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_skips_the_geocoder(geocoder):
+    geocoder.answers.extend([ConnectionError("down"), ConnectionError("down")])
+    for longitude in (1.0, 2.0, 3.0):
+        with pytest.raises(gs.GeocodingUnavailable):
+            await gs._get_address(10.0, longitude)
+    assert len(geocoder.calls) == 2
+    assert geocoder.breaker.stats()["rejected"] == 1
+    assert gc.lookups["failed"] == 3
+
+
+@pytest.mark.asyncio
+async def test_addresses_are_stored_and_found_by_backend(geocoder, monkeypatch):
+    monkeypatch.setattr(gs, "reverse_backend", lambda: "offline")
+    geocoder.answers.append(SimpleNamespace(_raw={"source": "geonames"}))
+    geomap = await gs._get_address(18.520430, 73.856743)
+    assert geomap.source == "offline"
+    # looked up, then stored in a new session once geocoded
+    lookup_session, insert_session = geocoder.sessions
+    assert insert_session.added == [geomap]
+    lookup = lookup_session.statements[0].compile()
+    assert "geomaps.source = " in str(lookup)
+    assert "offline" in lookup.params.values()
+
+
+def test_trivially_different_addresses_share_a_key():
+    key = gc.normalize_address("1 Main St., Springfield IL 62701")
+    assert key == "1 main st springfield il 62701"
+    assert gc.normalize_address("  1  MAIN st,Springfield, IL-62701 ") == key
+    assert gc.normalize_address("Rue Émile Zola") == "rue emile zola"
+
+
+class Row(SimpleNamespace):
+    pass
+
+
+class GeocodeSession:
+    """Session of a database holding the given geocodes"""
+
+    def __init__(self, geocodes):
+        self.geocodes = geocodes
+
+    async def execute(self, statement):
+        key = statement.compile().params.get("address_key_1")
+        if key is None:
+            # insert
+            values = statement.compile().params
+            self.geocodes[values["address_key"]] = (
+                values["latitude"],
+                values["longitude"],
+            )
+            return None
+        location = self.geocodes.get(key)
+        row = Row(latitude=location[0], longitude=location[1]) if location else None
+        return SimpleNamespace(first=lambda: row)
+
+    async def commit(self):
+        pass
+
+
+@pytest.fixture
+def geocodes(monkeypatch):
+    database, calls, sessions = {}, [], []
+
+    @asynccontextmanager
+    async def with_async_db(schema):
+        sessions.append(schema)
+        try:
+            yield GeocodeSession(database)
+        finally:
+            sessions.pop()
+
+    async def get_geocode(address):
+        calls.append(str(address))
+        # no session is held across the gmaps call
+        assert sessions == []
+        await asyncio.sleep(0)
+        return (39.78, -89.65)
+
+    monkeypatch.setattr(gs, "with_async_db", with_async_db)
+    monkeypatch.setattr(gs.gmaps, "get_geocode", get_geocode)
+    gc.geocode_cache.clear()
+    gc.geocode_lookups.clear()
+    yield SimpleNamespace(database=database, calls=calls)
+    gc.geocode_cache.clear()
+    gc.geocode_lookups.clear()
+
+
+@pytest.mark.asyncio
+async def test_geocodes_are_cached_by_normalized_address(geocodes):
+    assert await gs.get_geocode("1 Main St., Springfield") == (39.78, -89.65)
+    assert await gs.get_geocode("1 main st springfield") == (39.78, -89.65)
+    assert geocodes.calls == ["1 Main St., Springfield"]
+    assert geocodes.database == {"1 main st springfield": (39.78, -89.65)}
+
+    # another worker, only the database tier is shared
+    gc.geocode_cache.clear()
+    assert await gs.get_geocode("1 MAIN ST, SPRINGFIELD") == (39.78, -89.65)
+    assert len(geocodes.calls) == 1
+    stats = gc.geocode_cache_stats()
+    assert stats["lookups"] == 3
+    assert [stats[t]["hits"] for t in gc.TIERS] == [1, 1, 1]
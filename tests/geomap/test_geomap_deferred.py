@@ -0,0 +1,72 @@
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+import opalizer.api.geomap.deferred as gd
+from opalizer.core.circuit_breaker import CircuitBreaker
+
+
+def claimed(i):
+    return gd.ClaimedGeocode(i, None, 10.0, float(i), 1)
+
+
+@pytest.mark.asyncio
+async def test_batch_stops_once_the_circuit_rejects_a_call(monkeypatch):
+    items = [claimed(i) for i in range(4)]
+    rescheduled, released = [], []
+    errors = [gd.GeocodingUnavailable("trial failed"), gd.GeocoderCircuitOpen("open")]
+
+    @asynccontextmanager
+    async def with_async_db(schema):
+        yield None
+
+    async def claim(session, limit, lease_seconds):
+        return items
+
+    async def reschedule(session, item, error):
+        rescheduled.append(item.id)
+
+    async def release(session, items):
+        released.extend(item.id for item in items)
+
+    handled = []
+
+    async def handle(item):
+        handled.append(item.id)
+        raise errors.pop(0)
+
+    monkeypatch.setattr(gd, "with_async_db", with_async_db)
+    monkeypatch.setattr(gd, "claim", claim)
+    monkeypatch.setattr(gd, "reschedule", reschedule)
+    monkeypatch.setattr(gd, "release", release)
+    geocoder = gd.DeferredGeocoder(handler=None)
+    monkeypatch.setattr(geocoder, "handle", handle)
+    monkeypatch.setattr(gd, "geocoder_breaker", CircuitBreaker("test"))
+
+    assert await geocoder.run_once() == 0
+    # the trial call counts as an attempt, the untried locations do not
+    assert handled == [0, 1]
+    assert rescheduled == [0]
+    assert released == [1, 2, 3]
+    assert geocoder.failed == 1
+
+
+class RecordingSession:
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement):
+        self.statements.append(statement)
+
+    async def commit(self):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_released_locations_get_their_attempt_back():
+    session = RecordingSession()
+    await gd.release(session, [claimed(1), claimed(2)])
+    sql = str(session.statements[0].compile(dialect=postgresql.dialect()))
+    assert "attempts=(public.deferred_geocodes.attempts - " in sql
+    assert "available_at=now()" in sql
@@ -0,0 +1,80 @@
+import random
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import geohash
+import pytest
+
+import opalizer.api.geomap.prewarm as gp
+from opalizer.geolocator.offline import haversine_km
+
+
+def test_covering_cells_cover_the_perimeter_nearest_first():
+    cells = gp.covering_cells(18.520430, 73.856743, 0.5, 7, limit=10000)
+    distances = [gp._distance_to_cell(18.520430, 73.856743, c) for c in cells]
+    assert distances == sorted(distances)
+    assert max(distances) <= 0.5
+    assert len(cells) == len(set(cells))
+
+    rng = random.Random(7)
+    for _ in range(500):
+        latitude = 18.520430 + rng.uniform(-0.005, 0.005)
+        longitude = 73.856743 + rng.uniform(-0.005, 0.005)
+        if haversine_km(18.520430, 73.856743, latitude, longitude) <= 0.5:
+            assert geohash.encode(latitude, longitude, 7) in cells
+
+
+def test_covering_cells_are_limited_and_stable():
+    cells = gp.covering_cells(40.0, -3.0, 2.0, 8, limit=100)
+    assert len(cells) == 100
+    assert gp.covering_cells(40.0, -3.0, 2.0, 8, limit=100) == cells
+
+
+@pytest.fixture
+def prewarmer(monkeypatch):
+    geocoded, saved, failures = [], [], []
+
+    async def get_address(latitude, longitude):
+        if failures and len(geocoded) == failures[0]:
+            failures.pop(0)
+            raise gp.GeocodingUnavailable("down")
+        geocoded.append((latitude, longitude))
+
+    async def save_progress(session, job, cells_done, cells_total, error=None):
+        saved.append((cells_done, cells_total, error))
+
+    @asynccontextmanager
+    async def with_async_db(schema):
+        yield None
+
+    monkeypatch.setattr(gp, "get_address", get_address)
+    monkeypatch.setattr(gp, "save_progress", save_progress)
+    monkeypatch.setattr(gp, "with_async_db", with_async_db)
+    return SimpleNamespace(
+        runner=gp.GeomapPrewarmer(chunk_size=10, max_cells=25, rate_per_second=1e6),
+        geocoded=geocoded,
+        saved=saved,
+        failures=failures,
+    )
+
+
+def job(cells_done=0):
+    return gp.ClaimedPrewarm(1, 40.0, -3.0, 2.0, 8, cells_done, 0)
+
+
+@pytest.mark.asyncio
+async def test_prewarm_resumes_where_it_stopped(prewarmer):
+    assert await prewarmer.runner.warm(job()) == 10
+    assert await prewarmer.runner.warm(job(10)) == 10
+    assert await prewarmer.runner.warm(job(20)) == 5
+    assert prewarmer.saved == [(10, 25, None), (20, 25, None), (25, 25, None)]
+    cells = [geohash.encode(lat, lon, 8) for lat, lon in prewarmer.geocoded]
+    assert cells == gp.covering_cells(40.0, -3.0, 2.0, 8, limit=25)
+
+
+@pytest.mark.asyncio
+async def test_prewarm_failure_keeps_the_progress(prewarmer):
+    prewarmer.failures.append(3)
+    assert await prewarmer.runner.warm(job()) == 3
+    assert prewarmer.saved == [(3, 25, "down")]
+    assert prewarmer.runner.stats()["failed"] == 1
@@ -0,0 +1,120 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import opalizer.api.store.bulk as sb
+
+STORE = {
+    "name": "Main street",
+    "address": "1 Main St",
+    "city": "Springfield",
+    "state": "IL",
+    "country": "US",
+    "zip_code": "62701",
+    "radius": 1.5,
+}
+
+
+def test_parse_csv_rows():
+    body = (
+        "﻿name,address,apartment,city,state,country,zip_code,radius\n"
+        "Main street,1 Main St,,Springfield,IL,US,62701,1.5\n"
+        "Short row,2 Main St\n"
+    ).encode()
+    rows = sb.parse_stores_body(body, "text/csv; charset=utf-8")
+    assert rows[0] == {k: str(v) for k, v in STORE.items()}
+    assert rows[1] == {"name": "Short row", "address": "2 Main St"}
+
+    valid, errors = sb.validate_stores(rows)
+    assert [i for i, _ in valid] == [0]
+    assert errors[0]["index"] == 1
+
+
+def test_parse_json_lines_rejects_malformed_lines():
+    body = b'{"name": "a"}\n\nnot json\n'
+    rows = sb.parse_stores_body(body, "application/x-ndjson")
+    assert rows[0] == {"name": "a"}
+    assert isinstance(rows[1], ValueError)
+
+
+def test_repeated_names_are_rejected():
+    valid, errors = sb.validate_stores([STORE, STORE])
+    assert [i for i, _ in valid] == [0]
+    assert errors == [sb.row_error(1, "Store name 'Main street' is repeated.")]
+
+
+@pytest.fixture
+def importer(monkeypatch):
+    calls = []
+    in_flight = SimpleNamespace(now=0, max=0)
+
+    async def get_geocode(payload):
+        calls.append(payload.name)
+        in_flight.now += 1
+        in_flight.max = max(in_flight.max, in_flight.now)
+        await asyncio.sleep(0.001)
+        in_flight.now -= 1
+        if payload.city == "Nowhere":
+            return None
+        if payload.city == "Error":
+            raise ConnectionError("timeout")
+        return (39.78, -89.65)
+
+    async def save(**values):
+        pass
+
+    monkeypatch.setattr(sb.gs, "get_geocode", get_geocode)
+    store_import = sb.StoreImport(None, None, [], concurrency=2, batch_size=10)
+    monkeypatch.setattr(store_import, "save", save)
+    return SimpleNamespace(runner=store_import, calls=calls, in_flight=in_flight)
+
+
+def rows(*stores):
+    return [(i, sb.StoreSchemaIn.parse_obj(s)) for i, s in enumerate(stores)]
+
+
+@pytest.mark.asyncio
+async def test_identical_addresses_are_geocoded_once(importer):
+    located = await importer.runner.geocode(
+        rows(
+            STORE,
+            {**STORE, "name": "Same place", "address": " 1  MAIN st "},
+            {**STORE, "name": "Elsewhere", "address": "9 Elm St"},
+        )
+    )
+    assert [index for index, _, _ in located] == [0, 1, 2]
+    assert len(importer.calls) == 2
+    assert importer.runner.geocoded == 3
+
+
+@pytest.mark.asyncio
+async def test_geocoding_is_bounded_and_failures_are_row_errors(importer):
+    stores = [{**STORE, "name": f"Store {i}", "address": f"{i} Elm"} for i in range(8)]
+    stores += [
+        {**STORE, "name": "Lost", "city": "Nowhere"},
+        {**STORE, "name": "Down", "city": "Error"},
+    ]
+    located = await importer.runner.geocode(rows(*stores))
+    assert len(located) == 8
+    assert importer.in_flight.max == 2
+    errors = sorted(importer.runner.errors, key=lambda e: e["index"])
+    assert errors[0] == sb.row_error(8, "Address not found.")
+    assert errors[1]["index"] == 9
+    assert errors[1]["errors"][0]["msg"].startswith("Geocoding failed")
+
+
+@pytest.mark.asyncio
+async def test_prewarm_is_bounded_per_import(importer, monkeypatch):
+    scheduled = []
+
+    async def schedule_prewarm(tenant, stores):
+        scheduled.append(list(stores))
+
+    monkeypatch.setattr(sb, "schedule_prewarm", schedule_prewarm)
+    importer.runner.prewarm_stores = 3
+    await importer.runner.prewarm(["a", "b"])
+    await importer.runner.prewarm(["c", "d"])
+    await importer.runner.prewarm(["e"])
+    assert scheduled == [["a", "b"], ["c"]]
+    assert importer.runner.prewarmed == 3
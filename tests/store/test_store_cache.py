@@ -0,0 +1,82 @@
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+import opalizer.api.store.cache as sc
+from opalizer.api.store.index import StoreIndex
+from opalizer.core.invalidation import invalidation_bus
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    calls = []
+
+    async def load_store_index(schema):
+        calls.append(schema)
+        return StoreIndex([sc.StoreRow(None, 10.0, 10.0, 1.0)])
+
+    monkeypatch.setattr(sc, "load_store_index", load_store_index)
+    sc.store_snapshots.clear()
+    yield calls
+    sc.store_snapshots.clear()
+
+
+@pytest.mark.asyncio
+async def test_store_snapshot_is_loaded_once(loads):
+    tenant = SimpleNamespace(schema="tenant_a")
+    first = await sc.get_store_index(tenant)
+    second = await sc.get_store_index(tenant)
+    assert first is second
+    assert loads == ["tenant_a"]
+
+
+@pytest.mark.asyncio
+async def test_store_snapshot_reloads_after_store_invalidation(loads):
+    tenant = SimpleNamespace(schema="tenant_a")
+    await sc.get_store_index(tenant)
+    await invalidation_bus.publish("store", "tenant_b", "1")
+    await sc.get_store_index(tenant)
+    await invalidation_bus.publish("store", "tenant_a", "1")
+    await sc.get_store_index(tenant)
+    assert loads == ["tenant_a", "tenant_a"]
+
+
+@pytest.mark.asyncio
+async def test_load_overtaken_by_an_invalidation_is_not_cached(monkeypatch):
+    async def load_store_index(schema):
+        await invalidation_bus.publish("store", schema, "1")
+        return StoreIndex([])
+
+    monkeypatch.setattr(sc, "load_store_index", load_store_index)
+    sc.store_snapshots.clear()
+    await sc.get_store_index(SimpleNamespace(schema="tenant_a"))
+    assert sc.store_snapshots.get("tenant_a") is None
+
+
+@pytest.mark.asyncio
+async def test_snapshot_loaders_are_bounded(loads, monkeypatch):
+    monkeypatch.setattr(sc, "_loaders", sc.TTLCache(max_size=2, ttl=None))
+    for schema in ("tenant_a", "tenant_b", "tenant_c"):
+        await sc.get_store_index(SimpleNamespace(schema=schema))
+    assert len(sc._loaders) == 2
+    await invalidation_bus.publish("store", "tenant_c", "1")
+    assert len(sc._loaders) == 1
+
+
+@pytest.mark.asyncio
+async def test_snapshots_are_loaded_from_the_primary(monkeypatch):
+    opened = []
+
+    class Session:
+        async def execute(self, statement):
+            return SimpleNamespace(all=lambda: [])
+
+    @asynccontextmanager
+    async def with_async_db(schema, read_only=False):
+        opened.append((schema, read_only))
+        yield Session()
+
+    monkeypatch.setattr(sc, "with_async_db", with_async_db)
+    await sc.load_store_index("tenant_a")
+    assert opened == [("tenant_a", False)]
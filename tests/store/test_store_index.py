@@ -0,0 +1,52 @@
+import random
+from collections import namedtuple
+
+from geopy.distance import Distance, geodesic
+
+from opalizer.api.store.index import StoreIndex
+
+StoreRow = namedtuple("StoreRow", ["latitude", "longitude", "radius"])
+
+
+def linear_in_perimeter(stores, latitude, longitude):
+    for s in stores:
+        radius = Distance(miles=s.radius)
+        if geodesic((s.latitude, s.longitude), (latitude, longitude)).miles <= radius:
+            return True
+    return False
+
+
+def test_index_matches_linear_scan():
+    rnd = random.Random(42)
+    stores = [
+        StoreRow(rnd.uniform(-60, 60), rnd.uniform(-180, 180), rnd.uniform(0.1, 20))
+        for _ in range(60)
+    ]
+    # events near the stores, at their edges and far away
+    points = []
+    for s in stores:
+        for _ in range(3):
+            spread = s.radius / 30
+            points.append(
+                (
+                    s.latitude + rnd.uniform(-spread, spread),
+                    s.longitude + rnd.uniform(-spread, spread),
+                )
+            )
+    points += [(rnd.uniform(-90, 90), rnd.uniform(-180, 180)) for _ in range(60)]
+
+    index = StoreIndex(stores)
+    results = [index.contains(lat, long) for lat, long in points]
+    assert results == [linear_in_perimeter(stores, *p) for p in points]
+    assert any(results) and not all(results)
+
+
+def test_index_across_antimeridian_and_poles():
+    stores = [StoreRow(10.0, 179.99, 5), StoreRow(89.5, 0.0, 50)]
+    index = StoreIndex(stores)
+    for point in [(10.0, -179.99), (10.0, 179.9), (89.9, 120.0), (10.0, 0.0)]:
+        assert index.contains(*point) == linear_in_perimeter(stores, *point)
+
+
+def test_empty_index():
+    assert StoreIndex([]).contains(10.0, 10.0) is False
@@ -0,0 +1,96 @@
+import uuid
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+from starlette.requests import Request
+
+import opalizer.api.tenants.service as ts
+import opalizer.database as database
+from opalizer.api.tenants.cache import tenant_cache, tenant_cache_key
+from opalizer.api.tenants.schemas import TenantSchemaIn
+from opalizer.internal.admin import router as admin
+
+
+class FakeSession:
+    def add(self, obj):
+        pass
+
+    async def execute(self, statement):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def refresh(self, obj):
+        if obj.id is None:
+            obj.id = uuid.uuid4()
+
+    async def merge(self, obj):
+        return obj
+
+
+@asynccontextmanager
+async def fake_async_db(tenant_schema_name, read_only=False):
+    yield FakeSession()
+
+
+def cached_tenant(name: str, schema: str):
+    tenant = SimpleNamespace(id=uuid.uuid4(), name=name, schema=schema)
+    tenant_cache.set(tenant_cache_key(name), tenant)
+    return tenant
+
+
+@pytest.mark.asyncio
+async def test_tenant_is_resolved_once_per_request(monkeypatch):
+    tenant = SimpleNamespace(id=uuid.uuid4(), name="acme", schema="tenant_acme")
+    calls = []
+
+    async def resolve_tenant(tenant_name):
+        calls.append(tenant_name)
+        return tenant
+
+    monkeypatch.setattr(database, "resolve_tenant", resolve_tenant)
+    request = Request({"type": "http"})
+    assert await database.get_tanant(request, "acme") is tenant
+    assert await database.get_tanant(request, " ACME") is tenant
+    assert calls == ["acme"]
+    # a new request resolves again
+    assert await database.get_tanant(Request({"type": "http"}), "acme") is tenant
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_deleted_tenant_is_dropped_from_the_cache(monkeypatch):
+    monkeypatch.setattr(ts, "with_async_db", fake_async_db)
+    tenant_cache.clear()
+    cached_tenant("acme", "tenant_acme")
+    cached_tenant("other", "tenant_other")
+    await ts.delete_tenant(schema="tenant_acme", cascade=True)
+    assert tenant_cache.get(tenant_cache_key("acme")) is None
+    assert tenant_cache.get(tenant_cache_key("other")) is not None
+    tenant_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_created_tenant_replaces_stale_cache_entries(monkeypatch):
+    async def provision_tenant(schema, shard):
+        return {"schema": schema}
+
+    monkeypatch.setattr(ts, "provision_tenant", provision_tenant)
+    monkeypatch.setattr(ts, "generate_tenant_schema_name", lambda name: "tenant_acme")
+    tenant_cache.clear()
+    # left by a tenant of the same schema that was deleted elsewhere
+    cached_tenant("acme-old", "tenant_acme")
+    tenant = await ts.create_tenant(FakeSession(), TenantSchemaIn(name="acme"))
+    assert tenant.schema == "tenant_acme"
+    assert tenant_cache.get(tenant_cache_key("acme-old")) is None
+    tenant_cache.clear()
+
+
+def test_admin_exposes_cache_buffer_and_geocoder_stats():
+    caches = admin.read_cache_stats("admin").value
+    assert set(caches) == {"tenants", "addresses", "geocodes"}
+    assert "hit_rate" in caches["addresses"]["memory"]
+    assert set(admin.read_buffer_stats("admin").value) == {"events", "addresses"}
+    assert set(admin.read_geocoder_stats("admin").value) == {"reverse", "geocode"}
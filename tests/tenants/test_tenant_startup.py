@@ -0,0 +1,57 @@
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+import opalizer.api.tenants.service as ts
+from opalizer.exceptions import SharedSchemaOutdatedError
+
+
+def shared_columns(monkeypatch, columns, fail_ddl=False):
+    """public with the given columns, the shared DDL adds the missing ones"""
+    columns = set(columns)
+
+    class Session:
+        async def execute(self, statement):
+            sql = str(statement)
+            if sql.startswith("SELECT table_name"):
+                rows = [
+                    SimpleNamespace(table_name=t, column_name=c) for t, c in columns
+                ]
+                return SimpleNamespace(all=lambda: rows)
+            if fail_ddl and sql.startswith("ALTER"):
+                raise PermissionError("must be owner of table tenants")
+            if sql in ts.SHARED_DDL[:2]:
+                table, column = sql.split()[2].split(".")[1], sql.split()[8]
+                columns.add((table, column))
+
+        async def commit(self):
+            pass
+
+    @asynccontextmanager
+    async def with_async_db(schema):
+        yield Session()
+
+    monkeypatch.setattr(ts, "with_async_db", with_async_db)
+
+
+@pytest.mark.asyncio
+async def test_startup_fails_fast_without_the_shared_columns(monkeypatch):
+    shared_columns(monkeypatch, [("tenants", "id"), ("geomaps", "source")])
+    with pytest.raises(SharedSchemaOutdatedError) as e:
+        await ts.check_shared_columns()
+    assert e.value.columns == ["public.tenants.shard"]
+
+    shared_columns(monkeypatch, ts.SHARED_COLUMNS)
+    await ts.check_shared_columns()
+
+
+@pytest.mark.asyncio
+async def test_startup_adds_the_shared_columns_of_a_fresh_database(monkeypatch):
+    shared_columns(monkeypatch, [("tenants", "id"), ("geomaps", "id")])
+    await ts.upgrade_shared_columns()
+
+    shared_columns(monkeypatch, [("tenants", "id")], fail_ddl=True)
+    with pytest.raises(SharedSchemaOutdatedError) as e:
+        await ts.upgrade_shared_columns()
+    assert e.value.columns == ["public.tenants.shard", "public.geomaps.source"]